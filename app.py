@@ -1,11 +1,44 @@
 import streamlit as st
 import pandas as pd
-import ast
 import base64
+import json
+import os
+import time
+import uuid
+import numpy as np
+from snapshot import load_snapshot
+from spatial import polygons_from_geojson
+from engine import Engine, Query, DATA_FILE, export_suffix, export_key
+from exports import ExportCache, state_key, PALETTE
+from mapview import GridBins, GRID_LEVELS, AGGREGATE_ABOVE, color_codes, colors_for
+from tracing import Tracer, TRACE_ENV
+from store import SettlementStore, ensure_store, BACKEND_ENV
+
+# First render of a session above this is flagged in the Performance panel.
+# Run python warmup.py before starting the app so it stays under it
+# whatever the dataset size (see run_app.sh).
+FIRST_RENDER_BUDGET_MS = 3000
+
+# The data table shows at most this many rows (exports always have all of them);
+# sending every row to the browser would make each render grow with the dataset
+TABLE_MAX_ROWS = 10_000
 
 # Set page config
 st.set_page_config(page_title="Nisanyan Settlement Filter", layout="wide", page_icon="logo.png")
 
+# --- Tracing ---
+# Every stage of this rerun is timed; spans go to the Performance panel at
+# the bottom of the sidebar and, if SETTLEMENT_TRACE names a file, to that
+# JSONL trace (see tracing.py for a summary across sessions).
+if 'session_id' not in st.session_state:
+    st.session_state['session_id'] = uuid.uuid4().hex[:8]
+    # Spans of deferred export builds, which run outside the rerun
+    st.session_state['export_spans'] = []
+tracer = Tracer(os.environ.get(TRACE_ENV), session=st.session_state['session_id'], run=uuid.uuid4().hex[:8])
+export_tracer = Tracer(os.environ.get(TRACE_ENV), session=st.session_state['session_id'])
+export_tracer.spans = st.session_state['export_spans']
+rerun_start = time.perf_counter()
+
 # Display Logo
 col1, col2 = st.columns([1, 8])
 with col1:
@@ -17,138 +50,182 @@ st.logo("logo.png")
 st.markdown("Filter Turkey settlements by Ethinicity, Tribe, and Location for uMap export.")
 
 # --- Data Loading ---
-@st.cache_data
+@st.cache_resource
 def load_data():
     try:
-        # data is utf-16 based on previous steps
-        df = pd.read_csv("Turkey_Settlements_Nisanyanmap.csv", encoding="utf-16")
-        
-        # Parse Coordinates: "[lat, lon]" -> lat, lon
-        def parse_coords(coord_str):
-            try:
-                if isinstance(coord_str, str):
-                    parsed = ast.literal_eval(coord_str)
-                    if isinstance(parsed, list) and len(parsed) == 2:
-                        return parsed[0], parsed[1]
-            except:
-                pass
-            return None, None
-
-        # Apply parsing
-        coords = df['Coordinates'].apply(parse_coords)
-        df['latitude'] = [c[1] for c in coords]
-        df['longitude'] = [c[0] for c in coords]
-        
-        # Clean specific columns for display
-        df['Tribes'] = df['Tribes'].fillna('')
-        df['Ethnicity'] = df['Ethnicity'].fillna('')
-        df['Description'] = df['Description'].fillna('')
-        
-        return df
+        # Coordinates and text columns are parsed once into a columnar snapshot
+        # next to the CSV; it is rebuilt automatically when the CSV changes.
+        # Repeated text columns load as categoricals and coordinates as
+        # float32; the one frame is shared by all sessions (no per-caller
+        # copy as with st.cache_data), so it must not be modified.
+        return load_snapshot(DATA_FILE)
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return pd.DataFrame()
 
-df = load_data()
+@st.cache_resource
+def load_engine():
+    # Filter/export pipeline with its token, search and spatial indexes, loaded once per process:
+    # mapped from the snapshot when warmup.py persisted them, else built (search indexes on first use).
+    # SETTLEMENT_BACKEND=sql answers facet filters from the SQLite store instead.
+    store = None
+    if os.environ.get(BACKEND_ENV) == "sql":
+        store = SettlementStore(ensure_store(DATA_FILE))
+    return Engine.load(DATA_FILE, df=load_data(), store=store)
+
+@st.cache_resource
+def load_grid():
+    # Grid cell ids of every row at each aggregation level, shared by all sessions
+    data = load_data()
+    return GridBins(data['latitude'], data['longitude'])
+
+with tracer.span("load_data") as span:
+    df = load_data()
+    span["rows"] = len(df)
 
 if df.empty:
     st.stop()
 
+with tracer.span("load_engine"):
+    engine = load_engine()
+token_indexes = engine.token_indexes
+
+# The engine's cascade is shared by all sessions: its stage masks and counts
+# are keyed by the selections, and its caches are bounded in bytes overall
+facets = engine.facets
+
+# Widget keys per cascade stage. Keys keep a widget's selection when its
+# option labels (counts) change between reruns.
+FACET_KEYS = {'Province': 'province_filter', 'District': 'district_filter',
+              'Ethnicity': 'ethnicity_filter', 'Tribes': 'tribe_filter'}
+
+# Counts use every other facet, including ones rendered further down, so
+# read the current selections from session state up front; the area and
+# text filters are applied before the multiselects are drawn.
+current_selections = {stage: st.session_state.get(key) or [] for stage, key in FACET_KEYS.items()}
+selections = {}
+
+def facet_multiselect(stage, label):
+    with tracer.span(f"facet:{stage}") as span:
+        counts = facets.counts(stage, current_selections, search_mask, search_key)
+        options = facets.options(stage, selections)
+        span["options"] = len(options)
+    selected = facet_box.multiselect(
+        label,
+        options,
+        key=FACET_KEYS[stage],
+        format_func=lambda v: f"{v} ({counts.get(v, 0):,})",
+    )
+    selections[stage] = selected
+    return selected
+
 # --- Sidebar Filters ---
 st.sidebar.header("Filters")
+# The multiselects go here but are drawn after the area and text filters
+# below, whose mask their counts are taken under
+facet_box = st.sidebar.container()
+
+# 5. Area Filter
+# Settlements offered for a radius center, best name matches first
+CENTER_MATCHES = 20
+AREA_MODES = ["None", "Radius around a settlement", "Bounding box", "GeoJSON polygon"]
+area_mode = st.sidebar.selectbox("Area", AREA_MODES)
+spatial = engine.spatial
+area = None
+
+if area_mode == "Radius around a settlement":
+    # The name is looked up in the search index and only the best few
+    # matches are offered, so the widget stays small whatever the dataset size
+    center_name = st.sidebar.text_input("Center settlement", placeholder="Type a settlement name")
+    center = None
+    if center_name:
+        with tracer.span("center_search") as span:
+            matches, _ = engine.search_indexes['name'].search(center_name)
+            matches = matches[~np.isnan(spatial.lat[matches])][:CENTER_MATCHES]
+            span["rows"] = len(matches)
+        if len(matches):
+            center = st.sidebar.selectbox(
+                "Matching settlements",
+                matches.tolist(),
+                format_func=lambda i: f"{df['Name'].iat[i]} ({df['District'].iat[i]}, {df['Province'].iat[i]})",
+            )
+        else:
+            st.sidebar.warning("No settlement with coordinates matches that name.")
+    radius_km = st.sidebar.slider("Radius (km)", 1, 200, 25)
+    if center is not None:
+        area = {"type": "radius", "lat": float(spatial.lat[center]), "lon": float(spatial.lon[center]), "km": radius_km}
+elif area_mode == "Bounding box":
+    c1, c2 = st.sidebar.columns(2)
+    south = c1.number_input("South", -90.0, 90.0, 36.0, format="%.4f")
+    north = c2.number_input("North", -90.0, 90.0, 42.0, format="%.4f")
+    west = c1.number_input("West", -180.0, 180.0, 26.0, format="%.4f")
+    east = c2.number_input("East", -180.0, 180.0, 45.0, format="%.4f")
+    area = {"type": "bbox", "south": south, "west": west, "north": north, "east": east}
+elif area_mode == "GeoJSON polygon":
+    upload = st.sidebar.file_uploader("Polygon (.geojson)", type=["geojson", "json"])
+    if upload is not None:
+        try:
+            geojson = json.loads(upload.getvalue())
+            polygons = polygons_from_geojson(geojson)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            st.sidebar.error(f"Could not read polygon: {e}")
+            polygons = None
+        if polygons:
+            area = {"type": "polygon", "geojson": geojson}
+        elif polygons is not None:
+            st.sidebar.warning("No Polygon or MultiPolygon found in the file.")
+
+# 6. Other Filters
+name_search = st.sidebar.text_input("Search Name / Old Name")
+fuzzy_search = st.sidebar.checkbox("Include near misses", value=False,
+                                   help="Also match names a letter or two off; they are listed last.")
+desc_search = st.sidebar.text_input("Search Description")
+
+# Area and text filters alone: the mask the facet counts are taken under
+search_query = Query(text=name_search, description=desc_search, fuzzy=fuzzy_search, area=area)
+with tracer.span("search") as span:
+    searched = engine.search_mask(search_query)
+    search_mask = searched[0]
+    span["rows"] = len(df) if search_mask is None else int(search_mask.sum())
+search_key = state_key(**search_query.search_state())
 
 # 1. Province
-all_provinces = sorted(df['Province'].unique().tolist())
-selected_provinces = st.sidebar.multiselect("Select Province(s)", all_provinces)
+selected_provinces = facet_multiselect('Province', "Select Province(s)")
 
 # 2. District (Dependent on Province)
-if selected_provinces:
-    df_filtered_step1 = df[df['Province'].isin(selected_provinces)]
-    available_districts = sorted(df_filtered_step1['District'].unique().tolist())
-else:
-    df_filtered_step1 = df # No province filter
-    available_districts = sorted(df['District'].unique().tolist())
-    
-selected_districts = st.sidebar.multiselect("Select District(s)", available_districts)
-
-# Apply District Filter for next steps
-if selected_districts:
-    df_filtered_step2 = df_filtered_step1[df_filtered_step1['District'].isin(selected_districts)]
-else:
-    df_filtered_step2 = df_filtered_step1
+selected_districts = facet_multiselect('District', "Select District(s)")
 
 # 3. Ethnicity Filter (Dependent on Prov/Dist)
-# Extract unique ethnicities from the filtered dataset
-all_ethnicities = set()
-for x in df_filtered_step2['Ethnicity'].dropna():
-    if x:
-        for e in str(x).split(','):
-            e_clean = e.strip()
-            if e_clean:
-                all_ethnicities.add(e_clean)
-sorted_ethnicities = sorted(list(all_ethnicities))
-
-selected_ethnicities = st.sidebar.multiselect("Select Ethnicity", sorted_ethnicities)
-
-# Apply Ethnicity Filter for Tribe options
-if selected_ethnicities:
-    # Filter df for tribes based on selected ethnicities
-    # We need rows that contain ANY of the selected ethnicities
-    import re
-    eth_pattern = '|'.join([re.escape(e) for e in selected_ethnicities])
-    df_filtered_step3 = df_filtered_step2[df_filtered_step2['Ethnicity'].str.contains(eth_pattern, case=False, na=False)]
-else:
-    df_filtered_step3 = df_filtered_step2
-
+selected_ethnicities = facet_multiselect('Ethnicity', "Select Ethnicity")
 
 # 4. Tribe Filter (Dependent on Prov/Dist + Ethnicity)
-# Extract unique tribes from the filtered dataset
-all_tribes = set()
-for x in df_filtered_step3['Tribes'].dropna():
-    if x:
-        for t in str(x).split(','):
-            t_clean = t.strip()
-            if t_clean:
-                all_tribes.add(t_clean)
-sorted_tribes = sorted(list(all_tribes))
-
-selected_tribes = st.sidebar.multiselect("Select Tribe(s)", sorted_tribes)
-
-# 5. Other Filters
-name_search = st.sidebar.text_input("Search Name / Old Name")
-desc_search = st.sidebar.text_input("Search Description")
+selected_tribes = facet_multiselect('Tribes', "Select Tribe(s)")
 
 # --- Apply Filters ---
-filtered_df = df.copy()
-
-if selected_provinces:
-    filtered_df = filtered_df[filtered_df['Province'].isin(selected_provinces)]
-
-if selected_districts:
-    filtered_df = filtered_df[filtered_df['District'].isin(selected_districts)]
-
-if name_search:
-    # Search in Name OR Old_Name
-    m1 = filtered_df['Name'].str.contains(name_search, case=False, na=False)
-    m2 = filtered_df['Old_Name'].str.contains(name_search, case=False, na=False)
-    filtered_df = filtered_df[m1 | m2]
-
-if selected_tribes:
-    # Construct regex pattern to match any of the selected tribes
-    # We use word boundaries or logic to ensure we don't match substrings incorrectly if possible,
-    # but simple contains is usually enough for this user.
-    # Using regex OR (|) to match any selected tribe.
-    import re
-    tribe_pattern = '|'.join([re.escape(t) for t in selected_tribes])
-    filtered_df = filtered_df[filtered_df['Tribes'].str.contains(tribe_pattern, case=False, na=False)]
-
-if selected_ethnicities:
-    import re
-    eth_pattern = '|'.join([re.escape(e) for e in selected_ethnicities])
-    filtered_df = filtered_df[filtered_df['Ethnicity'].str.contains(eth_pattern, case=False, na=False)]
-
-if desc_search:
-    filtered_df = filtered_df[filtered_df['Description'].str.contains(desc_search, case=False, na=False)]
+query = Query(
+    provinces=tuple(selected_provinces),
+    districts=tuple(selected_districts),
+    ethnicities=tuple(selected_ethnicities),
+    tribes=tuple(selected_tribes),
+    text=name_search,
+    fuzzy=fuzzy_search,
+    description=desc_search,
+    area=area,
+)
+
+# Tribe/Ethnicity matching is per comma-separated token, so "Ali" does not match "Alikan".
+# With no filter set this is df itself; nothing copies the full frame.
+# Text search hits are ranked, best first.
+with tracer.span("filter") as span:
+    facet_mask, search_scores = engine.filter(query, facets, searched)
+    filtered_df = df if facet_mask is None else df[facet_mask]
+    span["rows"] = len(filtered_df)
+if search_scores is not None:
+    with tracer.span("rank", rows=len(filtered_df)):
+        filtered_df = filtered_df.iloc[np.argsort(-search_scores[filtered_df.index], kind='stable')]
+
+# Hashable description of the filters, used to key cached map bins and exports
+filter_state = query.state()
 
 # --- Main Interface ---
 
@@ -159,147 +236,160 @@ st.markdown(f"**Found {len(filtered_df)} settlements**")
 tab1, tab2 = st.tabs(["📍 Map View", "📄 Data Table"])
 
 with tab1:
-    # Map requires lat/lon columns and no NaNs
-    map_data = filtered_df.dropna(subset=['latitude', 'longitude']).copy()
-    
-    # Dynamic Coloring Logic
-    # Default color (Red)
-    map_data['color'] = '#FF0000'
-    
-    # If multiple tribes selected, assign distinct colors
-    if selected_tribes and len(selected_tribes) > 0:
-        # distinct colors palette (hex)
-        palette = [
-            '#FF0000', '#00FF00', '#0000FF', '#FFFF00', '#00FFFF', '#FF00FF', 
-            '#FFA500', '#800080', '#008000', '#000080', '#800000', '#008080'
-        ]
-        
-        tribe_color_map = {}
-        for idx, t in enumerate(selected_tribes):
-            tribe_color_map[t] = palette[idx % len(palette)]
-            
-        # Display Legend
-        st.markdown("**Color Legend:**")
-        cols = st.columns(len(selected_tribes))
-        for idx, t in enumerate(selected_tribes):
-            color = tribe_color_map[t]
-            cols[idx % len(cols)].markdown(f":large_blue_circle: <span style='color:{color}'>**{t}**</span>", unsafe_allow_html=True)
-            
-        # Apply colors to rows
-        def get_color(row_tribes):
-            if not isinstance(row_tribes, str):
-                return '#FF0000'
-            for t in selected_tribes:
-                if t in row_tribes:
-                    return tribe_color_map[t]
-            return '#FF0000'
-            
-        map_data['color'] = map_data['Tribes'].apply(get_color)
-        
-    elif selected_ethnicities and len(selected_ethnicities) > 0:
-        # distinct colors palette (hex)
-        palette = [
-            '#FF0000', '#00FF00', '#0000FF', '#FFFF00', '#00FFFF', '#FF00FF', 
-            '#FFA500', '#800080', '#008000', '#000080', '#800000', '#008080'
-        ]
-        
-        eth_color_map = {}
-        for idx, e in enumerate(selected_ethnicities):
-            eth_color_map[e] = palette[idx % len(palette)]
-            
+    # Color by the selected tribes, else the selected ethnicities; the first
+    # selected group a settlement belongs to decides its color.
+    color_col, color_groups = ("Tribes", selected_tribes) if selected_tribes else ("Ethnicity", selected_ethnicities)
+
+    if color_groups:
         # Display Legend
-        st.markdown("**Color Legend (Ethnicity):**")
-        cols = st.columns(len(selected_ethnicities))
-        for idx, e in enumerate(selected_ethnicities):
-            color = eth_color_map[e]
-            cols[idx % len(cols)].markdown(f":large_blue_circle: <span style='color:{color}'>**{e}**</span>", unsafe_allow_html=True)
-            
-        # Apply colors to rows
-        def get_eth_color(row_eth):
-            if not isinstance(row_eth, str):
-                return '#FF0000'
-            for e in selected_ethnicities:
-                if e in row_eth:
-                    return eth_color_map[e]
-            return '#FF0000'
-            
-        map_data['color'] = map_data['Ethnicity'].apply(get_eth_color)
-
-    if not map_data.empty:
-        st.map(map_data, size=20, color='color')
-    else:
+        st.markdown("**Color Legend:**" if color_col == "Tribes" else "**Color Legend (Ethnicity):**")
+        cols = st.columns(len(color_groups))
+        for idx, g in enumerate(color_groups):
+            color = PALETTE[idx % len(PALETTE)]
+            cols[idx % len(cols)].markdown(f":large_blue_circle: <span style='color:{color}'>**{g}**</span>", unsafe_allow_html=True)
+
+    # Palette position per row of df, straight from the token index (-1 = default red)
+    with tracer.span("map_colors", rows=len(df)):
+        codes = color_codes(token_indexes[color_col], color_groups, len(df))
+    rows = filtered_df.index.to_numpy()
+    with tracer.span("load_grid"):
+        grid = load_grid()
+    n_points = int(grid.valid[rows].sum())
+
+    # Large result sets are drawn as one marker per grid cell
+    modes = ["Points", "Aggregated"]
+    map_mode = st.radio("Rendering", modes, index=1 if n_points > AGGREGATE_ABOVE else 0, horizontal=True,
+                        help=f"Aggregated draws one marker per grid cell (default above {AGGREGATE_ABOVE:,} points).")
+
+    if n_points == 0:
         st.warning("No coordinates found to plot.")
+    elif map_mode == "Aggregated":
+        level = st.select_slider("Grid", options=list(GRID_LEVELS), value=list(GRID_LEVELS)[0])
+        with tracer.span("map_aggregate", rows=n_points) as span:
+            # Colors follow the selection order, which filter_state (sorted) doesn't keep
+            key = state_key(color=color_col, groups=tuple(color_groups), **filter_state)
+            bins = grid.aggregate(rows, codes, level, key=key)
+            span["cells"] = len(bins)
+        st.caption(f"{n_points:,} settlements in {len(bins):,} cells, colored by the most common group.")
+        with tracer.span("st.map", rows=len(bins)):
+            st.map(bins, size='size', color='color')
+    else:
+        with tracer.span("map_points", rows=n_points):
+            rows = rows[grid.valid[rows]]
+            map_data = pd.DataFrame({
+                'latitude': grid.lat[rows].astype(np.float64),
+                'longitude': grid.lon[rows].astype(np.float64),
+                'color': colors_for(codes[rows]),
+            })
+        with tracer.span("st.map", rows=len(map_data)):
+            st.map(map_data, size=20, color='color')
 
 with tab2:
-    st.dataframe(filtered_df)
-
-import zipfile
-import io
+    if len(filtered_df) > TABLE_MAX_ROWS:
+        st.caption(f"Showing the first {TABLE_MAX_ROWS:,} of {len(filtered_df):,} settlements; "
+                   "export to get all of them.")
+    with tracer.span("st.dataframe", rows=min(len(filtered_df), TABLE_MAX_ROWS)):
+        st.dataframe(filtered_df.head(TABLE_MAX_ROWS))
 
 # --- Export ---
 st.sidebar.markdown("---")
 st.sidebar.header("Export")
 
-export_format = st.sidebar.radio("Export Format", ["Single CSV", "Separate Sheets (ZIP)"])
-
-@st.cache_data
-def convert_df(df):
-    return df.to_csv(index=False).encode('utf-8')
-
-def create_zip(filtered_df, split_col):
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zip_file:
-        # Get unique values in the split column
-        # Handle comma-separated values by iterating and filtering
-        # Actually, for the map layer logic, it's best if we iterate the *selected* filters
-        # because a single row might belong to multiple groups.
-        # But uMap points can only belong to one layer usually. 
-        # So we will iterate the selected items and create a file for each.
-        # If a point is in multiple, it will appear in multiple layers (which is fine/good).
-        
-        groups = []
-        if split_col == "Tribes" and selected_tribes:
-            groups = selected_tribes
-        elif split_col == "Ethnicity" and selected_ethnicities:
-            groups = selected_ethnicities
-        
-        if not groups:
-            # Fallback to categorical unique values if no filter selected but split requested
-            # This is complex for comma-sep. Let's stick to selected filters for now or simple unique.
-            # If nothing selected, maybe just one big file.
-             zip_file.writestr("ALL_Settlements.csv", filtered_df.to_csv(index=False).encode('utf-8'))
-        else:
-            for group in groups:
-                # Filter rows containing this group
-                # Use word boundary or simple contains
-                subset = filtered_df[filtered_df[split_col].str.contains(group, case=False, na=False)]
-                if not subset.empty:
-                    # Clean filename
-                    safe_name = "".join([c for c in group if c.isalnum() or c in (' ','-','_')]).strip()
-                    zip_file.writestr(f"{split_col}_{safe_name}.csv", subset.to_csv(index=False).encode('utf-8'))
-                    
-    return zip_buffer.getvalue()
-
+export_format = st.sidebar.radio("Export Format", ["Single CSV", "Separate Sheets (ZIP)", "GeoJSON", "uMap (.umap)"])
+
+@st.cache_resource
+def get_export_cache():
+    # Shared by all sessions: identical filter state gives identical files
+    return ExportCache()
+
+export_cache = get_export_cache()
+
+@st.cache_resource
+def load_packs():
+    # Precomputed per-province exports (python packs.py), if built from the current CSV.
+    # Imported here: packs pulls in the batch process pool, which only pack builds use.
+    from packs import PackStore
+    return PackStore.load(DATA_FILE)
+
+packs = load_packs()
+
+def export_bytes(fmt, suffix):
+    # Precomputed packs when the filter state is one of their shapes (a province's
+    # ZIP is assembled from its groups' packs), else a (cached) build
+    if packs is not None and packs.serves(query, fmt):
+        with export_tracer.span(f"export_pack:{fmt}"):
+            data = packs.export(query, fmt)
+        if data is not None:
+            return data
+    return export_cache.get_or_build(export_key(query, fmt), build_export(fmt), suffix)
+
+def build_export(fmt):
+    # Builder for the export cache: writes the filtered rows, in display order
+    def build(path):
+        with export_tracer.span(f"export:{fmt}", rows=len(filtered_df)):
+            engine.export(query, path, fmt, rows=filtered_df.index.to_numpy())
+        # Only the latest few builds are shown in the panel
+        del export_tracer.spans[:-5]
+    return build
+
+# Determine split criteria
+split_by = query.split_by()
+
+# Files are only generated when a download button is clicked (the data
+# argument is a callable), then cached by filter state and format.
 if export_format == "Single CSV":
-    csv = convert_df(filtered_df)
     st.sidebar.download_button(
         label="Download CSV",
-        data=csv,
+        data=lambda: export_bytes("csv", ".csv"),
         file_name='nisanyan_map_export.csv',
         mime='text/csv',
     )
+elif export_format == "GeoJSON":
+    # One FeatureCollection per layer (zipped) when splitting, else a single file
+    if split_by:
+        st.sidebar.info(f"Splitting by: {split_by}")
+    st.sidebar.download_button(
+        label="Download GeoJSON" + (" (Layers ZIP)" if split_by else ""),
+        data=lambda: export_bytes("geojson", export_suffix("geojson", split_by)),
+        file_name='nisanyan_layers.zip' if split_by else 'nisanyan_map_export.geojson',
+        mime='application/zip' if split_by else 'application/geo+json',
+    )
+elif export_format == "uMap (.umap)":
+    # uMap import file with one colored datalayer per selected tribe/ethnicity
+    st.sidebar.download_button(
+        label="Download uMap file",
+        data=lambda: export_bytes("umap", ".umap"),
+        file_name='nisanyan_map.umap',
+        mime='application/json',
+    )
 else:
-    # Determine split criteria
-    split_by = "Tribes" if selected_tribes else ("Ethnicity" if selected_ethnicities else None)
-    
     if split_by:
         st.sidebar.info(f"Splitting by: {split_by}")
-        zip_data = create_zip(filtered_df, split_by)
         st.sidebar.download_button(
             label="Download ZIP (Layers)",
-            data=zip_data,
+            data=lambda: export_bytes("zip", ".zip"),
             file_name='nisanyan_layers.zip',
             mime='application/zip',
         )
     else:
         st.sidebar.warning("Select Tribes or Ethnicities to enable splitting.")
+
+# --- Performance Panel ---
+rerun_ms = round((time.perf_counter() - rerun_start) * 1000, 3)
+tracer.emit({"span": "rerun", "ms": rerun_ms, "rows": len(filtered_df)})
+# The session's first rerun is its first interactive render
+if 'first_render_ms' not in st.session_state:
+    st.session_state['first_render_ms'] = rerun_ms
+    tracer.emit({"span": "first_render", "ms": rerun_ms, "rows": len(df), "budget_ms": FIRST_RENDER_BUDGET_MS})
+first_render_ms = st.session_state['first_render_ms']
+with st.sidebar.expander("⏱️ Performance"):
+    st.caption(f"First render {first_render_ms:,.0f} ms (budget {FIRST_RENDER_BUDGET_MS:,} ms)")
+    if first_render_ms > FIRST_RENDER_BUDGET_MS:
+        st.warning("First render over budget; was python warmup.py run before starting the app?")
+    timings = pd.DataFrame(tracer.spans, columns=["span", "ms", "rows"])
+    st.dataframe(timings, hide_index=True, width="stretch")
+    if export_tracer.spans:
+        st.caption("Recent export builds")
+        st.dataframe(pd.DataFrame(export_tracer.spans, columns=["span", "ms", "rows"]), hide_index=True, width="stretch")
+    if tracer.path:
+        st.caption(f"Tracing to {tracer.path}")
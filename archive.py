@@ -0,0 +1,143 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from extract import build_record, district_settlements
+from writer import settlement_key
+
+ARCHIVE_DIR = "response_archive"
+
+try:
+    import zstandard
+except ImportError:  # gzip is always available
+    zstandard = None
+
+
+def _compress(raw):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(raw), ".json.zst"
+    return gzip.compress(raw, compresslevel=6), ".json.gz"
+
+
+def _decompress(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class ResponseArchive:
+    """
+    Local store of raw subdivision_search payloads.
+
+    Objects are content-addressed: objects/<ab>/<sha256>.json.zst (or .gz
+    without the zstandard package), so refetching an unchanged district
+    costs no extra space. index.jsonl is an append-only log mapping each
+    query (kind, province, district) to the object hash it returned.
+    """
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, "index.jsonl")
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+
+    def _object_path(self, digest, ext):
+        return os.path.join(self.root, "objects", digest[:2], digest + ext)
+
+    def _find(self, digest):
+        for ext in (".json.zst", ".json.gz"):
+            path = self._object_path(digest, ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def put(self, payload, query, kind, province, district=None):
+        """Stores one payload and logs the query; returns its content hash."""
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha256(raw).hexdigest()
+
+        if self._find(digest) is None:
+            blob, ext = _compress(raw)
+            path = self._object_path(digest, ext)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp, path)
+
+        entry = {"query": query, "kind": kind, "province": province, "district": district,
+                 "sha256": digest, "fetched_at": time.time()}
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return digest
+
+    def get(self, digest):
+        path = self._find(digest)
+        if path is None:
+            raise KeyError(digest)
+        return json.loads(_decompress(path))
+
+    def latest(self, kind=None):
+        """Most recent index entry per (kind, province, district), sorted by province/district."""
+        entries = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    e = json.loads(line)
+                    if kind is None or e["kind"] == kind:
+                        entries[(e["kind"], e["province"], e["district"] or "")] = e
+        return [entries[k] for k in sorted(entries)]
+
+
+def _extract_chunk(root, entries):
+    """Worker: rebuilds the (key, record) pairs of a chunk of archived district responses."""
+    archive = ResponseArchive(root)
+    keyed = []
+    for e in entries:
+        payload = archive.get(e["sha256"])
+        keyed.extend((settlement_key(v), build_record(e["province"], e["district"], v))
+                     for v in district_settlements(payload, e["district"]))
+    return keyed
+
+
+def reextract(root=ARCHIVE_DIR, output_file="Turkey_Settlements_Detailed.csv", workers=None):
+    """
+    Rebuilds the settlements CSV from archived district responses with the
+    current extraction code, spread over a process pool. Settlements seen in
+    several districts are kept once, like during the crawl. Returns the row count.
+    """
+    entries = ResponseArchive(root).latest(kind="district")
+    if not entries:
+        print(f"⚠️ No district responses archived in {root}.")
+        return 0
+
+    workers = workers or os.cpu_count() or 1
+    # A few contiguous chunks per worker keeps the pool busy when districts
+    # differ in size, and keeps the results in province/district order
+    size = -(-len(entries) // (workers * 4))
+    chunks = [entries[i:i + size] for i in range(0, len(entries), size)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(_extract_chunk, [root] * len(chunks), chunks))
+
+    seen = set()
+    records = []
+    for part in parts:
+        for key, record in part:
+            if key not in seen:
+                seen.add(key)
+                records.append(record)
+    df = pd.DataFrame(records)
+    df.to_csv(output_file, index=False, encoding='utf-16')
+    print(f"💾 Re-extracted {len(df)} records from {len(entries)} districts into {output_file}.")
+    return len(df)
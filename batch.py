@@ -0,0 +1,117 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from engine import Engine, Query, DATA_FILE, export_suffix
+
+# The loaded engine of this process. Forked workers inherit the parent's,
+# so the table and indexes are loaded once and their pages shared read-only.
+_ENGINE = None
+
+
+def _init_worker(csv_path):
+    global _ENGINE
+    if _ENGINE is None:
+        # Spawned worker (no fork on this platform): load from the snapshot,
+        # whose memory-mapped arrays are still shared through the page cache
+        _ENGINE = Engine.load(csv_path)
+
+
+def _run(i, query):
+    """Worker: filters and writes one query's export. Returns (i, rows, seconds, error)."""
+    start = time.perf_counter()
+    try:
+        rows = _ENGINE.rows(query)
+        os.makedirs(os.path.dirname(query.output) or ".", exist_ok=True)
+        _ENGINE.export(query, query.output, rows=rows)
+        return i, len(rows), time.perf_counter() - start, None
+    except Exception as e:
+        return i, 0, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+
+def load_queries(path, out_dir):
+    """
+    Queries from a JSON list or a JSON Lines file of Query fields. A query
+    without `output` is written to out_dir/<id or query_NNNN>.<ext>.
+    """
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    stripped = text.lstrip()
+    items = json.loads(text) if stripped.startswith('[') else [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    queries = []
+    for i, item in enumerate(items):
+        query = Query.from_dict(item)
+        if not query.output:
+            name = query.id or f"query_{i:04d}"
+            output = os.path.join(out_dir, name + export_suffix(query.format, query.split_by()))
+            query = Query.from_dict({**item, "output": output})
+        queries.append(query)
+
+    outputs = [q.output for q in queries]
+    duplicates = sorted({o for o in outputs if outputs.count(o) > 1})
+    if duplicates:
+        raise ValueError(f"Several queries write to: {', '.join(duplicates)}")
+    return queries
+
+
+def run_batch(queries, csv_path=DATA_FILE, workers=None, engine=None):
+    """Runs all queries over a process pool; returns the number that failed. `engine`: an already loaded one."""
+    global _ENGINE
+    start = time.perf_counter()
+    if engine is not None:
+        _ENGINE = engine
+    else:
+        _ENGINE = Engine.load(csv_path)
+        print(f"📂 Loaded {len(_ENGINE.df):,} settlements and their indexes in {time.perf_counter() - start:.1f}s")
+
+    if any(q.text or q.description or (q.area or {}).get("settlement") for q in queries):
+        # Search indexes are built on first use; do it before forking so the workers share them
+        _ENGINE.search_indexes
+
+    workers = min(workers or os.cpu_count() or 1, len(queries)) or 1
+    failed = 0
+
+    def report(query, rows, seconds, error):
+        nonlocal failed
+        if error:
+            failed += 1
+            print(f"   ❌ {query.id or query.output}: {error}")
+        else:
+            print(f"   💾 {query.output}: {rows:,} settlements ({seconds:.2f}s)")
+
+    if workers == 1:
+        for i, query in enumerate(queries):
+            report(query, *_run(i, query)[1:])
+    else:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork") if "fork" in methods else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(csv_path,)) as pool:
+            futures = [pool.submit(_run, i, q) for i, q in enumerate(queries)]
+            for future in as_completed(futures):
+                i, rows, seconds, error = future.result()
+                report(queries[i], rows, seconds, error)
+
+    print(f"🏁 {len(queries) - failed}/{len(queries)} exports written in {time.perf_counter() - start:.1f}s "
+          f"with {workers} worker(s).")
+    return failed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run a file of settlement queries and write all their exports.")
+    parser.add_argument("queries", help="JSON list or JSON Lines file of queries (see engine.Query).")
+    parser.add_argument("--data", default=DATA_FILE, help=f"Settlements CSV (default: {DATA_FILE}).")
+    parser.add_argument("--out-dir", default="batch_exports", help="Directory for queries without an output path.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    failed = run_batch(load_queries(args.queries, args.out_dir), args.data, args.workers)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from snapshot import build_snapshot, load_snapshot, snapshot_dir_for
+from token_index import TokenIndex
+from facets import FacetEngine, STAGES
+from mapview import GridBins, GRID_LEVELS, color_codes, colors_for
+from search import SearchIndex
+from spatial import SpatialGrid
+from exports import partition_rows, write_layers_zip, write_csv_file
+from synth import write_synthetic
+
+SIZES = [10_000, 100_000, 1_000_000]
+DATA_DIR = "bench_data"
+BASELINE_FILE = "bench_baseline.json"
+
+# A stage regresses when its median is this much slower than the baseline...
+DEFAULT_THRESHOLD = 0.25
+# ...and at least this many seconds slower (ignores noise on tiny timings)
+MIN_REGRESSION_SECONDS = 0.005
+
+
+def timed(fn, repeat):
+    """Runs fn `repeat` times; returns (last result, [seconds per run])."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def _most_common(index, k):
+    """The k tokens of a TokenIndex with the most rows."""
+    sizes = np.diff(index.offsets)
+    return [index.vocab[i] for i in np.argsort(-sizes, kind='stable')[:k]]
+
+
+def run_size(csv_path, repeat):
+    """Times each pipeline stage on one dataset. Returns {stage: {runs, median, min}}."""
+    timings = {}
+
+    def record(stage, fn, n=repeat):
+        result, times = timed(fn, n)
+        timings[stage] = {"runs": times, "median": statistics.median(times), "min": min(times)}
+        return result
+
+    snap = snapshot_dir_for(csv_path)
+    shutil.rmtree(snap, ignore_errors=True)
+    # Cold load parses the CSV and writes the snapshot; warm load maps it
+    record("load_cold", lambda: build_snapshot(csv_path), n=1)
+    df = record("load_warm", lambda: load_snapshot(csv_path))
+
+    indexes = record("token_indexes", lambda: {
+        'Province': TokenIndex(df['Province'], sep=None),
+        'District': TokenIndex(df['District'], sep=None),
+        'Ethnicity': TokenIndex(df['Ethnicity']),
+        'Tribes': TokenIndex(df['Tribes']),
+    }, n=1)
+
+    # A typical export session: the ten largest provinces and the four
+    # largest tribes (one ZIP layer each); all four stages are still counted
+    selections = {
+        'Province': _most_common(indexes['Province'], 10),
+        'District': [],
+        'Ethnicity': [],
+        'Tribes': _most_common(indexes['Tribes'], 4),
+    }
+
+    def cascade(engine):
+        counts = {stage: engine.counts(stage, selections) for stage in STAGES}
+        options = {stage: engine.options(stage, selections) for stage in STAGES}
+        return engine.mask(selections), counts, options
+
+    mask, _, _ = record("cascade_cold", lambda: cascade(FacetEngine(indexes)))
+    warm = FacetEngine(indexes)
+    cascade(warm)
+    record("cascade_warm", lambda: cascade(warm))
+    rows = np.flatnonzero(mask) if mask is not None else np.arange(len(df))
+
+    tribes = selections['Tribes']
+    # Colors of the filtered rows, as the points map draws them
+    record("map_colors", lambda: colors_for(color_codes(indexes['Tribes'], tribes, len(df))[rows]))
+    codes = color_codes(indexes['Tribes'], tribes, len(df))
+    grid = record("map_grid_build", lambda: GridBins(df['latitude'], df['longitude']), n=1)
+    level = list(GRID_LEVELS)[1]
+    record("map_aggregate", lambda: grid.aggregate(np.arange(len(df)), codes, level))
+
+    search = record("search_build", lambda: SearchIndex([df['Name'], df['Old_Name']], split={'Old_Name': '|'}), n=1)
+    record("search_query", lambda: search.search("kizil"))
+
+    spatial = record("spatial_build", lambda: SpatialGrid(df['latitude'], df['longitude']), n=1)
+    record("spatial_radius", lambda: spatial.radius(39.0, 35.0, 25))
+
+    out_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        def create_zip():
+            layers = partition_rows(indexes['Tribes'], tribes, rows)
+            write_layers_zip(df, layers, "Tribes", os.path.join(out_dir, "layers.zip"))
+
+        record("create_zip", create_zip)
+        record("export_csv", lambda: write_csv_file(df.iloc[rows], os.path.join(out_dir, "export.csv")))
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    timings["_rows"] = {"total": len(df), "filtered": int(len(rows))}
+    return timings
+
+
+def compare(results, baseline, threshold):
+    """Lists (size, stage, baseline median, median) for every stage that regressed."""
+    regressions = []
+    for size, stages in results["sizes"].items():
+        base = baseline.get("sizes", {}).get(size, {})
+        for stage, t in stages.items():
+            if stage.startswith("_") or stage not in base:
+                continue
+            before, after = base[stage]["median"], t["median"]
+            if after > before * (1 + threshold) and after - before > MIN_REGRESSION_SECONDS:
+                regressions.append((size, stage, before, after))
+    return regressions
+
+
+def print_table(results, baseline=None):
+    for size, stages in results["sizes"].items():
+        rows = stages.get("_rows", {})
+        print(f"\n📊 {int(size):,} rows ({rows.get('filtered', 0):,} after filters)")
+        base = (baseline or {}).get("sizes", {}).get(size, {})
+        for stage, t in stages.items():
+            if stage.startswith("_"):
+                continue
+            line = f"   {stage:<16} {t['median'] * 1000:10.1f} ms"
+            if stage in base:
+                ratio = t["median"] / base[stage]["median"] if base[stage]["median"] else float('inf')
+                line += f"   (baseline {base[stage]['median'] * 1000:.1f} ms, x{ratio:.2f})"
+            print(line)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time the app's data pipeline on synthetic datasets.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Row counts (default: 10k 100k 1M).")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per stage; the median is reported.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Where generated datasets are kept (default: bench_data).")
+    parser.add_argument("--output", default="bench_results.json", help="Results JSON file.")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline to compare against, if it exists.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown before a stage counts as a regression (0.25 = 25%%).")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "timestamp": time.time(),
+        },
+        "sizes": {},
+    }
+
+    for n in args.sizes:
+        path = os.path.join(args.data_dir, f"settlements_{n}_seed{args.seed}.csv")
+        if not os.path.exists(path):
+            write_synthetic(path, n, args.seed)
+        print(f"⏱️ Benchmarking {n:,} rows...")
+        results["sizes"][str(n)] = run_size(path, args.repeat)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+    print(f"\n💾 Results saved to {args.output}")
+
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"📌 Baseline updated: {args.baseline}")
+        return 0
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for size, stage, before, after in regressions:
+            print(f"❌ Regression at {int(size):,} rows: {stage} {before * 1000:.1f} ms -> {after * 1000:.1f} ms")
+        if regressions:
+            return 1
+        print(f"✅ No stage slower than the baseline by more than {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
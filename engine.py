@@ -0,0 +1,301 @@
+import json
+import threading
+from dataclasses import dataclass, field, fields
+
+import numpy as np
+
+from snapshot import load_snapshot, ensure_snapshot, has_index, save_index, load_index
+from token_index import TokenIndex
+from facets import FacetEngine, combine
+from spatial import SpatialGrid, polygons_from_geojson
+from search import SearchIndex, EXACT
+from exports import (partition_rows, write_csv_file, write_layers_zip, write_geojson, write_geojson_zip,
+                     write_umap, state_key, DEFAULT_COLOR)
+
+DATA_FILE = "Turkey_Settlements_Nisanyanmap.csv"
+
+EXPORT_FORMATS = ("csv", "zip", "geojson", "umap")
+
+
+@dataclass(frozen=True)
+class Query:
+    """
+    Declarative filter + export request, the same one the sidebar builds.
+
+    Facet lists are ANDed across stages and ORed within a stage. `text`
+    searches Name/Old_Name, `description` the description; with `fuzzy`
+    the name search also takes near misses (ranked last). `area` is None
+    or one of:
+        {"type": "radius", "lat": .., "lon": .., "km": ..}
+        {"type": "radius", "settlement": "Kızılca", "province": .., "district": .., "km": ..}
+        {"type": "bbox", "south": .., "west": .., "north": .., "east": ..}
+        {"type": "polygon", "geojson": {...}}  or  {"type": "polygon", "path": "area.geojson"}
+    """
+    provinces: tuple = ()
+    districts: tuple = ()
+    ethnicities: tuple = ()
+    tribes: tuple = ()
+    text: str = ""
+    description: str = ""
+    fuzzy: bool = False
+    area: dict = None
+    format: str = "csv"
+    output: str = None
+    id: str = field(default=None, compare=False)
+
+    @classmethod
+    def from_dict(cls, d):
+        known = {f.name for f in fields(cls)}
+        unknown = set(d) - known
+        if unknown:
+            raise ValueError(f"Unknown query field(s): {', '.join(sorted(unknown))}")
+        d = dict(d)
+        for key in ('provinces', 'districts', 'ethnicities', 'tribes'):
+            value = d.get(key) or ()
+            d[key] = (value,) if isinstance(value, str) else tuple(value)
+        if d.get('format', 'csv') not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown format {d['format']!r}; expected one of {', '.join(EXPORT_FORMATS)}")
+        return cls(**d)
+
+    def selections(self):
+        return {'Province': list(self.provinces), 'District': list(self.districts),
+                'Ethnicity': list(self.ethnicities), 'Tribes': list(self.tribes)}
+
+    def split_by(self):
+        """Column the layered exports and map colors split by: tribes first, else ethnicities."""
+        return "Tribes" if self.tribes else ("Ethnicity" if self.ethnicities else None)
+
+    def groups(self):
+        return list(self.tribes) if self.tribes else list(self.ethnicities)
+
+    def search_state(self):
+        """State of the filters outside the facet cascade (area, text searches), for cache keys."""
+        return {'area': self.area, 'name': self.text, 'fuzzy': self.fuzzy, 'desc': self.description}
+
+    def state(self):
+        """Filter state for cache keys (see exports.state_key); export options are not part of it."""
+        return {
+            'selections': {stage: sorted(values) for stage, values in self.selections().items()},
+            **self.search_state(),
+        }
+
+
+# Formats whose layers carry colors: the first selected group gets the first palette color
+COLORED_FORMATS = ("geojson", "umap")
+
+
+def export_key(query, fmt=None):
+    """
+    Cache key of a query's export file: its filter state and format, plus
+    the split column for layered formats. Query.state() sorts the
+    selections, so colored formats also key on the groups in selection order.
+    """
+    fmt = fmt or query.format
+    if fmt == "csv":
+        return state_key(format="csv", **query.state())
+    if fmt in COLORED_FORMATS:
+        return state_key(format=fmt, split=query.split_by(), groups=query.groups(), **query.state())
+    return state_key(format=fmt, split=query.split_by(), **query.state())
+
+
+def build_token_indexes(df):
+    # value/token -> sorted row positions
+    return {
+        'Province': TokenIndex(df['Province'], sep=None),
+        'District': TokenIndex(df['District'], sep=None),
+        'Ethnicity': TokenIndex(df['Ethnicity']),
+        'Tribes': TokenIndex(df['Tribes']),
+    }
+
+
+def build_search_indexes(df):
+    # Trigram indexes over Turkish-folded text; each "|"-separated old name is its own entry
+    return {
+        'name': SearchIndex([df['Name'], df['Old_Name']], split={'Old_Name': '|'}),
+        'desc': SearchIndex([df['Description']]),
+    }
+
+
+def save_indexes(engine, snapshot_dir):
+    """Persists the engine's indexes into the snapshot (see warmup.py); ones already there are kept."""
+    indexes = {f"token.{col}": index for col, index in engine.token_indexes.items()}
+    indexes.update({f"search.{name}": index for name, index in engine.search_indexes.items()})
+    indexes["spatial"] = engine.spatial
+    for name, index in indexes.items():
+        if not has_index(snapshot_dir, name):
+            save_index(snapshot_dir, name, index.state())
+
+
+def load_token_indexes(snapshot_dir, df):
+    states = {col: load_index(snapshot_dir, f"token.{col}") for col in ('Province', 'District', 'Ethnicity', 'Tribes')}
+    if any(state is None or state["n_rows"] != len(df) for state in states.values()):
+        return None
+    return {col: TokenIndex.from_state(state) for col, state in states.items()}
+
+
+def load_search_indexes(snapshot_dir, df):
+    states = {name: load_index(snapshot_dir, f"search.{name}") for name in ('name', 'desc')}
+    if any(state is None or state["n_rows"] != len(df) for state in states.values()):
+        return None
+    return {name: SearchIndex.from_state(state) for name, state in states.items()}
+
+
+def load_spatial(snapshot_dir, df):
+    state = load_index(snapshot_dir, "spatial")
+    return SpatialGrid.from_state(state, df['latitude'], df['longitude']) if state is not None else None
+
+
+def export_suffix(fmt, split_col):
+    if fmt == "geojson":
+        return ".zip" if split_col else ".geojson"
+    return "." + fmt
+
+
+class Engine:
+    """
+    The app's filter and export pipeline without Streamlit: one loaded
+    table plus its token, search and spatial indexes, all read-only after
+    construction. Indexes not passed in are built here, except the search
+    indexes: the slowest to build and only needed by text search, they
+    are built (or read from `snapshot_dir`) on first use. With a `store`
+    (store.SettlementStore imported from the same CSV), facet filters are
+    answered by its indexed SQL query instead of the token indexes.
+    """
+
+    def __init__(self, df, token_indexes=None, search_indexes=None, spatial=None, store=None, snapshot_dir=None):
+        self.df = df
+        self.token_indexes = token_indexes or build_token_indexes(df)
+        self.spatial = spatial or SpatialGrid(df['latitude'], df['longitude'])
+        self.facets = FacetEngine(self.token_indexes)
+        self.store = store
+        self.snapshot_dir = snapshot_dir
+        self._search_indexes = search_indexes
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, csv_path=DATA_FILE, df=None, store=None):
+        """
+        Engine over the CSV's snapshot (`df`: the table already loaded from
+        it). Indexes persisted in the snapshot by warmup.py are memory-mapped
+        instead of built.
+        """
+        snapshot_dir = ensure_snapshot(csv_path)
+        df = load_snapshot(csv_path, snapshot_dir) if df is None else df
+        return cls(df, load_token_indexes(snapshot_dir, df), spatial=load_spatial(snapshot_dir, df), store=store,
+                   snapshot_dir=snapshot_dir)
+
+    @property
+    def search_indexes(self):
+        if self._search_indexes is None:
+            # Sessions share the engine: build once, whoever searches first
+            with self._lock:
+                if self._search_indexes is None:
+                    loaded = load_search_indexes(self.snapshot_dir, self.df) if self.snapshot_dir else None
+                    self._search_indexes = loaded or build_search_indexes(self.df)
+        return self._search_indexes
+
+    def settlement_row(self, name, province=None, district=None):
+        """Row position of the first settlement with coordinates named `name` (folded match)."""
+        rows, scores = self.search_indexes['name'].search(name, fuzzy=False)
+        rows = rows[(scores == EXACT) & ~np.isnan(self.spatial.lat[rows])]
+        if province:
+            rows = rows[self.df['Province'].to_numpy()[rows] == province]
+        if district:
+            rows = rows[self.df['District'].to_numpy()[rows] == district]
+        if not len(rows):
+            raise ValueError(f"No settlement with coordinates named {name!r}")
+        return int(rows[0])
+
+    def area_mask(self, area):
+        if not area:
+            return None
+        kind = area.get("type")
+        if kind == "radius":
+            if "settlement" in area:
+                row = self.settlement_row(area["settlement"], area.get("province"), area.get("district"))
+                lat, lon = self.spatial.lat[row], self.spatial.lon[row]
+            else:
+                lat, lon = area["lat"], area["lon"]
+            return self.spatial.radius(lat, lon, area["km"])
+        if kind == "bbox":
+            return self.spatial.bbox(area["south"], area["west"], area["north"], area["east"])
+        if kind == "polygon":
+            geojson = area.get("geojson")
+            if geojson is None:
+                with open(area["path"], encoding='utf-8') as f:
+                    geojson = json.load(f)
+            polygons = polygons_from_geojson(geojson)
+            if not polygons:
+                raise ValueError("No Polygon or MultiPolygon found in the area GeoJSON")
+            return self.spatial.polygons(polygons)
+        raise ValueError(f"Unknown area type {kind!r}")
+
+    def search_mask(self, query):
+        """
+        (mask, scores) of the query's filters outside the facet cascade:
+        the area and the text searches. Facet counts are taken under this
+        mask, so it is also what the sidebar computes before its multiselects.
+        """
+        mask = self.area_mask(query.area)
+
+        # Text searches ignore case and Turkish diacritics ("kizilca" finds "Kızılca").
+        # Near misses of the name only when asked for: they would widen every count and export.
+        scores = None
+        for text, index, fuzzy in ((query.text, 'name', query.fuzzy), (query.description, 'desc', False)):
+            if text:
+                s = self.search_indexes[index].scores(text, fuzzy=fuzzy)
+                mask = combine(mask, s > 0)
+                scores = s if scores is None else scores + s
+        return mask, scores
+
+    def filter(self, query, facets=None, searched=None):
+        """
+        (mask, scores) for a query: mask is a boolean array over row
+        positions (None = all rows), scores the summed text search scores
+        (None without a text search). `facets` is a FacetEngine to memoize
+        in; the engine's own (shared by the app's sessions) by default.
+        `searched` is search_mask(query), when the caller already has it.
+        """
+        if self.store is not None:
+            facet_mask = self.store.mask(query.selections(), len(self.df))
+        else:
+            facet_mask = (facets or self.facets).mask(query.selections())
+        search_mask, scores = searched or self.search_mask(query)
+        return combine(facet_mask, search_mask), scores
+
+    def rows(self, query, facets=None):
+        """Row positions matching the query; best text matches first when searching."""
+        mask, scores = self.filter(query, facets)
+        rows = np.arange(len(self.df)) if mask is None else np.flatnonzero(mask)
+        if scores is not None:
+            rows = rows[np.argsort(-scores[rows], kind='stable')]
+        return rows
+
+    def layers(self, query, rows):
+        """{group: row positions} of the selected tribes (else ethnicities) among rows."""
+        # A point in several groups appears in several layers.
+        return partition_rows(self.token_indexes[query.split_by()], query.groups(), rows)
+
+    def export(self, query, path, fmt=None, rows=None):
+        """Writes the query's export (query.format unless `fmt` is given) to path."""
+        fmt = fmt or query.format
+        rows = self.rows(query) if rows is None else rows
+        split_col = query.split_by()
+        if fmt == "csv":
+            write_csv_file(self.df.iloc[rows], path)
+        elif fmt == "zip":
+            if not split_col:
+                raise ValueError("ZIP export needs tribes or ethnicities to split by")
+            write_layers_zip(self.df, self.layers(query, rows), split_col, path)
+        elif fmt == "geojson":
+            # One FeatureCollection per layer (zipped) when splitting, else a single file
+            if split_col:
+                write_geojson_zip(self.df, self.layers(query, rows), split_col, path)
+            else:
+                write_geojson(self.df, rows, DEFAULT_COLOR, path)
+        elif fmt == "umap":
+            layers = self.layers(query, rows) if split_col else {"Settlements": rows}
+            write_umap(self.df, layers, path)
+        else:
+            raise ValueError(f"Unknown format {fmt!r}")
+        return path
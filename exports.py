@@ -0,0 +1,225 @@
+import atexit
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+# Rows serialized per to_csv call; bounds the memory of one write step
+CSV_CHUNK_ROWS = 20_000
+
+# Layer colors (hex), assigned to the selected groups in order; the map tab uses the same
+PALETTE = [
+    '#FF0000', '#00FF00', '#0000FF', '#FFFF00', '#00FFFF', '#FF00FF',
+    '#FFA500', '#800080', '#008000', '#000080', '#800000', '#008080'
+]
+DEFAULT_COLOR = '#FF0000'
+
+# Columns that become geometry rather than feature properties
+GEOMETRY_COLUMNS = ('Coordinates', 'latitude', 'longitude')
+
+
+def state_key(**state):
+    """Stable hash of a filter/export state (selections, searches, format, ...)."""
+    raw = json.dumps(state, sort_keys=True, ensure_ascii=False, default=list)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def safe_filename(name):
+    return "".join([c for c in name if c.isalnum() or c in (' ', '-', '_')]).strip()
+
+
+def partition_rows(index, groups, rows):
+    """
+    {group: sorted row positions} for the given tokens of a TokenIndex,
+    restricted to `rows` (positions of the filtered frame). One pass over the
+    index's (row, token) pairs instead of one scan per group.
+    """
+    mask = np.zeros(index.n_rows, dtype=bool)
+    mask[rows] = True
+    ids = {g: i for g in groups if (i := index.token_id(g)) is not None}
+    wanted = np.zeros(len(index.vocab), dtype=bool)
+    wanted[list(ids.values())] = True
+
+    hit = wanted[index.token_ids] & mask[index.row_ids]
+    hit_tokens, hit_rows = index.token_ids[hit], index.row_ids[hit]
+    # Pairs are sorted by token, so each group is one contiguous slice
+    bounds = np.searchsorted(hit_tokens, np.arange(len(index.vocab) + 1))
+    return {g: hit_rows[bounds[i]:bounds[i + 1]] for g, i in ids.items()}
+
+
+def write_csv(df, out, rows=None):
+    """Writes df (or the given row positions of it) as UTF-8 CSV to a text stream, chunk by chunk."""
+    n = len(df) if rows is None else len(rows)
+    if n == 0:
+        df.iloc[:0].to_csv(out, index=False)
+    for start in range(0, n, CSV_CHUNK_ROWS):
+        part = df.iloc[start:start + CSV_CHUNK_ROWS] if rows is None else df.iloc[rows[start:start + CSV_CHUNK_ROWS]]
+        part.to_csv(out, index=False, header=start == 0)
+
+
+def write_csv_file(df, path):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        write_csv(df, f)
+
+
+def write_layers_zip(df, groups, split_col, path):
+    """
+    One CSV per group in a ZIP at `path`. `groups` maps group -> row
+    positions of df; empty groups are left out. Entries are streamed into
+    the archive on disk, so memory does not grow with the number of layers.
+    """
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for group, rows in groups.items():
+            if not len(rows):
+                continue
+            with zip_file.open(f"{split_col}_{safe_filename(group)}.csv", "w") as raw:
+                with io.TextIOWrapper(raw, encoding='utf-8', newline='') as out:
+                    write_csv(df, out, rows)
+
+
+def group_colors(groups):
+    """{group: palette color} in selection order, as on the map."""
+    return {g: PALETTE[i % len(PALETTE)] for i, g in enumerate(groups)}
+
+
+def feature_collection(df, rows=None, color=DEFAULT_COLOR):
+    """
+    GeoJSON FeatureCollection (as a string) of the given row positions of df
+    that have coordinates. Properties are all non-geometry columns plus
+    `color`. Serialization is columnar: pandas' C JSON encoder writes the
+    property objects and coordinates are formatted as whole arrays; no
+    per-row dicts are built.
+    """
+    sub = df if rows is None else df.iloc[rows]
+    has_coords = sub['latitude'].notna().to_numpy() & sub['longitude'].notna().to_numpy()
+    if not has_coords.all():
+        sub = sub[has_coords]
+    if sub.empty:
+        return '{"type":"FeatureCollection","features":[]}'
+
+    props = sub[[c for c in sub.columns if c not in GEOMETRY_COLUMNS]].assign(color=color)
+    props_json = props.to_json(orient='records', lines=True, force_ascii=False).rstrip('\n').split('\n')
+    # Rounded to 5 decimals (~1 m, float32 precision) so coordinates print as written
+    lon = np.round(sub['longitude'].to_numpy(dtype=np.float64), 5).astype(str)
+    lat = np.round(sub['latitude'].to_numpy(dtype=np.float64), 5).astype(str)
+
+    head = '{"type":"Feature","geometry":{"type":"Point","coordinates":['
+    features = (head + lon + ',' + lat + ']},"properties":').astype(object) + np.array(props_json, dtype=object) + '}'
+    return '{"type":"FeatureCollection","features":[' + ','.join(features) + ']}'
+
+
+def write_geojson(df, rows, color, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(feature_collection(df, rows, color))
+
+
+def write_geojson_zip(df, groups, split_col, path):
+    """One .geojson FeatureCollection per group (colored as on the map) in a ZIP."""
+    colors = group_colors(groups)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for group, rows in groups.items():
+            if len(rows):
+                zip_file.writestr(f"{split_col}_{safe_filename(group)}.geojson",
+                                  feature_collection(df, rows, colors[group]).encode('utf-8'))
+
+
+def write_umap(df, groups, path, name="Nisanyan Settlements"):
+    """
+    A uMap import file (.umap): one datalayer per group, each a GeoJSON
+    FeatureCollection with its color in _umap_options and on every feature.
+    """
+    colors = group_colors(groups)
+    layers = []
+    for group, rows in groups.items():
+        if not len(rows):
+            continue
+        options = json.dumps({"name": group, "color": colors[group], "displayOnLoad": True}, ensure_ascii=False)
+        # Splice the options into the already-serialized collection
+        layers.append(feature_collection(df, rows, colors[group])[:-1] + ',"_umap_options":' + options + '}')
+
+    # The map opens on the exported settlements, not on everything loaded
+    rows = np.unique(np.concatenate(list(groups.values()))) if groups else np.empty(0, dtype=np.int64)
+    sub = df.iloc[rows]
+    lat, lon = sub['latitude'].mean(), sub['longitude'].mean()
+    center = [round(float(lon), 5), round(float(lat), 5)] if pd.notna(lat) and pd.notna(lon) else [35.0, 39.0]
+    header = json.dumps({
+        "type": "umap",
+        "properties": {"name": name, "zoom": 6},
+        "geometry": {"type": "Point", "coordinates": center},
+    }, ensure_ascii=False)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(header[:-1] + ',"layers":[' + ','.join(layers) + ']}')
+
+
+class ExportCache:
+    """
+    Bounded, thread-safe cache of generated export files, keyed by the hash
+    of the filter state and format. Files live in a private temp dir; the
+    least recently used one is deleted when the cache is full. The lock
+    only guards the bookkeeping: builds run outside it, and callers asking
+    for a key that is being built wait for that build alone.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self.dir = tempfile.mkdtemp(prefix="settlement_exports_")
+        atexit.register(shutil.rmtree, self.dir, True)
+        self._paths = {}
+        self._order = []
+        # key -> Future of its bytes, while the first caller builds it
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def _touch(self, key):
+        if key in self._order:
+            self._order.remove(key)
+        self._order.append(key)
+
+    def get_or_build(self, key, build, suffix):
+        """Returns the file bytes for `key`, calling build(path) to create it on a miss."""
+        with self._lock:
+            path = self._paths.get(key)
+            if path is not None:
+                self._touch(key)
+                # Opened under the lock, so an eviction right after can't delete it before the read
+                f = open(path, 'rb')
+            else:
+                future = self._building.get(key)
+                building = future is None
+                if building:
+                    future = self._building[key] = Future()
+        if path is not None:
+            with f:
+                return f.read()
+        if not building:
+            return future.result()
+
+        path = os.path.join(self.dir, key + suffix)
+        try:
+            build(path)
+            with open(path, 'rb') as f:
+                data = f.read()
+        except BaseException as e:
+            with self._lock:
+                del self._building[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._building[key]
+            self._paths[key] = path
+            self._touch(key)
+            evicted = []
+            while len(self._order) > self.max_entries:
+                evicted.append(self._paths.pop(self._order.pop(0)))
+        for old in evicted:
+            os.remove(old)
+        future.set_result(data)
+        return data
@@ -0,0 +1,103 @@
+# Flattening of subdivision_search payloads into settlement rows.
+# Kept free of browser imports so offline tools (reextract) can use it.
+
+def extract_list_items(data_dict):
+    """Helper to extract items from before/after structures."""
+    return ", ".join(list_items(data_dict))
+
+def list_items(data_dict):
+    """The items of a before/after structure (tribes, communities) as a list of strings."""
+    if not data_dict:
+        return []
+    
+    results = []
+    
+    # Process both 'before' and 'after' keys
+    for key in ['before', 'after']:
+        section = data_dict.get(key)
+        if not section:
+            continue
+            
+        if isinstance(section, list):
+             results.extend([str(i) for i in section])
+        elif isinstance(section, dict):
+            items = section.get('items', [])
+            # print(f"DEBUG: Extracting from {key}, items: {len(items)}") # Uncomment for verbose debugging
+            for i in items:
+                if isinstance(i, dict):
+                    # The item itself is the name object (e.g. {'tr': 'Yörük'})
+                    extracted = i.get('tr')
+                    if extracted:
+                        results.append(extracted)
+                    else:
+                         results.append(str(i))
+                elif isinstance(i, str):
+                    results.append(i)
+                else:
+                    results.append(str(i))
+    
+    return results
+
+def extract_old_names(old_names_list):
+    """Parses the detailed oldNames list into a readable string."""
+    if not old_names_list:
+        return "N/A"
+    
+    results = []
+    for item in old_names_list:
+        name = item.get('name', '')
+        # Add language if present
+        langs = [lang.get('tr', '') for lang in item.get('languages', []) if lang.get('tr')]
+        lang_str = f" ({', '.join(langs)})" if langs else ""
+        
+        # Add definition/note if present
+        defn = item.get('definition', {}).get('tr', '')
+        defn_str = f" [{defn}]" if defn else ""
+        
+        # Add romanized text if different
+        rom = item.get('romanizedText', '')
+        rom_str = f" / {rom}" if rom and rom != name else ""
+        
+        full_entry = f"{name}{lang_str}{rom_str}{defn_str}"
+        results.append(full_entry)
+        
+    return " | ".join(results)
+
+def old_name_entries(old_names_list):
+    """The oldNames list as dicts of name, languages (list), romanized text and definition."""
+    entries = []
+    for item in old_names_list or []:
+        name = item.get('name', '')
+        rom = item.get('romanizedText', '')
+        entries.append({
+            "name": name,
+            "languages": [lang.get('tr', '') for lang in item.get('languages', []) if lang.get('tr')],
+            "romanized": rom if rom and rom != name else None,
+            "definition": item.get('definition', {}).get('tr', '') or None,
+        })
+    return entries
+
+def build_record(province, district_name, v):
+    """Flattens one settlement from the district payload into a CSV row."""
+    return {
+        "Province": province,
+        "District": district_name,
+        "Name": v.get('name'),
+        "Type": v.get('locationType', {}).get('name', {}).get('tr', 'N/A'),
+        "Old_Name": extract_old_names(v.get('oldNames')),
+        "Description": v.get('note', {}).get('tr', 'N/A'),
+        "Tribes": extract_list_items(v.get('tribes')),
+        "Ethnicity": extract_list_items(v.get('communities')),
+        "Coordinates": str(v.get('coordinates', [])),
+        "Original_Text": v.get('originalText', 'N/A')
+    }
+
+def province_districts(payload):
+    """District names listed in a province search payload."""
+    locations = payload.get('locations', [])
+    return [loc.get('name') for loc in locations if loc.get('locationType', {}).get('name', {}).get('tr') == 'ilçe']
+
+def district_settlements(payload, district_name):
+    """Settlements (villages, neighborhoods, etc.) in a district search payload."""
+    # Exclude the district itself if it appears
+    return [l for l in payload.get('locations', []) if l.get('name') != district_name]
@@ -0,0 +1,156 @@
+import threading
+from collections import OrderedDict
+
+# Sidebar cascade order: each stage's options depend on the stages before it
+STAGES = ('Province', 'District', 'Ethnicity', 'Tribes')
+
+# Bytes of memoized row masks per FacetEngine cache; a mask is one byte per
+# row, so this holds 64 masks at 1M rows and many more on smaller data
+MASK_CACHE_BYTES = 64 << 20
+
+
+def _nbytes(value):
+    # Masks are what take memory; anything else (counts dicts) is counted by maxsize only
+    return getattr(value, 'nbytes', 0)
+
+
+class LRUCache:
+    """
+    Small bounded mapping that evicts the least recently used key, once it
+    holds more than `maxsize` keys or, with `maxbytes`, more array bytes.
+    Safe to share between threads (sessions).
+    """
+
+    def __init__(self, maxsize=128, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= _nbytes(self._data[key])
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self.nbytes += _nbytes(value)
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes
+                                                     and len(self._data) > 1):
+                _, evicted = self._data.popitem(last=False)
+                self.nbytes -= _nbytes(evicted)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+def selection_key(selection):
+    """Order-insensitive, hashable form of a multiselect value."""
+    return tuple(sorted(selection)) if selection else ()
+
+
+def combine(a, b):
+    """AND two row masks, where None means "no filter"."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a & b
+
+
+class FacetEngine:
+    """
+    Incremental Province -> District -> Ethnicity -> Tribes cascade.
+
+    Masks are boolean arrays over df row positions (None = all rows).
+    Each stage's own mask is memoized by its selection, and each cumulative
+    mask by the selections of every stage up to it, so a rerun only
+    recomputes the stages at or after the widget that changed. Keys are
+    the selections alone, so one engine can serve every session; the mask
+    caches are bounded by `maxbytes` each, not just by entry count.
+    """
+
+    def __init__(self, indexes, maxsize=64, maxbytes=MASK_CACHE_BYTES):
+        # indexes: stage name -> TokenIndex over that column
+        self.indexes = indexes
+        self._stage_masks = LRUCache(maxsize, maxbytes)
+        self._prefix_masks = LRUCache(maxsize, maxbytes)
+        self._counts = LRUCache(maxsize)
+
+    def stage_mask(self, stage, selection):
+        """Rows matching any selected value of one stage, or None if nothing is selected."""
+        key = (stage, selection_key(selection))
+        if not key[1]:
+            return None
+        mask = self._stage_masks.get(key)
+        if mask is None:
+            mask = self.indexes[stage].mask_any(key[1])
+            self._stage_masks[key] = mask
+        return mask
+
+    def mask(self, selections, upto=None):
+        """
+        Cumulative mask of all stages before `upto` (all stages if None).
+        `selections` maps stage name -> selected values.
+        """
+        stages = STAGES if upto is None else STAGES[:STAGES.index(upto)]
+        mask = None
+        prefix = ()
+        for stage in stages:
+            prefix += (selection_key(selections.get(stage)),)
+            if not prefix[-1]:
+                continue
+            cached = self._prefix_masks.get(prefix)
+            if cached is None:
+                cached = combine(mask, self.stage_mask(stage, selections.get(stage)))
+                self._prefix_masks[prefix] = cached
+            mask = cached
+        return mask
+
+    def options(self, stage, selections):
+        """Sorted values of `stage` present under the upstream stages' filters."""
+        return self.indexes[stage].tokens_in(self.mask(selections, upto=stage))
+
+    def others_mask(self, stage, selections, base=None):
+        """
+        Mask of every stage except `stage`, ANDed with `base` (the filters
+        outside the cascade), i.e. what its options would be combined with.
+        """
+        mask = base
+        for other in STAGES:
+            if other != stage:
+                mask = combine(mask, self.stage_mask(other, selections.get(other)))
+        return mask
+
+    def counts(self, stage, selections, base=None, base_key=None):
+        """
+        {value: settlements it would return} for every value of `stage`,
+        given the current selections of the other stages and `base`, the
+        mask of the filters outside the cascade (text search, area; None =
+        none). Cached by that filter state, `base_key` standing for the
+        base (a base without a key is not cached), so going back to an
+        earlier selection is a lookup.
+        """
+        cacheable = base is None or base_key is not None
+        key = (stage, base_key if base is not None else None) + tuple(
+            selection_key(selections.get(s)) for s in STAGES if s != stage)
+        counts = self._counts.get(key) if cacheable else None
+        if counts is None:
+            index = self.indexes[stage]
+            per_token = index.counts(self.others_mask(stage, selections, base))
+            counts = dict(zip(index.vocab, per_token.tolist()))
+            if cacheable:
+                self._counts[key] = counts
+        return counts
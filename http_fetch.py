@@ -0,0 +1,104 @@
+import urllib.parse
+
+# Headers that describe the browser's own connection rather than the request;
+# httpx sets these itself (and decodes gzip/deflate transparently).
+SKIP_HEADERS = {'host', 'content-length', 'connection', 'accept-encoding', 'cookie'}
+
+
+class Paging:
+    """
+    How to request later pages of a search whose totalCount exceeds the
+    locations it returned. The site's parameter isn't documented, so it is
+    configured: `param` is its name; style "page" sends page numbers (the
+    first page being `start`), style "offset" the number of locations to skip.
+    """
+
+    def __init__(self, param, style="page", start=1):
+        if style not in ("page", "offset"):
+            raise ValueError(f"Unknown paging style {style!r}; expected page or offset")
+        self.param = param
+        self.style = style
+        self.start = start
+
+    def params(self, index, per_page):
+        """Query parameters for the 0-based page `index`; page 0 is the plain search."""
+        value = self.start + index if self.style == "page" else index * per_page
+        return {self.param: str(value)}
+
+    def offset(self, value, per_page):
+        """Locations skipped by a request that sent `value` for `param` (None = the plain search); inverse of params."""
+        if value is None:
+            return 0
+        skip = (int(value) - self.start) * per_page if self.style == "page" else int(value)
+        return max(0, skip)
+
+
+class HttpFetcher:
+    """
+    Browserless backend: calls the subdivision_search JSON endpoint directly
+    with one pooled async HTTP client (keep-alive, HTTP/2 when the h2 package
+    is installed, gzip). `url_template` contains "{query}" where the
+    URL-encoded search text goes.
+
+    Needs httpx (pip install "httpx[http2]"); the browser path doesn't.
+    """
+
+    def __init__(self, url_template, headers=None, cookies=None, max_connections=10, timeout=15.0):
+        try:
+            import httpx
+        except ImportError as e:
+            raise RuntimeError('The http backend needs httpx: pip install "httpx[http2]"') from e
+
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+
+        self.url_template = url_template
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            headers=headers,
+            cookies=cookies,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def url_for(self, query):
+        return self.url_template.replace("{query}", urllib.parse.quote(query))
+
+    async def search(self, query, timeout=None, params=None):
+        """Returns the decoded JSON payload (with 'locations') for one search; `params` are extra query parameters."""
+        kwargs = {"timeout": timeout} if timeout else {}
+        url = self.url_for(query)
+        if params:
+            # Appended by hand: httpx's params= would replace the template's own query string
+            url += ("&" if "?" in url else "?") + urllib.parse.urlencode(params)
+        response = await self.client.get(url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    @classmethod
+    async def from_response(cls, response, query, context, **kwargs):
+        """
+        Builds a fetcher that replays a subdivision_search request the browser
+        already made: same URL shape, headers and cookies.
+        """
+        url = response.url
+        encoded = urllib.parse.quote(query)
+        if encoded not in url:
+            raise ValueError(f"Query {query!r} not found in captured URL {url}")
+        template = url.replace(encoded, "{query}", 1)
+
+        request_headers = await response.request.all_headers()
+        headers = {k: v for k, v in request_headers.items()
+                   if not k.startswith(':') and k.lower() not in SKIP_HEADERS}
+
+        cookies = {}
+        for c in await context.cookies(url):
+            cookies[c['name']] = c['value']
+
+        return cls(template, headers=headers, cookies=cookies, **kwargs)
@@ -0,0 +1,234 @@
+import json
+import random
+import sqlite3
+import time
+
+from refresh import record_hash
+
+JOURNAL_FILE = "crawl_journal.sqlite"
+
+# Job states
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+# District of the job that lists a province's districts
+PROVINCE_JOB = ""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS provinces (
+    province   TEXT PRIMARY KEY,
+    districts  TEXT NOT NULL,          -- JSON list of district names
+    listed_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    province    TEXT NOT NULL,
+    district    TEXT NOT NULL,         -- '' for the province listing job
+    state       TEXT NOT NULL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    records     INTEGER NOT NULL DEFAULT 0,
+    started_at  REAL,
+    finished_at REAL,
+    duration    REAL,
+    error       TEXT,
+    expected    INTEGER,               -- totalCount the search reported
+    captured    INTEGER,               -- locations actually received (all pages)
+    content_hash TEXT,                 -- refresh.content_hash of the district's normalized response
+    PRIMARY KEY (province, district)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+CREATE TABLE IF NOT EXISTS settlements (
+    key       TEXT PRIMARY KEY,        -- writer.settlement_key
+    province  TEXT NOT NULL,
+    district  TEXT NOT NULL,
+    hash      TEXT,                    -- refresh.record_hash of the written record
+    record    TEXT                     -- that record as JSON, to find and diff it on refresh
+);
+CREATE INDEX IF NOT EXISTS settlements_district ON settlements (province, district);
+CREATE TABLE IF NOT EXISTS rewrites (
+    row       TEXT PRIMARY KEY,        -- JSON list of a CSV row's values, as refresh.ChangeLog matches it
+    record    TEXT                     -- the record replacing it as JSON; NULL drops the row
+);
+"""
+
+# Columns added after the first release, for journals created before them
+MIGRATIONS = [
+    ("jobs", "expected", "INTEGER"),
+    ("jobs", "captured", "INTEGER"),
+    ("jobs", "content_hash", "TEXT"),
+    ("settlements", "hash", "TEXT"),
+    ("settlements", "record", "TEXT"),
+]
+
+
+def _hashed(record):
+    """(hash, JSON) columns for a settlements row; (None, None) without a record."""
+    if record is None:
+        return None, None
+    return record_hash(record), json.dumps(record, ensure_ascii=False)
+
+
+class CrawlJournal:
+    """
+    Embedded SQLite journal of the crawl, one row per (province, district) job
+    with its state, attempt count, record count and timing. Lets a restart
+    skip finished districts without reading the output CSV, and lets a retry
+    pass pick out exactly the failed ones.
+    """
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        for table, column, kind in MIGRATIONS:
+            columns = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            if columns and column not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+        self.conn.executescript(SCHEMA)
+        # Loaded once; state checks during the crawl are O(1) dict lookups
+        self._states = {(p, d): state for p, d, state in self.conn.execute("SELECT province, district, state FROM jobs")}
+
+    def close(self):
+        self.conn.close()
+
+    def state(self, province, district=PROVINCE_JOB):
+        """Job state, or None if the job was never started."""
+        return self._states.get((province, district))
+
+    def districts(self, province):
+        """District names recorded for a province, or None if it was never listed."""
+        row = self.conn.execute("SELECT districts FROM provinces WHERE province = ?", (province,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def record_districts(self, province, districts):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO provinces (province, districts, listed_at) VALUES (?, ?, ?)",
+                (province, json.dumps(districts, ensure_ascii=False), time.time()),
+            )
+
+    def start(self, province, district=PROVINCE_JOB):
+        with self.conn:
+            self.conn.execute(
+                """INSERT INTO jobs (province, district, state, attempts, started_at) VALUES (?, ?, ?, 1, ?)
+                   ON CONFLICT (province, district) DO UPDATE
+                   SET state = excluded.state, attempts = attempts + 1, started_at = excluded.started_at, error = NULL""",
+                (province, district, RUNNING, time.time()),
+            )
+        self._states[(province, district)] = RUNNING
+
+    def finish(self, province, district=PROVINCE_JOB, records=0, keys=(), expected=None, captured=None,
+               settlements=None, content_hash=None):
+        """
+        Marks the job done, together with the settlement keys it wrote. A
+        district's records add up over attempts (a refetch only writes the
+        settlements it newly found). `expected`/`captured` are the search's
+        totalCount and the locations received, for the completeness report.
+        `settlements` ({key: record}) and `content_hash` keep what a later
+        refresh diffs against.
+        """
+        settlements = settlements or {}
+        if keys:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO settlements (key, province, district, hash, record) VALUES (?, ?, ?, ?, ?)",
+                    [(k, province, district, *_hashed(settlements.get(k))) for k in keys],
+                )
+        self._end(province, district, DONE, records, None, expected, captured, content_hash)
+
+    def fail(self, province, district=PROVINCE_JOB, error=None):
+        self._end(province, district, FAILED, 0, str(error) if error else None)
+
+    def _end(self, province, district, state, records, error, expected=None, captured=None, content_hash=None):
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                """UPDATE jobs SET state = ?, records = CASE WHEN district = '' THEN ? ELSE records + ? END,
+                   error = ?, finished_at = ?, duration = ? - started_at,
+                   expected = COALESCE(?, expected), captured = COALESCE(?, captured),
+                   content_hash = COALESCE(?, content_hash)
+                   WHERE province = ? AND district = ?""",
+                (state, records, records, error, now, now, expected, captured, content_hash, province, district),
+            )
+        self._states[(province, district)] = state
+
+    def content_hash(self, province, district):
+        row = self.conn.execute("SELECT content_hash FROM jobs WHERE province = ? AND district = ?",
+                                (province, district)).fetchone()
+        return row[0] if row else None
+
+    def owned_settlements(self, province, district):
+        """{key: (hash, record)} of the settlements written for a district; hash and record are None for old rows."""
+        rows = self.conn.execute("SELECT key, hash, record FROM settlements WHERE province = ? AND district = ?",
+                                 (province, district))
+        return {k: (h, json.loads(r) if r else None) for k, h, r in rows}
+
+    def update_settlements(self, province, district, changed=None, removed=(), rewrites=None):
+        """
+        Stores new versions ({key: record}) of a district's settlements and
+        forgets removed keys. `rewrites` ({CSV row tuple: record or None})
+        are the output CSV rows these changes make stale; they are kept, in
+        the same transaction, until clear_rewrites says the CSV has them.
+        """
+        with self.conn:
+            self.conn.executemany("UPDATE settlements SET hash = ?, record = ? WHERE key = ?",
+                                  [(*_hashed(record), k) for k, record in (changed or {}).items()])
+            self.conn.executemany("DELETE FROM settlements WHERE key = ?", [(k,) for k in removed])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO rewrites (row, record) VALUES (?, ?)",
+                [(json.dumps(row, ensure_ascii=False), _hashed(record)[1]) for row, record in (rewrites or {}).items()],
+            )
+
+    def pending_rewrites(self):
+        """{CSV row tuple: record or None} not applied to the output CSV yet (see update_settlements)."""
+        rows = self.conn.execute("SELECT row, record FROM rewrites")
+        return {tuple(json.loads(row)): json.loads(record) if record else None for row, record in rows}
+
+    def clear_rewrites(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM rewrites")
+
+    def refresh_candidates(self, limit=None, sample=None, seed=None):
+        """
+        (province, district) of finished district jobs to revisit, least
+        recently finished first: the `limit` oldest, or a random `sample`
+        fraction of them (both = a sample of the oldest `limit`).
+        """
+        rows = self.conn.execute(
+            "SELECT province, district FROM jobs WHERE state = ? AND district != '' ORDER BY finished_at, province, "
+            "district", (DONE,)
+        ).fetchall()
+        if limit:
+            rows = rows[:limit]
+        if sample and rows:
+            picked = random.Random(seed).sample(range(len(rows)), max(1, round(len(rows) * sample)))
+            rows = [rows[i] for i in sorted(picked)]
+        return rows
+
+    def settlement_keys(self):
+        """Keys of every settlement written so far (the dedup set to resume with)."""
+        return [k for (k,) in self.conn.execute("SELECT key FROM settlements")]
+
+    def jobs(self, state):
+        """(province, district, attempts) of every job in `state`."""
+        return self.conn.execute(
+            "SELECT province, district, attempts FROM jobs WHERE state = ? ORDER BY province, district", (state,)
+        ).fetchall()
+
+    def incomplete(self):
+        """(province, district, expected, captured) of finished jobs that received fewer locations than expected."""
+        return self.conn.execute(
+            "SELECT province, district, expected, captured FROM jobs "
+            "WHERE state = ? AND expected > captured ORDER BY province, district", (DONE,)
+        ).fetchall()
+
+    def completeness(self):
+        """(province, district, state, expected, captured, records) of every job, for the report."""
+        return self.conn.execute(
+            "SELECT province, district, state, expected, captured, records FROM jobs ORDER BY province, district"
+        ).fetchall()
+
+    def summary(self):
+        """{state: (jobs, settlement records)} over all jobs."""
+        rows = self.conn.execute(
+            "SELECT state, COUNT(*), SUM(CASE WHEN district != '' THEN records ELSE 0 END) FROM jobs GROUP BY state"
+        )
+        return {state: (count, records or 0) for state, count, records in rows}
@@ -0,0 +1,154 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import scraper
+from http_fetch import Paging
+from journal import CrawlJournal, FAILED
+from provinces import PROVINCES
+from replay_server import (make_server, recorded_queries, add_profile_args, profile_from_args, add_paging_args,
+                           paging_from_args)
+
+
+def _load_spans(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_load_test(recordings, concurrency=4, rate=0.0, profile=None, retry=True, retry_backoff=1.0,
+                  provinces=None, page_size=0, paging=None):
+    """
+    Crawls the recorded provinces through a local replay server with the
+    given ReplayProfile (latency, injected errors, bandwidth), in a scratch
+    directory so the real journal, CSV and archive are untouched, then
+    (with `retry`) the scraper's retry pass over the failed jobs. Returns
+    the report dict. With `page_size` the server pages its responses and
+    the scraper fetches them with `paging` (default ?page=N from 1), which
+    the server also uses to pick each request's page.
+    """
+    recorded = recorded_queries(recordings)
+    provinces = provinces or [p for p in PROVINCES if p in recorded]
+    if not provinces:
+        raise ValueError(f"No province recordings in {recordings}")
+
+    paging = (paging or Paging("page")) if page_size else None
+    server = make_server(os.path.abspath(recordings), port=0, profile=profile, page_size=page_size, paging=paging)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_address[1]}/subdivision_search?b={{query}}"
+
+    workdir = tempfile.mkdtemp(prefix="loadtest_")
+    cwd = os.getcwd()
+    trace = os.path.join(workdir, "trace.jsonl")
+    try:
+        os.chdir(workdir)
+        start = time.perf_counter()
+        asyncio.run(scraper.run_scraper(concurrency, rate, backend="http", api_url=api_url, archive=False,
+                                        trace_file=trace, provinces=provinces, paging=paging))
+        first_pass = time.perf_counter() - start
+        if retry:
+            asyncio.run(scraper.run_scraper(concurrency, rate, backend="http", api_url=api_url, archive=False,
+                                            trace_file=trace, provinces=provinces, retry=True,
+                                            retry_backoff=retry_backoff, paging=paging))
+        elapsed = time.perf_counter() - start
+
+        records = 0
+        if os.path.exists(scraper.OUTPUT_FILE):
+            records = len(pd.read_csv(scraper.OUTPUT_FILE, encoding='utf-16', usecols=['Name']))
+        journal = CrawlJournal()
+        try:
+            summary = journal.summary()
+            incomplete = journal.incomplete()
+        finally:
+            journal.close()
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        server.server_close()
+        spans = _load_spans(trace)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    fetches = [s for s in spans if s["span"] == "http_fetch"]
+    ok_ms = np.array([s["ms"] for s in fetches if "error" not in s])
+    errors = {}
+    for s in fetches:
+        if "error" in s:
+            errors[s["error"]] = errors.get(s["error"], 0) + 1
+    # Later pages of a search are requests of their own, not retries
+    requests = {(s["query"], s.get("page")) for s in fetches}
+
+    return {
+        "provinces": len(provinces),
+        "concurrency": concurrency,
+        "rate": rate,
+        "records": records,
+        "seconds": round(elapsed, 3),
+        "first_pass_seconds": round(first_pass, 3),
+        "records_per_second": round(records / elapsed, 2) if elapsed else None,
+        "requests": len(fetches),
+        # Requests beyond the first for each query and page: the retry passes' work
+        "retries": len(fetches) - len(requests),
+        "client_errors": errors,
+        "server_outcomes": dict(profile.counts) if profile else {},
+        "latency_ms": {
+            "p50": round(float(np.percentile(ok_ms, 50)), 1) if len(ok_ms) else None,
+            "p99": round(float(np.percentile(ok_ms, 99)), 1) if len(ok_ms) else None,
+            "max": round(float(ok_ms.max()), 1) if len(ok_ms) else None,
+        },
+        "journal": {state: {"jobs": n, "records": r} for state, (n, r) in summary.items()},
+        "incomplete_jobs": len(incomplete),
+    }
+
+
+def print_report(report):
+    lat = report["latency_ms"]
+    print(f"\n📊 {report['records']:,} records from {report['provinces']} provinces in {report['seconds']:.1f}s "
+          f"({report['records_per_second']} records/s, first pass {report['first_pass_seconds']:.1f}s)")
+    print(f"   requests {report['requests']:,} | retries {report['retries']:,} | "
+          f"latency p50 {lat['p50']} ms, p99 {lat['p99']} ms, max {lat['max']} ms")
+    if report["client_errors"]:
+        print("   errors seen by the scraper: " + ", ".join(f"{k} {v}" for k, v in report["client_errors"].items()))
+    if report["server_outcomes"]:
+        print("   served: " + ", ".join(f"{k} {v}" for k, v in sorted(report["server_outcomes"].items())))
+    print("   journal: " + ", ".join(f"{s} {v['jobs']} jobs" for s, v in report["journal"].items())
+          + f" | {report['incomplete_jobs']} incomplete")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run the scraper against a local replay server and report throughput, latency and retries.")
+    parser.add_argument("recordings", help="Directory of recorded responses (scraper.py --record DIR)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0.0, help="Scraper rate cap in req/s (0 = unlimited)")
+    parser.add_argument("--no-retry", action="store_true", help="Skip the retry pass over failed jobs")
+    parser.add_argument("--retry-backoff", type=float, default=1.0, help="Seconds before the first retry round")
+    parser.add_argument("--provinces", nargs="+", default=None, help="Provinces to crawl (default: all recorded)")
+    parser.add_argument("--page-size", type=int, default=0,
+                        help="Have the server page responses by this many locations, and the scraper fetch all pages")
+    parser.add_argument("--output", default=None, help="Also write the report to this JSON file")
+    add_paging_args(parser)
+    add_profile_args(parser)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run_load_test(args.recordings, args.concurrency, args.rate, profile_from_args(args),
+                           not args.no_retry, args.retry_backoff, args.provinces, args.page_size,
+                           paging_from_args(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Report saved to {args.output}")
+    sys.exit(1 if FAILED in report["journal"] else 0)
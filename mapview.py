@@ -0,0 +1,92 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from exports import PALETTE, DEFAULT_COLOR
+from facets import LRUCache
+
+# Grid cell sizes in degrees, coarse to fine, for the aggregated map
+GRID_LEVELS = {"Country (1°)": 1.0, "Region (0.25°)": 0.25, "Local (0.05°)": 0.05}
+
+# Above this many points the map defaults to aggregated rendering
+AGGREGATE_ABOVE = 20_000
+
+# Palette index -> color; code -1 (no selected group) maps to the default
+_COLORS = np.array(PALETTE + [DEFAULT_COLOR], dtype=object)
+
+
+def color_codes(index, groups, n_rows):
+    """
+    Palette position of the first selected group each row belongs to
+    (-1 if none), for all n_rows rows. Groups are painted last-to-first
+    from their row lists in the token index, so the first match wins.
+    """
+    codes = np.full(n_rows, -1, dtype=np.int16)
+    for i in range(len(groups) - 1, -1, -1):
+        codes[index.rows(groups[i])] = i % len(PALETTE)
+    return codes
+
+
+def colors_for(codes):
+    return _COLORS[codes]
+
+
+class GridBins:
+    """
+    Per-row grid cell ids at every GRID_LEVELS size, computed once from the
+    coordinates. Aggregating a filtered set of rows is then a few bincounts;
+    results are kept in a small LRU keyed by filter state and level.
+    """
+
+    def __init__(self, latitude, longitude):
+        # float32 like the snapshot's coordinates, so those are used without a copy
+        self.lat = np.asarray(latitude, dtype=np.float32)
+        self.lon = np.asarray(longitude, dtype=np.float32)
+        self.valid = ~(np.isnan(self.lat) | np.isnan(self.lon))
+        self.cells = {}
+        for name, size in GRID_LEVELS.items():
+            ix = np.floor(np.nan_to_num(self.lon) / size).astype(np.int64)
+            iy = np.floor(np.nan_to_num(self.lat) / size).astype(np.int64)
+            self.cells[name] = np.where(self.valid, ix * 100_000 + iy, -1)
+        # Shared across sessions, hence the lock
+        self._cache = LRUCache(32)
+        self._lock = threading.Lock()
+
+    def aggregate(self, rows, codes, level, key=None):
+        """
+        DataFrame of one point per non-empty cell among `rows`: centroid
+        latitude/longitude, settlement count, and the most common color.
+        """
+        cache_key = (key, level) if key is not None else None
+        if cache_key is not None:
+            with self._lock:
+                cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        rows = rows[self.valid[rows]]
+        cells = self.cells[level][rows]
+        uniq, inv = np.unique(cells, return_inverse=True)
+        counts = np.bincount(inv)
+        lat = np.bincount(inv, weights=self.lat[rows]) / counts
+        lon = np.bincount(inv, weights=self.lon[rows]) / counts
+
+        # Majority color per cell: count (cell, color) pairs, take the argmax.
+        # Code -1 wraps to the last slot, which is the default color.
+        n_colors = len(_COLORS)
+        pair_counts = np.bincount(inv * n_colors + codes[rows] % n_colors, minlength=len(uniq) * n_colors)
+        majority = pair_counts.reshape(len(uniq), n_colors).argmax(axis=1)
+
+        result = pd.DataFrame({
+            'latitude': lat,
+            'longitude': lon,
+            'count': counts,
+            'color': _COLORS[majority],
+            # Marker radius in meters: grows with the count, capped by the cell size
+            'size': np.minimum(np.sqrt(counts) * 400 * GRID_LEVELS[level], 40_000 * GRID_LEVELS[level]),
+        })
+        if cache_key is not None:
+            with self._lock:
+                self._cache[cache_key] = result
+        return result
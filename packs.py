@@ -0,0 +1,207 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import zipfile
+from dataclasses import replace
+
+from engine import Engine, Query, DATA_FILE, export_key
+from exports import safe_filename
+from snapshot import file_sha256, source_sha256
+from batch import run_batch
+
+PACK_DIR = "export_packs"
+MANIFEST_FILE = "manifest.json"
+PACK_VERSION = 2
+
+# Columns a province's layered (ZIP) exports are split by, with their Query field
+SPLIT_COLUMNS = {"Tribes": "tribes", "Ethnicity": "ethnicities"}
+
+
+def pack_queries(engine, split=True):
+    """
+    The precomputed export shapes: every province as one CSV and, with
+    `split`, one CSV per tribe (ethnicity) found in it. A single group's
+    CSV is also the group's layer in any ZIP of that province, so the ZIP
+    for whatever groups are selected is assembled from them (see
+    PackStore.export). Outputs are file names relative to the pack directory.
+    """
+    queries = []
+    for province in engine.token_indexes['Province'].vocab:
+        name = safe_filename(province) or "province"
+        queries.append(Query(provinces=(province,), format="csv", output=name + ".csv"))
+        if not split:
+            continue
+        for column, field in SPLIT_COLUMNS.items():
+            for i, group in enumerate(engine.facets.options(column, {'Province': [province]})):
+                # Numbered: group names can be the same once made file-safe
+                queries.append(Query(provinces=(province,), format="csv", **{field: (group,)},
+                                     output=f"{name}__{column}__{i}_{safe_filename(group)}.csv"))
+    return queries
+
+
+def layer_queries(query):
+    """
+    {group: CSV query of its layer} when the ZIP export of `query` can be
+    assembled from single-group packs: one province and the selected
+    tribes (or ethnicities), nothing else. None otherwise.
+    """
+    split = query.split_by()
+    if (split is None or len(query.provinces) != 1 or query.districts or (query.tribes and query.ethnicities)
+            or query.text or query.description or query.area):
+        return None
+    field = SPLIT_COLUMNS[split]
+    return {g: replace(query, format="csv", output=None, **{field: (g,)}) for g in query.groups()}
+
+
+def build_packs(csv_path=DATA_FILE, pack_dir=PACK_DIR, split=True, workers=None):
+    """
+    Writes every pack of pack_queries over a process pool (see batch.py),
+    then a manifest mapping each pack's export cache key (engine.export_key,
+    the key the app computes for the same filter state) to its file, size,
+    row count and sha256, stamped with the source CSV's hash. The new set
+    replaces the old one only once it is complete. Returns the manifest.
+    """
+    start = time.perf_counter()
+    engine = Engine.load(csv_path)
+    queries = pack_queries(engine, split)
+    print(f"📦 Building {len(queries)} export packs for {len(engine.token_indexes['Province'].vocab)} provinces...")
+
+    tmp_dir = pack_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    build = [replace(q, output=os.path.join(tmp_dir, q.output)) for q in queries]
+    failed = run_batch(build, csv_path, workers, engine=engine)
+    if failed:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise RuntimeError(f"{failed} export packs failed; the previous packs are kept")
+
+    packs = {}
+    for q in queries:
+        path = os.path.join(tmp_dir, q.output)
+        packs[export_key(q)] = {
+            "file": q.output,
+            "format": q.format,
+            "province": q.provinces[0],
+            "split": q.split_by(),
+            "group": q.groups()[0] if q.split_by() else None,
+            "rows": int(len(engine.rows(q))),
+            "bytes": os.path.getsize(path),
+            "sha256": file_sha256(path),
+        }
+    manifest = {"version": PACK_VERSION, "source_sha256": source_sha256(csv_path), "built_at": time.time(),
+                "packs": packs}
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+    shutil.rmtree(pack_dir, ignore_errors=True)
+    os.replace(tmp_dir, pack_dir)
+    total = sum(p["bytes"] for p in packs.values())
+    print(f"📦 {len(packs)} packs ({total / 1e6:.1f} MB) written to {pack_dir} in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+class PackStore:
+    """
+    Read side of the packs for the app: looks up an export cache key in the
+    manifest and returns the pack's bytes, or assembles a province's ZIP
+    from its groups' packs. A pack is checked against its sha256 the first
+    time it is served; a missing or altered file is dropped, so the caller
+    builds the export itself.
+    """
+
+    def __init__(self, manifest, pack_dir=PACK_DIR):
+        self.pack_dir = pack_dir
+        self.packs = dict(manifest["packs"])
+        # (province, split column) -> every group with a pack; a group not in it has no rows there
+        self.groups = {}
+        for pack in self.packs.values():
+            if pack.get("group") is not None:
+                self.groups.setdefault((pack["province"], pack["split"]), set()).add(pack["group"])
+        self._verified = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, csv_path=DATA_FILE, pack_dir=PACK_DIR):
+        """The packs built from the current CSV, or None if there are none (or they are stale)."""
+        try:
+            with open(os.path.join(pack_dir, MANIFEST_FILE), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != PACK_VERSION or manifest.get("source_sha256") != source_sha256(csv_path):
+            return None
+        return cls(manifest, pack_dir)
+
+    def __contains__(self, key):
+        return key in self.packs
+
+    def read(self, key):
+        """The bytes of the pack for `key`, or None if there is no valid one."""
+        pack = self.packs.get(key)
+        if pack is None:
+            return None
+        try:
+            with open(os.path.join(self.pack_dir, pack["file"]), 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = None
+        with self._lock:
+            if data is not None and key not in self._verified:
+                if hashlib.sha256(data).hexdigest() == pack["sha256"]:
+                    self._verified.add(key)
+                else:
+                    data = None
+            if data is None:
+                self.packs.pop(key, None)
+        return data
+
+    def serves(self, query, fmt):
+        """Whether packs can answer the `fmt` export of `query` (export may still miss on a bad file)."""
+        if export_key(query, fmt) in self.packs:
+            return True
+        layers = layer_queries(query) if fmt == "zip" else None
+        return layers is not None and (query.provinces[0], query.split_by()) in self.groups
+
+    def export(self, query, fmt):
+        """The bytes of the `fmt` export of `query` from the packs, or None if they don't have it."""
+        key = export_key(query, fmt)
+        if key in self.packs:
+            return self.read(key)
+        if not self.serves(query, fmt):
+            return None
+        # Same layers, names and order as exports.write_layers_zip; groups without rows are left out
+        split = query.split_by()
+        packed = self.groups[(query.provinces[0], split)]
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            for group, layer in layer_queries(query).items():
+                if group not in packed:
+                    continue
+                data = self.read(export_key(layer))
+                if data is None:
+                    return None
+                zip_file.writestr(f"{split}_{safe_filename(group)}.csv", data)
+        return buffer.getvalue()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Precompute per-province and per-group CSV export packs for the app.")
+    parser.add_argument("--data", default=DATA_FILE, help=f"Settlements CSV (default: {DATA_FILE}).")
+    parser.add_argument("--out-dir", default=PACK_DIR, help=f"Pack directory (default: {PACK_DIR}).")
+    parser.add_argument("--no-split", action="store_true", help="Only the per-province CSVs, no per-group ones.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        build_packs(args.data, args.out_dir, split=not args.no_split, workers=args.workers)
+    except RuntimeError as e:
+        sys.exit(f"❌ {e}")
@@ -0,0 +1,133 @@
+import asyncio
+import time
+import urllib.parse
+from collections import defaultdict, deque
+
+
+class AdaptiveController:
+    """
+    AIMD pacing for the scraper, shared by all workers.
+
+    Holds two knobs: the request rate (request starts are spaced 1/rate
+    apart) and the number of requests allowed in flight. Fast successes
+    add `step` req/s to the rate and grow the limit by about one per round
+    of requests; a 429/5xx or a timeout halves both. Slow successes (above
+    `target_latency`) take `step` back off the rate. The response timeout
+    follows the observed latency instead of a flat value.
+
+    `max_rate` (requests/second, 0 = none) and `max_limit` bound the
+    increase. The state is logged every `log_interval` seconds and on every
+    back-off.
+    """
+
+    def __init__(self, max_rate=1.0, max_limit=1, start_rate=0.5, step=0.2, target_latency=3.0,
+                 min_timeout=5.0, max_timeout=30.0, window=50, log_interval=30.0):
+        self.max_rate = max_rate if max_rate and max_rate > 0 else float('inf')
+        self.min_rate = 1 / 60
+        self.rate = min(start_rate, self.max_rate)
+        self.step = step
+        self.max_limit = max(1, max_limit)
+        self.limit = 1.0
+        self.target_latency = target_latency
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.log_interval = log_interval
+
+        self.in_flight = 0
+        self.latency = None  # EWMA of successful request latency, seconds
+        self.outcomes = deque(maxlen=window)  # "ok" / "error" / "timeout"
+        self.requests = 0
+        self._started = time.monotonic()
+        self._next = 0.0
+        self._last_log = self._started
+        self._cond = asyncio.Condition()
+
+    @property
+    def timeout(self):
+        """Seconds to wait for a response: a few times the typical latency, within bounds."""
+        if self.latency is None:
+            return self.max_timeout / 2
+        return min(self.max_timeout, max(self.min_timeout, 4 * self.latency))
+
+    @property
+    def delay(self):
+        """Spacing between request starts, seconds."""
+        return 1.0 / self.rate
+
+    @property
+    def error_ratio(self):
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for o in self.outcomes if o != "ok") / len(self.outcomes)
+
+    async def acquire(self):
+        """Waits for an in-flight slot and the pacing delay."""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.delay
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                await self.release(0.0, cancelled=True)
+                raise
+
+    async def release(self, latency, failed=False, status=None, timed_out=False, cancelled=False):
+        """
+        Reports how the request went and adapts delay/limit. A failure with
+        no status (connection reset, ...) counts as a load signal like 5xx.
+        A cancelled request only frees its slot: it says nothing about the server.
+        """
+        async with self._cond:
+            self.in_flight -= 1
+            if cancelled:
+                self._cond.notify_all()
+                return
+            self.requests += 1
+            overloaded = timed_out or status == 429 or (status or 0) >= 500 or (failed and status is None)
+
+            if failed and overloaded:
+                self.outcomes.append("timeout" if timed_out else "error")
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.limit = max(1.0, self.limit / 2)
+                reason = "timeout" if timed_out else (f"HTTP {status}" if status else "connection error")
+                self.log(f"⬇️ backing off after {reason}")
+            elif failed:
+                # Client errors (404, ...) say nothing about load
+                self.outcomes.append("error")
+            else:
+                self.outcomes.append("ok")
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+                if latency > self.target_latency:
+                    self.rate = max(self.min_rate, self.rate - self.step)
+                else:
+                    self.rate = min(self.max_rate, self.rate + self.step)
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+            self._cond.notify_all()
+
+        if time.monotonic() - self._last_log >= self.log_interval:
+            self.log()
+
+    def log(self, event=""):
+        self._last_log = time.monotonic()
+        elapsed = self._last_log - self._started
+        achieved = self.requests / elapsed if elapsed > 0 else 0.0
+        latency = f"{self.latency:.2f}s" if self.latency is not None else "n/a"
+        print(f"   📈 {event + ' | ' if event else ''}rate {achieved:.2f} req/s (allowed {self.rate:.2f}) | "
+              f"in-flight {self.in_flight}/{int(self.limit)} | errors {self.error_ratio:.0%} | "
+              f"latency {latency} | timeout {self.timeout:.1f}s")
+
+
+class HostLimiter:
+    """Caps the number of in-flight requests per host."""
+
+    def __init__(self, per_host):
+        self._semaphores = defaultdict(lambda: asyncio.Semaphore(per_host))
+
+    def slot(self, url):
+        """Async context manager holding one of the host's slots."""
+        return self._semaphores[urllib.parse.urlsplit(url).netloc]
@@ -0,0 +1,140 @@
+import csv
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+CHANGES_FILE = "crawl_changes.jsonl"
+
+# Change kinds in the change log
+ADDED, REMOVED, MODIFIED = "added", "removed", "modified"
+
+
+def record_hash(record):
+    """Hash of one flattened settlement record (build_record output); key order doesn't matter."""
+    raw = json.dumps(record, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    # 64 bits is plenty to tell versions of one settlement apart
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def content_hash(keyed_records):
+    """
+    Hash of a district's normalized response: its (key, record) pairs in key
+    order, so reordered results or changes in fields the CSV doesn't keep
+    don't count as a change.
+    """
+    h = hashlib.sha256()
+    for key, record in sorted(keyed_records, key=lambda kr: kr[0]):
+        h.update(key.encode('utf-8'))
+        h.update(record_hash(record).encode('ascii'))
+    return h.hexdigest()
+
+
+def diff_district(owned, keyed_records, known):
+    """
+    Compares a district's fresh (key, record) pairs with what the journal has.
+    owned: {key: (hash, record)} of the settlements written for this
+    district; known: keys written for any district. Returns (added,
+    removed, modified): fresh (key, record) pairs not written anywhere yet,
+    owned keys that are gone, and (key, record) pairs whose hash changed.
+    Settlements owned by another district (search results overlap) are
+    that district's business; owned settlements without a stored hash
+    (crawled before hashes were kept) get one without counting as modified.
+    """
+    fresh = dict(keyed_records)
+    added = [(k, r) for k, r in keyed_records if k not in known]
+    removed = [k for k in owned if k not in fresh]
+    modified = [(k, fresh[k]) for k, (h, _) in owned.items()
+                if k in fresh and h is not None and h != record_hash(fresh[k])]
+    return added, removed, modified
+
+
+def _row(record):
+    """A record as the tuple of values its CSV row reads back as (None is written as "")."""
+    return tuple("" if v is None else str(v) for v in record.values())
+
+
+def rewrite_csv(csv_path, replacements, chunksize=50_000):
+    """
+    Rewrites the output CSV through a temp file, replacing the rows in
+    `replacements` ({row tuple: new record, or None to drop it}) in place.
+    Other rows are written back unchanged. Returns the rows touched.
+    """
+    if not replacements or not os.path.exists(csv_path):
+        return 0
+    tmp = csv_path + ".tmp"
+    touched = 0
+    with open(tmp, 'w', newline='', encoding='utf-16') as out:
+        w = csv.writer(out, lineterminator='\n')
+        for i, chunk in enumerate(pd.read_csv(csv_path, encoding='utf-16', dtype=str, keep_default_na=False,
+                                              chunksize=chunksize)):
+            if i == 0:
+                w.writerow(chunk.columns)
+            for row in chunk.itertuples(index=False, name=None):
+                if row not in replacements:
+                    w.writerow(row)
+                    continue
+                touched += 1
+                new = replacements[row]
+                if new is not None:
+                    w.writerow([new[c] for c in chunk.columns])
+    os.replace(tmp, csv_path)
+    return touched
+
+
+class ChangeLog:
+    """
+    Collects the changes of a refresh run: appends each one to the JSONL
+    change log as it is found, and remembers the CSV rows to replace or drop
+    so the output CSV is rewritten once at the end (see apply).
+    """
+
+    def __init__(self, path=CHANGES_FILE, run=None):
+        self.path = path
+        self.run = run or f"refresh-{int(time.time())}"
+        self.counts = {ADDED: 0, REMOVED: 0, MODIFIED: 0}
+        self.unchanged = 0
+        # old record (as a tuple of its values) -> new record, or None to drop it
+        self.replacements = {}
+
+    def _log(self, entries):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps({"ts": round(time.time(), 3), "run": self.run, **entry}, ensure_ascii=False) + "\n")
+
+    def record(self, province, district, added, removed, modified, owned):
+        """
+        Logs one district's diff; owned is its {key: (hash, record)} from
+        before. Returns the district's CSV replacements ({old row: new record
+        or None}), for the journal to keep until apply has run.
+        """
+        replacements = {}
+        entries = [{"change": ADDED, "province": province, "district": district, "key": k, "after": r}
+                   for k, r in added]
+        for k in removed:
+            before = owned[k][1]
+            entries.append({"change": REMOVED, "province": province, "district": district, "key": k, "before": before})
+            if before is not None:
+                replacements[_row(before)] = None
+        for k, r in modified:
+            before = owned[k][1]
+            entries.append({"change": MODIFIED, "province": province, "district": district, "key": k,
+                            "before": before, "after": r})
+            if before is not None:
+                replacements[_row(before)] = r
+        self._log(entries)
+        self.replacements.update(replacements)
+        self.counts[ADDED] += len(added)
+        self.counts[REMOVED] += len(removed)
+        self.counts[MODIFIED] += len(modified)
+        return replacements
+
+    def apply(self, csv_path, chunksize=50_000):
+        """Rewrites the CSV with modified rows replaced in place and removed rows dropped. Returns rows touched."""
+        return rewrite_csv(csv_path, self.replacements, chunksize)
+
+    def summary(self):
+        return (f"{self.counts[ADDED]} added, {self.counts[MODIFIED]} modified, {self.counts[REMOVED]} removed, "
+                f"{self.unchanged} districts unchanged")
@@ -0,0 +1,246 @@
+import argparse
+import gzip
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_fetch import Paging
+
+# Recorded responses live in one directory, one file per search query:
+#   <dir>/<url-quoted query>.json
+# e.g. recordings/Arguvan.json, recordings/Kahramanmara%C5%9F.json
+# plus <dir>/index.jsonl, one line per recorded request (query, status, ms, bytes).
+
+# Failure kinds the server can inject, see ReplayProfile
+ERROR_KINDS = ("429", "500", "timeout")
+
+
+def recording_path(directory, query):
+    return os.path.join(directory, urllib.parse.quote(query, safe='') + ".json")
+
+
+def save_recording(directory, query, payload, status=200, ms=None, url=None):
+    """Writes one subdivision_search response in the replay format and logs the request."""
+    os.makedirs(directory, exist_ok=True)
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    path = recording_path(directory, query)
+    with open(path + ".tmp", 'wb') as f:
+        f.write(body)
+    os.replace(path + ".tmp", path)
+    entry = {"query": query, "url": url, "status": status, "ms": ms, "bytes": len(body), "recorded_at": time.time()}
+    with open(os.path.join(directory, "index.jsonl"), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def recorded_queries(directory):
+    return {urllib.parse.unquote(name[:-len(".json")]) for name in os.listdir(directory) if name.endswith(".json")}
+
+
+def latency_sampler(spec):
+    """
+    Seconds-per-response sampler from a spec string:
+        "0.2" or "fixed:0.2"        always 0.2 s
+        "uniform:0.05,0.5"          uniform between the two
+        "normal:0.3,0.1"            mean, standard deviation (clipped at 0)
+        "lognormal:0.2,0.6"         median, sigma: a long right tail like real servers
+    Returns sample(rng) -> seconds.
+    """
+    kind, _, args = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+    values = [float(v) for v in args.split(",")] if args else []
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(*values)
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(*values))
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Bad latency spec {spec!r}; e.g. 0.2, uniform:0.05,0.5, normal:0.3,0.1, lognormal:0.2,0.6")
+
+
+def parse_error_rates(spec):
+    """ "429=0.05,500=0.02,timeout=0.01" -> {"429": 0.05, "500": 0.02, "timeout": 0.01}"""
+    rates = {}
+    for part in filter(None, (spec or "").split(",")):
+        kind, _, rate = part.partition("=")
+        if kind not in ERROR_KINDS:
+            raise ValueError(f"Unknown error kind {kind!r}; expected one of {', '.join(ERROR_KINDS)}")
+        rates[kind] = float(rate)
+    if sum(rates.values()) > 1:
+        raise ValueError("Error rates add up to more than 1")
+    return rates
+
+
+class ReplayProfile:
+    """
+    How the replay server misbehaves: a latency distribution (see
+    latency_sampler), the share of requests answered with 429, 500 or a
+    timeout (the server holds the request for `hang` seconds and drops the
+    connection), and a bandwidth cap in KB/s per response (0 = none).
+    Counts every outcome it serves in `counts`. Seeded, so runs repeat.
+    """
+
+    def __init__(self, latency="0", errors=None, hang=60.0, bandwidth=0, seed=0):
+        self.latency = latency_sampler(latency)
+        self.errors = errors or {}
+        self.hang = hang
+        self.bandwidth = bandwidth
+        self.counts = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """(outcome, delay seconds) for one request: outcome is "ok" or an ERROR_KINDS entry."""
+        with self._lock:
+            delay = self.latency(self._rng)
+            roll = self._rng.random()
+        outcome = "ok"
+        for kind, rate in self.errors.items():
+            if roll < rate:
+                outcome = kind
+                break
+            roll -= rate
+        return outcome, delay
+
+    def count(self, outcome):
+        with self._lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+
+def page_of(body, skip, page_size):
+    """A recorded payload cut to `page_size` locations after the first `skip`, with totalCount set to the full count."""
+    payload = json.loads(body)
+    locations = payload.get('locations', [])
+    payload['totalCount'] = len(locations)
+    payload['locations'] = locations[skip:skip + page_size]
+    return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """
+    Serves recorded subdivision_search JSON for GET /subdivision_search?<any>=<query>.
+    With `page_size`, responses are cut into pages selected by the
+    `paging` parameter (the scraper's http_fetch.Paging: page numbers from
+    its start, or offsets), to exercise the scraper's totalCount paging.
+    """
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real site
+    directory = "recordings"
+    profile = None
+    page_size = 0
+    paging = Paging("page")
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qsl(url.query)
+        if "subdivision_search" not in url.path or not params:
+            return self._send(404, b'{"error": "not found"}')
+
+        outcome, delay = self.profile.draw() if self.profile else ("ok", 0)
+        if self.profile:
+            self.profile.count(outcome)
+        time.sleep(delay)
+        if outcome == "timeout":
+            time.sleep(self.profile.hang)
+            self.close_connection = True
+            return
+        if outcome == "429":
+            return self._send(429, b'{"error": "too many requests"}', {"Retry-After": "1"})
+        if outcome == "500":
+            return self._send(500, b'{"error": "internal server error"}')
+
+        query = params[0][1]
+        try:
+            with open(recording_path(self.directory, query), 'rb') as f:
+                body = f.read()
+        except OSError:
+            return self._send(404, b'{"error": "no recording"}')
+        if self.page_size:
+            try:
+                skip = self.paging.offset(dict(params[1:]).get(self.paging.param), self.page_size)
+            except ValueError:
+                return self._send(400, b'{"error": "bad page parameter"}')
+            body = page_of(body, skip, self.page_size)
+        self._send(200, body)
+
+    def _send(self, status, body, extra_headers=None):
+        headers = {"Content-Type": "application/json; charset=utf-8", **(extra_headers or {})}
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        bandwidth = self.profile.bandwidth if self.profile else 0
+        if not bandwidth:
+            self.wfile.write(body)
+            return
+        # Throttled: 10 chunks per second at the configured rate
+        chunk = max(1, int(bandwidth * 1024 / 10))
+        for i in range(0, len(body), chunk):
+            self.wfile.write(body[i:i + chunk])
+            self.wfile.flush()
+            time.sleep(0.1)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(directory, host="127.0.0.1", port=8765, profile=None, page_size=0, paging=None):
+    """A replay server; with `page_size`, pages are selected like `paging` (default: ?page=N from 1) requests them."""
+    handler = type("Handler", (ReplayHandler,), {"directory": directory, "profile": profile, "page_size": page_size,
+                                                 "paging": paging or ReplayHandler.paging})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True  # hung "timeout" requests don't block shutdown
+    return server
+
+
+def add_profile_args(parser):
+    parser.add_argument("--latency", default="0",
+                        help="Response latency: 0.2, uniform:0.05,0.5, normal:0.3,0.1 or lognormal:median,sigma")
+    parser.add_argument("--errors", default="", help="Injected failure rates, e.g. 429=0.05,500=0.02,timeout=0.01")
+    parser.add_argument("--hang", type=float, default=60.0, help="Seconds an injected timeout holds the request")
+    parser.add_argument("--bandwidth", type=float, default=0, help="Response bandwidth cap in KB/s (0 = none)")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def profile_from_args(args):
+    return ReplayProfile(args.latency, parse_error_rates(args.errors), args.hang, args.bandwidth, args.seed)
+
+
+def add_paging_args(parser):
+    # Same options as scraper.py, so a load test can use the paging a real crawl uses
+    parser.add_argument("--page-param", default="page", help="Query parameter selecting a page of --page-size")
+    parser.add_argument("--page-style", choices=["page", "offset"], default="page",
+                        help="page: page numbers; offset: number of locations to skip")
+    parser.add_argument("--page-start", type=int, default=1, help="Number of the first page for --page-style page")
+
+
+def paging_from_args(args):
+    return Paging(args.page_param, args.page_style, args.page_start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the subdivision_search endpoint.")
+    parser.add_argument("directory", help="Directory of recorded <query>.json responses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--page-size", type=int, default=0,
+                        help="Serve responses in pages of this many locations; 0 = whole")
+    add_paging_args(parser)
+    add_profile_args(parser)
+    args = parser.parse_args()
+
+    server = make_server(args.directory, args.host, args.port, profile_from_args(args), args.page_size,
+                         paging_from_args(args))
+    print(f"🛰️ Replaying {args.directory} on http://{args.host}:{args.port}/subdivision_search?b={{query}}")
+    server.serve_forever()
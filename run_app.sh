@@ -1,4 +1,8 @@
 #!/bin/bash
 # Activate virtual environment and run the app
 source venv/bin/activate
+# Build and validate the snapshot and its indexes first, so the first page
+# load only maps them. A supervisor can poll readiness with:
+#   python warmup.py --check --url http://localhost:8501
+python warmup.py || exit 1
 streamlit run app.py
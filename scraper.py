@@ -1,219 +1,594 @@
+import argparse
 import asyncio
+import itertools
+import math
+import time
 from playwright.async_api import async_playwright
 import pandas as pd
-import json
 import urllib.parse
 from provinces import PROVINCES
+from extract import build_record, province_districts, district_settlements
+from ratelimit import AdaptiveController, HostLimiter
+from http_fetch import HttpFetcher, Paging
+from journal import CrawlJournal, DONE, FAILED, PROVINCE_JOB
+from archive import ResponseArchive, reextract
+from writer import DedupWriter, settlement_key, compact
+from store import SettlementStore
+from tracing import Tracer
+from replay_server import save_recording
+from refresh import ChangeLog, content_hash, diff_district, rewrite_csv
 import os
 
 # Configuration
 BASE_URL = "https://www.nisanyanyeradlari.com/?b="
 OUTPUT_FILE = "Turkey_Settlements_Detailed.csv"
+COMPLETENESS_FILE = "crawl_completeness.csv"
+# Upper bound on the pages fetched for one search
+MAX_PAGES = 50
 
-def extract_list_items(data_dict):
-    """Helper to extract items from before/after structures."""
-    if not data_dict:
-        return ""
-    
-    results = []
-    
-    # Process both 'before' and 'after' keys
-    for key in ['before', 'after']:
-        section = data_dict.get(key)
-        if not section:
-            continue
-            
-        if isinstance(section, list):
-             results.extend([str(i) for i in section])
-        elif isinstance(section, dict):
-            items = section.get('items', [])
-            # print(f"DEBUG: Extracting from {key}, items: {len(items)}") # Uncomment for verbose debugging
-            for i in items:
-                if isinstance(i, dict):
-                    # The item itself is the name object (e.g. {'tr': 'Yörük'})
-                    extracted = i.get('tr')
-                    if extracted:
-                        results.append(extracted)
-                    else:
-                         results.append(str(i))
-                elif isinstance(i, str):
-                    results.append(i)
-                else:
-                    results.append(str(i))
-    
-    return ", ".join(results)
-
-def extract_old_names(old_names_list):
-    """Parses the detailed oldNames list into a readable string."""
-    if not old_names_list:
-        return "N/A"
-    
-    results = []
-    for item in old_names_list:
-        name = item.get('name', '')
-        # Add language if present
-        langs = [lang.get('tr', '') for lang in item.get('languages', []) if lang.get('tr')]
-        lang_str = f" ({', '.join(langs)})" if langs else ""
-        
-        # Add definition/note if present
-        defn = item.get('definition', {}).get('tr', '')
-        defn_str = f" [{defn}]" if defn else ""
-        
-        # Add romanized text if different
-        rom = item.get('romanizedText', '')
-        rom_str = f" / {rom}" if rom and rom != name else ""
-        
-        full_entry = f"{name}{lang_str}{rom_str}{defn_str}"
-        results.append(full_entry)
-        
-    return " | ".join(results)
-
-async def run_scraper():
-    print(f"🚀 Starting Hierarchical Scraper for {len(PROVINCES)} provinces...")
-    # ... (rest of the file)
-    
-    # Load existing data to resume if crash happens
-    if os.path.exists(OUTPUT_FILE):
-        existing_df = pd.read_csv(OUTPUT_FILE, encoding='utf-16')
-        processed_provinces = existing_df['Province'].unique().tolist()
-        print(f"ℹ️ Found existing data. Skipping {len(processed_provinces)} provinces: {processed_provinces}")
-    else:
-        existing_df = pd.DataFrame()
-        processed_provinces = []
+# Span timer for navigation, response waits and extraction; run_scraper(trace_file=...)
+# replaces it with one that writes a JSONL trace
+tracer = Tracer(keep=False)
 
-    async with async_playwright() as p:
-        print("DEBUG: Connecting to existing Chrome instance...")
-        try:
-            browser = await p.chromium.connect_over_cdp("http://127.0.0.1:9222")
-            print("DEBUG: Connected to Chrome!")
-            context = browser.contexts[0]
-            page = context.pages[0] if context.pages else await context.new_page()
-        except Exception as e:
-            print(f"❌ Could not connect to Chrome: {e}")
-            print("Make sure you launched Chrome with: --remote-debugging-port=9222")
-            return
+class PagingUnsupported(Exception):
+    """A paged request on a fetch that can't make one (browser backend)."""
+
+class FetchError(Exception):
+    """A subdivision_search response that came back with a non-200 status."""
+
+    def __init__(self, status, url):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+
+async def capture_search(page, query, timeout=15.0):
+    """Navigates `page` to the search for `query` and returns the captured subdivision_search response."""
+    target_url = BASE_URL + urllib.parse.quote(query)
+    encoded_query = urllib.parse.quote(query)
 
-        # Wait for any previous requests to settle
-        await page.wait_for_timeout(2000)
+    def predicate(response):
+        # Filter for only XHR/Fetch/JSON
+        if "subdivision_search" not in response.url:
+            return False
+        return encoded_query in response.url
 
-        for province in PROVINCES:
-            if province in processed_provinces:
-                continue
-            
-            print(f"\n📍 Processing Province: {province}")
-            province_data = []
-            
+    async with page.expect_response(predicate, timeout=timeout * 1000) as response_info:
+        with tracer.span("navigate", query=query):
+            await page.goto(target_url)
+        # Leaving the block waits for the matching response
+        wait_start = time.perf_counter()
+
+    response = await response_info.value
+    tracer.since("response_wait", wait_start, query=query)
+    if response.status != 200:
+        # Surfaced (not filtered out) so the rate controller sees 429/5xx
+        raise FetchError(response.status, response.url)
+    print(f"   ✅ Matched URL: {response.url}")
+    return response
+
+def make_fetch(page=None, http=None, record_dir=None):
+    """
+    Returns fetch(query, timeout) -> JSON payload.
+    Uses the direct HTTP client when given, with the browser page as fallback.
+    With `record_dir`, every payload is also saved there in the format
+    replay_server.py serves. `params` (later pages, see fetch_all) need the
+    HTTP client; the browser only loads the site's own search URL.
+    """
+    async def search(query, timeout, params):
+        if params:
+            if http is None:
+                raise PagingUnsupported("paged requests need the http backend")
+            with tracer.span("http_fetch", query=query, page=next(iter(params.values()))):
+                return await http.search(query, timeout, params), None
+        if http is not None:
             try:
-                # 1. Get Districts for the Province
-                target_url = BASE_URL + urllib.parse.quote(province)
-                
-                # Setup predicate for Province API call
-                encoded_province = urllib.parse.quote(province)
-                
-                def province_predicate(response):
-                    # Filter for only XHR/Fetch/JSON
-                    if "subdivision_search" not in response.url:
-                        return False
-                    if response.status != 200:
-                        return False
-                    
-                    # Debug log (will be spammy but useful)
-                    # print(f"DEBUG: Checking URL: {response.url}")
-                    
-                    match = encoded_province in response.url
-                    if match:
-                        print(f"   ✅ Matched URL: {response.url}")
-                    return match
-
-                async with page.expect_response(province_predicate, timeout=15000) as response_info:
-                    print(f"   Navigating to {province}...")
-                    await page.goto(target_url)
-                
-                response = await response_info.value
-                # Verify just in case
-                if encoded_province not in response.url:
-                     print(f"      ⚠️ Warning: Captured response URL {response.url} looks mismatched for {province}")
-                
-                data = await response.json()
-                
-                # Extract Districts
-                locations = data.get('locations', [])
-                districts = [loc for loc in locations if loc.get('locationType', {}).get('name', {}).get('tr') == 'ilçe']
-            
-                print(f"   Found {len(districts)} districts in {province}.")
-                
-                # 2. Iterate Districts
-                for district_node in districts:
-                    district_name = district_node.get('name')
-                    print(f"   👉 Drilling down into District: {district_name}")
-                    
-                    district_url = BASE_URL + urllib.parse.quote(district_name)
-                    encoded_district = urllib.parse.quote(district_name)
-
-                    def district_predicate(response):
-                        if "subdivision_search" not in response.url:
-                            return False
-                        if response.status != 200:
-                            return False
-                        
-                        match = encoded_district in response.url
-                        if match:
-                             print(f"   ✅ Matched District URL: {response.url}")
-                        return match
-                    
+                with tracer.span("http_fetch", query=query):
+                    return await http.search(query, timeout), http.url_for(query)
+            except Exception as e:
+                if page is None:
+                    raise
+                print(f"      ↩️ HTTP fetch failed for {query} ({e}), falling back to browser")
+        response = await capture_search(page, query, timeout)
+        with tracer.span("response_body", query=query):
+            return await response.json(), response.url
+
+    async def fetch(query, timeout, params=None):
+        start = time.perf_counter()
+        data, url = await search(query, timeout, params)
+        if record_dir and not params:
+            save_recording(record_dir, query, data, ms=round((time.perf_counter() - start) * 1000, 1), url=url)
+        return data
+    return fetch
+
+def failure_kind(e):
+    """(status, timed_out) of a failed fetch, for the rate controller."""
+    status = getattr(e, 'status', None)
+    if status is None and getattr(e, 'response', None) is not None:
+        status = getattr(e.response, 'status_code', None)
+    timed_out = isinstance(e, (asyncio.TimeoutError, TimeoutError)) or "Timeout" in type(e).__name__
+    return status, timed_out
+
+async def paced_fetch(fetch, query, controller, host_limiter, host_url, params=None):
+    """Runs one fetch under the adaptive controller and reports how it went."""
+    with tracer.span("acquire", query=query):
+        await controller.acquire()
+    start = time.monotonic()
+    try:
+        async with host_limiter.slot(host_url):
+            data = await fetch(query, controller.timeout, params)
+    except Exception as e:
+        status, timed_out = failure_kind(e)
+        await controller.release(time.monotonic() - start, failed=True, status=status, timed_out=timed_out)
+        raise
+    except BaseException:
+        # Cancelled (a sibling page failed, the crawl is stopping): the slot still has to go back
+        await controller.release(time.monotonic() - start, cancelled=True)
+        raise
+    await controller.release(time.monotonic() - start)
+    return data
+
+async def fetch_all(fetch, query, controller, host_limiter, host_url, paging=None):
+    """
+    Fetches a search and, when its totalCount exceeds the locations
+    returned and `paging` says how, the remaining pages concurrently (each
+    paced like any request). Returns (payload with the merged locations,
+    expected count, captured count); expected is None without a totalCount.
+    """
+    data = await paced_fetch(fetch, query, controller, host_limiter, host_url)
+    locations = data.get('locations', [])
+    expected = data.get('totalCount')
+    if not isinstance(expected, int) or expected <= len(locations) or not locations:
+        return data, expected, len(locations)
+    if paging is None:
+        print(f"      ⚠️ {query}: {len(locations)} of {expected} locations returned "
+              f"(pass --page-param to fetch the rest)")
+        return data, expected, len(locations)
+
+    per_page = len(locations)
+    n_pages = min(math.ceil(expected / per_page), MAX_PAGES)
+    pages = await asyncio.gather(*(
+        paced_fetch(fetch, query, controller, host_limiter, host_url, paging.params(i, per_page))
+        for i in range(1, n_pages)
+    ), return_exceptions=True)
+
+    # Pages may overlap (or repeat the first one if the parameter is wrong)
+    merged = list(locations)
+    seen = {settlement_key(v) for v in merged}
+    failed = 0
+    for page in pages:
+        if isinstance(page, BaseException):
+            failed += 1
+            continue
+        for v in page.get('locations', []):
+            key = settlement_key(v)
+            if key not in seen:
+                seen.add(key)
+                merged.append(v)
+    print(f"      📄 {query}: {len(merged)} of {expected} locations from {n_pages} pages"
+          + (f" ({failed} pages failed)" if failed else ""))
+    return {**data, 'locations': merged}, expected, len(merged)
+
+class JobQueue(asyncio.PriorityQueue):
+    """
+    District jobs go ahead of province jobs, so provinces finish (and get
+    saved) one after another instead of all being listed first.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._seq = itertools.count()
+
+    def put_nowait(self, job):
+        super().put_nowait((0 if job[0] == "district" else 1, next(self._seq), job))
+
+    async def get(self):
+        return (await super().get())[2]
+
+def refresh_district(province, district_name, keyed, raw, journal, writer, store, changes):
+    """
+    Applies a revisited district: nothing if its content hash is unchanged,
+    else appends the added settlements, logs added/removed/modified ones in
+    `changes` (which rewrites the CSV rows at the end of the run) and
+    updates the journal and store. The journal also keeps the CSV rows to
+    rewrite until then, so a stopped run's are rewritten on the next start.
+    raw: {key: payload item}. Returns the newly written keys.
+    """
+    digest = content_hash(keyed)
+    if digest == journal.content_hash(province, district_name):
+        changes.unchanged += 1
+        return []
+
+    owned = journal.owned_settlements(province, district_name)
+    added, removed, modified = diff_district(owned, keyed, writer.seen)
+    written = writer.write(added, f"{district_name} ({province})")
+    rewrites = changes.record(province, district_name, added, removed, modified, owned)
+
+    # Settlements crawled before hashes were kept get theirs now
+    changed = {k: r for k, r in keyed if k in owned and owned[k][0] is None}
+    changed.update(modified)
+    journal.update_settlements(province, district_name, changed, removed, rewrites)
+    writer.seen.difference_update(removed)
+    if store is not None:
+        store.remove(removed + [k for k, _ in modified])
+        store.write(province, district_name, [(k, raw[k]) for k in written + [k for k, _ in modified]])
+    if modified or removed:
+        print(f"      🔄 {district_name}: {len(added)} added, {len(modified)} modified, {len(removed)} removed")
+    return written
+
+async def crawl_worker(worker_id, fetch, host_url, queue, controller, host_limiter, journal, archive, writer,
+                       store=None, paging=None, changes=None):
+    """
+    Takes jobs off the shared queue until cancelled:
+    ("province", name[, relist]) lists districts (or reuses the journal's
+    list unless `relist`) and enqueues the ones not yet done or failed,
+    ("district", province, name) captures the district's settlements,
+    ("refresh", province, name) revisits a finished district and applies
+    only what changed (see refresh_district; `changes` is the ChangeLog).
+    Searches are fetched with all their pages (see fetch_all).
+    Every job's outcome, with expected vs captured locations, is recorded
+    in the journal, every raw response in the archive (if any), and newly
+    written settlements in the SQLite store (if any).
+    """
+    while True:
+        job = await queue.get()
+        try:
+            if job[0] == "province":
+                province = job[1]
+                districts = None if job[2:] == (True,) else journal.districts(province)
+                if districts is None:
+                    print(f"\n📍 [{worker_id}] Processing Province: {province}")
+                    journal.start(province)
                     try:
-                         async with page.expect_response(district_predicate, timeout=15000) as d_response_info:
-                            await page.goto(district_url)
-                            # Wait a bit to be human-like
-                            await page.wait_for_timeout(1500)
-
-                         d_response = await d_response_info.value
-                         d_data = await d_response.json()
-                         d_locations = d_data.get('locations', [])
-                         
-                         # Filter for settlements (villages, neighborhoods, etc.)
-                         # Exclude the district itself if it appears
-                         villages = [l for l in d_locations if l.get('name') != district_name]
-                         
-                         print(f"      Captured {len(villages)} settlements.")
-                         
-                         for v in villages:
-                             # Extract detailed info
-                             record = {
-                                 "Province": province,
-                                 "District": district_name,
-                                 "Name": v.get('name'),
-                                 "Type": v.get('locationType', {}).get('name', {}).get('tr', 'N/A'),
-                                 "Old_Name": extract_old_names(v.get('oldNames')),
-                                 "Description": v.get('note', {}).get('tr', 'N/A'),
-                                 "Tribes": extract_list_items(v.get('tribes')),
-                                 "Ethnicity": extract_list_items(v.get('communities')),
-                                 "Coordinates": str(v.get('coordinates', [])),
-                                 "Original_Text": v.get('originalText', 'N/A')
-                             }
-                             province_data.append(record)
+                        data, expected, captured = await fetch_all(fetch, province, controller, host_limiter,
+                                                                   host_url, paging)
+
+                        if archive is not None:
+                            archive.put(data, province, "province", province)
 
+                        # Extract Districts
+                        with tracer.span("extract", query=province) as span:
+                            districts = province_districts(data)
+                            span["rows"] = len(districts)
+                        print(f"   Found {len(districts)} districts in {province}.")
                     except Exception as e:
-                        print(f"      ⚠️ Error scraping district {district_name}: {e}")
+                        print(f"   ❌ Error scraping province {province}: {e}")
+                        journal.fail(province, error=e)
                         continue
+                    journal.record_districts(province, districts)
+                    journal.finish(province, records=len(districts), expected=expected, captured=captured)
+
+                for district_name in districts:
+                    # Failed districts are left to the retry pass
+                    if journal.state(province, district_name) not in (DONE, FAILED):
+                        queue.put_nowait(("district", province, district_name))
+
+            else:
+                kind, province, district_name = job
+                print(f"   👉 [{worker_id}] {'Revisiting' if kind == 'refresh' else 'Drilling down into'} District: "
+                      f"{district_name} ({province})")
+                journal.start(province, district_name)
+                try:
+                    d_data, expected, captured = await fetch_all(fetch, district_name, controller, host_limiter,
+                                                                 host_url, paging)
+                    if archive is not None:
+                        archive.put(d_data, district_name, "district", province, district_name)
+
+                    # Filter for settlements (villages, neighborhoods, etc.)
+                    with tracer.span("extract", query=district_name) as span:
+                        villages = district_settlements(d_data, district_name)
+                        keys = [settlement_key(v) for v in villages]
+                        keyed = [(key, build_record(province, district_name, v)) for key, v in zip(keys, villages)]
+                        span["rows"] = len(keyed)
+                    print(f"      Captured {len(villages)} settlements in {district_name}.")
 
+                    # Save District Data immediately to avoid data loss
+                    with tracer.span("write", query=district_name) as span:
+                        if kind == "refresh":
+                            written = refresh_district(province, district_name, keyed, dict(zip(keys, villages)),
+                                                       journal, writer, store, changes)
+                        else:
+                            written = writer.write(keyed, f"{district_name} ({province})")
+                            if store is not None and written:
+                                fresh = set(written)
+                                store.write(province, district_name,
+                                            [(k, v) for k, v in zip(keys, villages) if k in fresh])
+                        span["rows"] = len(written)
+                except Exception as e:
+                    print(f"      ⚠️ Error scraping district {district_name}: {e}")
+                    journal.fail(province, district_name, error=e)
+                    continue
+                journal.finish(province, district_name, records=len(written), keys=written, expected=expected,
+                               captured=captured, settlements=dict(keyed), content_hash=content_hash(keyed))
+        except Exception as e:
+            # Bookkeeping failed (journal locked or full, ...): the job stays unfinished in the journal,
+            # so the next run redoes it, and the worker goes on with the other jobs
+            label = job[1] if job[0] == "province" else f"{job[2]} ({job[1]})"
+            print(f"   ❌ [{worker_id}] Could not record {job[0]} job {label}: {e!r}")
+        finally:
+            queue.task_done()
+
+
+async def crawl(queue, fetches, host_url, controller, per_host, journal, archive, writer, store=None, paging=None,
+                changes=None):
+    """
+    Runs one worker per fetch function until the job queue is drained. A
+    worker that dies anyway stops the pass with its error instead of
+    leaving the queue waiting for it.
+    """
+    host_limiter = HostLimiter(per_host or len(fetches))
+    workers = [
+        asyncio.create_task(crawl_worker(i, fetch, host_url, queue, controller, host_limiter, journal, archive, writer,
+                                         store, paging, changes))
+        for i, fetch in enumerate(fetches)
+    ]
+
+    drained = asyncio.create_task(queue.join())
+    try:
+        # Workers only return by raising
+        done, _ = await asyncio.wait([drained, *workers], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in [drained, *workers]:
+            task.cancel()
+        await asyncio.gather(drained, *workers, return_exceptions=True)
+    for w in workers:
+        if w in done:
+            raise w.exception() or RuntimeError("crawl worker stopped")
+    controller.log("crawl pass finished")
+
+
+async def run_jobs(fetches, host_url, rate, per_host, journal, archive, retry=False, max_rounds=4, backoff=5.0,
+                   store=None, provinces=PROVINCES, paging=None, refetch=False, refresh=None):
+    """
+    Normal run: every province, skipping districts the journal has as done or failed.
+    Retry run: only the failed jobs, in rounds with exponential backoff between them.
+    Refetch run: only the jobs that received fewer locations than their totalCount.
+    Refresh run: `refresh` = (limit, sample) finished districts, oldest first,
+    revisited for changes; the CSV is rewritten once at the end (also when
+    the run is stopped) if any settlement was modified or removed.
+    """
+    # Rows an interrupted refresh left stale (its journal already has the new versions)
+    pending = journal.pending_rewrites()
+    if pending:
+        touched = rewrite_csv(OUTPUT_FILE, pending)
+        journal.clear_rewrites()
+        print(f"🔄 Rewrote {touched} CSV rows left stale by an interrupted refresh")
+
+    # Settlements already written (by key) are skipped, across districts and restarts
+    writer = DedupWriter(OUTPUT_FILE, seen=journal.settlement_keys())
+    # Starts cautious (2 s spacing, one request in flight) and adapts from there
+    controller = AdaptiveController(max_rate=rate, max_limit=len(fetches))
+
+    if refresh is not None:
+        limit, sample = refresh
+        candidates = [p_d for p_d in journal.refresh_candidates(limit, sample) if p_d[0] in provinces]
+        changes = ChangeLog()
+        print(f"\n🔄 Revisiting {len(candidates)} districts, least recently crawled first")
+        queue = JobQueue()
+        for province, district in candidates:
+            queue.put_nowait(("refresh", province, district))
+        try:
+            await crawl(queue, fetches, host_url, controller, per_host, journal, archive, writer, store, paging,
+                        changes)
+        finally:
+            touched = changes.apply(OUTPUT_FILE)
+            journal.clear_rewrites()
+            print(f"🔄 Refresh: {changes.summary()}; {touched} CSV rows rewritten. Changes logged to {changes.path}")
+        return
+
+    if refetch:
+        queue = JobQueue()
+        incomplete = journal.incomplete()
+        print(f"\n📄 Refetching {len(incomplete)} incomplete jobs")
+        for province, district, expected, captured in incomplete:
+            if district == PROVINCE_JOB:
+                queue.put_nowait(("province", province, True))
+            else:
+                queue.put_nowait(("district", province, district))
+        await crawl(queue, fetches, host_url, controller, per_host, journal, archive, writer, store, paging)
+        return
+
+    if not retry:
+        queue = JobQueue()
+        for province in provinces:
+            if journal.state(province) != FAILED:
+                queue.put_nowait(("province", province))
+        await crawl(queue, fetches, host_url, controller, per_host, journal, archive, writer, store, paging)
+        return
+
+    for round_no in range(max_rounds):
+        failed = journal.jobs(FAILED)
+        if not failed:
+            break
+        delay = backoff * 2 ** round_no
+        print(f"\n🔁 Retry round {round_no + 1}/{max_rounds}: {len(failed)} failed jobs, waiting {delay:.0f}s first")
+        await asyncio.sleep(delay)
+
+        queue = JobQueue()
+        for province, district, attempts in failed:
+            if district == PROVINCE_JOB:
+                queue.put_nowait(("province", province))
+            else:
+                queue.put_nowait(("district", province, district))
+        await crawl(queue, fetches, host_url, controller, per_host, journal, archive, writer, store, paging)
+
+async def run_scraper(concurrency=1, rate=1.0, per_host=None, backend="browser", api_url=None, retry=False,
+                      archive=True, trace_file=None, db_path=None, record_dir=None, provinces=None,
+                      retry_backoff=5.0, paging=None, refetch=False, refresh=None):
+    """
+    Crawls every province/district with up to `concurrency` parallel workers.
+    An AIMD controller adapts request spacing and in-flight count to the
+    observed latency, 429/5xx responses and timeouts, never exceeding `rate`
+    requests per second overall or `per_host` in flight per host (default:
+    the pool size).
+
+    backend="browser" drives a pool of pages on the CDP-connected Chrome.
+    backend="http" calls the JSON endpoint directly: with `api_url` (a URL
+    containing "{query}", e.g. a local replay_server) no browser is needed;
+    without it, one browser request is captured to copy its URL, headers
+    and cookies, and the pages stay available as a fallback.
+
+    Progress is kept per district in the crawl journal, so a restart resumes
+    where it stopped. retry=True re-runs only the jobs that failed.
+    Raw responses go to the response archive unless archive=False, so the
+    CSV can be rebuilt offline with `python scraper.py reextract`.
+    With `trace_file`, per-request spans (rate limiter wait, navigation,
+    response wait, body, extraction, write) are appended to it as JSONL;
+    summarize them with `python tracing.py <file>`.
+    With `db_path`, new settlements are also written to that normalized
+    SQLite store (see store.py), next to the CSV.
+    With `record_dir`, every response is saved for replay_server.py.
+    `provinces` limits the crawl (default: all of PROVINCES) and
+    `retry_backoff` is the wait before the first retry round, doubling after.
+    Searches whose totalCount exceeds the locations returned are completed
+    page by page with `paging` (an http_fetch.Paging; http backend only).
+    Either way expected vs captured counts go to the journal, and
+    refetch=True re-runs only the incomplete jobs, e.g. after setting up
+    paging; see `python scraper.py report`.
+    refresh=(limit, sample) revisits finished districts instead, the
+    `limit` least recently crawled or a random `sample` fraction, and only
+    writes settlements whose content changed (change log: crawl_changes.jsonl).
+    """
+    global tracer
+    if trace_file:
+        tracer = Tracer(trace_file, keep=False, run=f"crawl-{int(time.time())}")
+    mode = ("Retrying failed jobs" if retry else "Refetching incomplete jobs" if refetch
+            else "Refreshing crawled districts" if refresh is not None else "Starting Hierarchical Scraper")
+    provinces = provinces or PROVINCES
+    print(f"🚀 {mode} for {len(provinces)} provinces "
+          f"({concurrency} workers, {rate} req/s, {backend} backend)...")
+
+    journal = CrawlJournal()
+    archive = ResponseArchive() if archive else None
+    store = SettlementStore(db_path) if db_path else None
+    summary = journal.summary()
+    if summary:
+        print("ℹ️ Journal: " + ", ".join(f"{state} {n} jobs/{records} records" for state, (n, records) in summary.items()))
+        if FAILED in summary and not retry:
+            print(f"ℹ️ {summary[FAILED][0]} failed jobs are skipped; run `python scraper.py retry` for them.")
+
+    try:
+        if backend == "http" and api_url:
+            http = HttpFetcher(api_url, max_connections=concurrency)
+            try:
+                await run_jobs([make_fetch(http=http, record_dir=record_dir)] * concurrency, api_url, rate, per_host,
+                               journal, archive, retry, backoff=retry_backoff, store=store, provinces=provinces,
+                               paging=paging, refetch=refetch, refresh=refresh)
+            finally:
+                await http.aclose()
+            print("\n✅ All finished!")
+            return
+
+        async with async_playwright() as p:
+            print("DEBUG: Connecting to existing Chrome instance...")
+            try:
+                browser = await p.chromium.connect_over_cdp("http://127.0.0.1:9222")
+                print("DEBUG: Connected to Chrome!")
+                context = browser.contexts[0]
+                pages = list(context.pages[:concurrency])
+                opened = []
+                while len(pages) < concurrency:
+                    opened.append(await context.new_page())
+                    pages.append(opened[-1])
             except Exception as e:
-                print(f"   ❌ Error scraping province {province}: {e}")
-            
-            # Save Province Data immediately to avoid data loss
-            if province_data:
-                new_df = pd.DataFrame(province_data)
-                
-                # Append to CSV
-                # If file doesn't exist, write header. If it does, skip header.
-                header = not os.path.exists(OUTPUT_FILE)
-                new_df.to_csv(OUTPUT_FILE, mode='a', header=header, index=False, encoding='utf-16')
-                print(f"   💾 Saved {len(new_df)} records for {province}.")
-            
-            # Add a delay between provinces
-            await page.wait_for_timeout(2000)
-
-        print("\n✅ All finished!")
+                print(f"❌ Could not connect to Chrome: {e}")
+                print("Make sure you launched Chrome with: --remote-debugging-port=9222")
+                return
+
+            http = None
+            host_url = BASE_URL
+            if backend == "http":
+                # Copy URL shape, headers and cookies from one real browser request
+                response = await capture_search(pages[0], provinces[0])
+                http = await HttpFetcher.from_response(response, provinces[0], context, max_connections=concurrency)
+                host_url = http.url_template
+                print(f"   🔌 Direct HTTP backend: {http.url_template}")
+
+            try:
+                await run_jobs([make_fetch(page, http, record_dir) for page in pages], host_url, rate, per_host,
+                               journal, archive, retry, backoff=retry_backoff, store=store, provinces=provinces,
+                               paging=paging, refetch=refetch, refresh=refresh)
+            finally:
+                if http is not None:
+                    await http.aclose()
+
+            # Close only the pages we opened; existing tabs stay with the user
+            for page in opened:
+                await page.close()
+
+            print("\n✅ All finished!")
+    finally:
+        journal.close()
+        if store is not None:
+            store.close()
+
+def completeness_report(path=COMPLETENESS_FILE):
+    """Writes expected (totalCount) vs captured locations per job from the journal to a CSV; returns its rows."""
+    journal = CrawlJournal()
+    try:
+        rows = journal.completeness()
+    finally:
+        journal.close()
+    df = pd.DataFrame(rows, columns=['Province', 'District', 'State', 'Expected', 'Captured', 'Records'])
+    df['Missing'] = (df['Expected'] - df['Captured']).clip(lower=0)
+    df.to_csv(path, index=False, encoding='utf-8')
+
+    incomplete = df[df['Missing'] > 0]
+    print(f"📋 {len(df)} jobs, {int(df['Expected'].notna().sum())} with a totalCount; "
+          f"{len(incomplete)} incomplete, {int(incomplete['Missing'].sum())} locations missing. Report: {path}")
+    for r in incomplete.head(20).itertuples():
+        print(f"   {r.Province} / {r.District or '(province)'}: {int(r.Captured)} of {int(r.Expected)}")
+    if len(incomplete):
+        print("ℹ️ Fetch the rest with `python scraper.py refetch --backend http --page-param <name>`.")
+    return df
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl nisanyanyeradlari.com settlements per province/district.")
+    parser.add_argument("command", nargs="?",
+                        choices=["crawl", "retry", "refetch", "refresh", "report", "reextract", "compact"],
+                        default="crawl",
+                        help="crawl: resume the full crawl; retry: re-run only failed jobs with backoff; "
+                             "refetch: re-run only jobs that got fewer locations than their totalCount; "
+                             "refresh: revisit crawled districts and apply only what changed; "
+                             "report: write the per-district completeness report; "
+                             "reextract: rebuild the CSV from archived responses; "
+                             "compact: write a deduplicated, sorted copy of the CSV")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of browser pages crawling in parallel")
+    parser.add_argument("--rate", type=float, default=1.0, help="Upper bound in requests per second (0 = unlimited)")
+    parser.add_argument("--per-host", type=int, default=None, help="Max in-flight requests per host (default: concurrency)")
+    parser.add_argument("--backend", choices=["browser", "http"], default="browser",
+                        help="browser: drive Chrome pages; http: call the JSON endpoint directly")
+    parser.add_argument("--api-url", default=None,
+                        help='Endpoint URL with a "{query}" placeholder for the http backend (skips the browser)')
+    parser.add_argument("--no-archive", action="store_true", help="Don't keep raw responses in the archive")
+    parser.add_argument("--page-param", default=None,
+                        help="Query parameter for later result pages (http backend); unset = first page only")
+    parser.add_argument("--page-style", choices=["page", "offset"], default="page",
+                        help="page: send page numbers; offset: send the number of locations to skip")
+    parser.add_argument("--page-start", type=int, default=1, help="Number of the first page for --page-style page")
+    parser.add_argument("--refresh-limit", type=int, default=None,
+                        help="refresh: revisit at most this many districts, least recently crawled first")
+    parser.add_argument("--refresh-sample", type=float, default=None,
+                        help="refresh: revisit this random fraction of the districts (e.g. 0.1)")
+    parser.add_argument("--report-file", default=COMPLETENESS_FILE, help="report: output CSV")
+    parser.add_argument("--db", default=None, help="Also write new settlements to this SQLite store (see store.py)")
+    parser.add_argument("--record", default=None, metavar="DIR",
+                        help="Save every subdivision_search response to DIR for replay_server.py")
+    parser.add_argument("--trace", default=None, help="Append per-request timing spans to this JSONL file")
+    parser.add_argument("--workers", type=int, default=None, help="reextract: worker processes (default: CPU count)")
+    parser.add_argument("--output", default=None, help="compact: output file (default: <output>.compact.csv)")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    asyncio.run(run_scraper())
+    args = parse_args()
+    if args.command == "reextract":
+        reextract(output_file=OUTPUT_FILE, workers=args.workers)
+    elif args.command == "report":
+        completeness_report(args.report_file)
+    elif args.command == "compact":
+        compact(OUTPUT_FILE, args.output or os.path.splitext(OUTPUT_FILE)[0] + ".compact.csv")
+    else:
+        paging = Paging(args.page_param, args.page_style, args.page_start) if args.page_param else None
+        refresh = (args.refresh_limit, args.refresh_sample) if args.command == "refresh" else None
+        asyncio.run(run_scraper(args.concurrency, args.rate, args.per_host, args.backend, args.api_url,
+                                retry=args.command == "retry", archive=not args.no_archive, trace_file=args.trace,
+                                db_path=args.db, record_dir=args.record, paging=paging,
+                                refetch=args.command == "refetch", refresh=refresh))
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+
+# Turkish letters and circumflex vowels -> plain ASCII, both cases. Mapping
+# I and İ explicitly avoids str.lower() turning İ into "i" + combining dot.
+_FOLD = str.maketrans({
+    'I': 'i', 'İ': 'i', 'ı': 'i', 'Î': 'i', 'î': 'i',
+    'Ş': 's', 'ş': 's', 'Ç': 'c', 'ç': 'c', 'Ğ': 'g', 'ğ': 'g',
+    'Ö': 'o', 'ö': 'o', 'Ü': 'u', 'ü': 'u', 'Â': 'a', 'â': 'a', 'Û': 'u', 'û': 'u',
+})
+
+# Share of the query's trigrams an entry needs to count as a fuzzy hit
+FUZZY_MIN_SHARE = 0.6
+
+# Score tiers: the best tier an entry reaches decides the row's score
+EXACT, PREFIX, SUBSTRING = 3.0, 2.0, 1.0
+
+
+def fold(text):
+    """Turkish-aware case and diacritic folding: "Alhasuşağı" -> "alhasusagi"."""
+    return text.translate(_FOLD).lower()
+
+
+def _grams(codes):
+    """Trigram codes (int64) of a uint32 code point array: three 21-bit code points."""
+    return (codes[:-2].astype(np.int64) << 42) | (codes[1:-1].astype(np.int64) << 21) | codes[2:]
+
+
+def _code_points(text):
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+
+class SearchIndex:
+    """
+    Trigram index over the folded text of one or more columns.
+
+    Every row contributes one or more entries (a column value, or each
+    `|`-separated historic name for Old_Name). Entries are folded and padded
+    with a space on both sides, so a query's trigrams also catch word
+    starts. For each trigram the sorted ids of the entries containing it
+    are stored CSR-style, like TokenIndex: entries for grams[i] are
+    entry_ids[offsets[i]:offsets[i + 1]].
+
+    search() intersects the posting lists of the query's trigrams, checks
+    the candidates for the actual substring and ranks rows by the best
+    match (exact entry > entry prefix > substring > fuzzy, by trigram overlap).
+    """
+
+    def __init__(self, columns, split=None):
+        # columns: [Series] over the same rows; split: {column name: separator}
+        split = split or {}
+        parts = []
+        for series in columns:
+            # astype(object) first: a categorical cannot be filled with a new category
+            values = pd.Series(series).reset_index(drop=True).astype(object).fillna('').astype(str)
+            self.n_rows = len(values)
+            sep = split.get(series.name)
+            if sep:
+                values = values.str.split(sep, regex=False).explode()
+            values = values.str.strip()
+            parts.append(values[values != ''])
+
+        entries = pd.concat(parts) if parts else pd.Series([], dtype=object)
+        self.entry_rows = entries.index.to_numpy(dtype=np.int64)
+        self.entries = entries.str.translate(_FOLD).str.lower().to_numpy(dtype=object)
+
+        # All entries as one code point array, separated by NUL; trigrams that
+        # span a separator are dropped
+        padded = ''.join(' ' + e + ' \0' for e in self.entries)
+        codes = _code_points(padded)
+        grams = _grams(codes) if len(codes) >= 3 else np.empty(0, dtype=np.int64)
+        lengths = np.array([len(e) + 3 for e in self.entries], dtype=np.int64)
+        owner = np.repeat(np.arange(len(self.entries)), lengths)[:len(grams)]
+        keep = (codes[:-2] != 0) & (codes[1:-1] != 0) & (codes[2:] != 0) if len(grams) else np.empty(0, dtype=bool)
+        grams, owner = grams[keep], owner[keep]
+
+        order = np.lexsort((owner, grams))
+        grams, owner = grams[order], owner[order]
+        if len(grams):
+            first = np.ones(len(grams), dtype=bool)
+            first[1:] = (grams[1:] != grams[:-1]) | (owner[1:] != owner[:-1])
+            grams, owner = grams[first], owner[first]
+        self.entry_ids = owner.astype(np.int32)
+        self.grams, starts = np.unique(grams, return_index=True)
+        self.offsets = np.append(starts, len(grams)).astype(np.int64)
+
+    def state(self):
+        """What to persist of the index (see snapshot.save_index)."""
+        return {"n_rows": self.n_rows, "entries": self.entries.tolist(), "entry_rows": self.entry_rows,
+                "entry_ids": self.entry_ids, "grams": self.grams, "offsets": self.offsets}
+
+    @classmethod
+    def from_state(cls, state):
+        """The index back from state(), without re-folding or re-counting trigrams."""
+        index = cls.__new__(cls)
+        index.n_rows = state["n_rows"]
+        index.entries = np.array(state["entries"], dtype=object)
+        for key in ("entry_rows", "entry_ids", "grams", "offsets"):
+            setattr(index, key, state[key])
+        return index
+
+    def _postings(self, gram):
+        i = np.searchsorted(self.grams, gram)
+        if i < len(self.grams) and self.grams[i] == gram:
+            return self.entry_ids[self.offsets[i]:self.offsets[i + 1]]
+        return np.empty(0, dtype=np.int32)
+
+    def search(self, query, fuzzy=True):
+        """
+        (rows, scores) of the matching rows, best first. Scores: 3 exact
+        entry, 2 entry prefix, 1 substring, below 1 fuzzy (share of the
+        query's trigrams found in the entry).
+        """
+        q = fold(query.strip())
+        if not q:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        query_grams = np.unique(_grams(_code_points(q))) if len(q) >= 3 else np.empty(0, dtype=np.int64)
+        if len(query_grams):
+            postings = [self._postings(g) for g in query_grams]
+            shared = np.bincount(np.concatenate(postings), minlength=len(self.entries))
+            share = shared / len(query_grams)
+            candidates = np.flatnonzero(shared == len(query_grams))
+        else:
+            # One or two characters: no trigram to look up, scan the folded entries
+            share = None
+            candidates = np.arange(len(self.entries))
+
+        # Trigrams can match out of order, so confirm the substring
+        texts = self.entries[candidates]
+        pos = pd.Series(texts, dtype=object).str.find(q).to_numpy()
+        entry_scores = np.zeros(len(self.entries))
+        entry_scores[candidates] = np.select([texts == q, pos == 0, pos > 0], [EXACT, PREFIX, SUBSTRING], 0.0)
+
+        if fuzzy and share is not None and len(q) >= 4:
+            near = (entry_scores == 0) & (share >= FUZZY_MIN_SHARE)
+            entry_scores[near] = share[near] * 0.99
+
+        hit = np.flatnonzero(entry_scores)
+        row_scores = np.zeros(self.n_rows)
+        np.maximum.at(row_scores, self.entry_rows[hit], entry_scores[hit])
+        rows = np.flatnonzero(row_scores)
+        order = np.argsort(-row_scores[rows], kind='stable')
+        return rows[order], row_scores[rows[order]]
+
+    def scores(self, query, fuzzy=True):
+        """Score per row over all rows (0 = no match)."""
+        rows, s = self.search(query, fuzzy)
+        out = np.zeros(self.n_rows)
+        out[rows] = s
+        return out
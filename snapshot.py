@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Bump when the on-disk layout changes so old snapshots get rebuilt
+SNAPSHOT_VERSION = 2
+
+# Columns the app displays and filters on; missing values become ''
+CLEAN_COLUMNS = ['Tribes', 'Ethnicity', 'Description']
+
+# Parsed coordinate columns, stored as float32 (~1 m precision at these latitudes)
+COORD_COLUMNS = ('latitude', 'longitude')
+
+# Bump when a persisted index layout changes (see save_index)
+INDEX_VERSION = 1
+
+# Text columns with at most this many distinct values per row load as categoricals
+CATEGORY_MAX_RATIO = 0.1
+
+# "[lon, lat]" as written by the scraper
+COORD_PATTERN = r'^\s*\[\s*([-+]?[0-9.]+(?:[eE][-+]?\d+)?)\s*,\s*([-+]?[0-9.]+(?:[eE][-+]?\d+)?)\s*\]\s*$'
+
+
+def snapshot_dir_for(csv_path):
+    """Default snapshot location: next to the CSV, same base name."""
+    return os.path.splitext(csv_path)[0] + ".snapshot"
+
+
+def file_sha256(path):
+    """Hashes the file in 1 MB chunks."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def parse_coordinates(coords):
+    """Vectorized "[lon, lat]" parsing. Returns (latitude, longitude) float Series."""
+    parts = coords.astype('string').str.extract(COORD_PATTERN)
+    lon = pd.to_numeric(parts[0], errors='coerce')
+    lat = pd.to_numeric(parts[1], errors='coerce')
+    return lat.astype('float64'), lon.astype('float64')
+
+
+def _source_info(csv_path, sha=None):
+    st = os.stat(csv_path)
+    return {
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha256": sha or file_sha256(csv_path),
+    }
+
+
+def _read_meta(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, "meta.json"), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(snapshot_dir, meta):
+    tmp = os.path.join(snapshot_dir, "meta.json.tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, os.path.join(snapshot_dir, "meta.json"))
+
+
+def build_snapshot(csv_path, snapshot_dir=None):
+    """
+    Parses the UTF-16 CSV once and writes a columnar snapshot:
+    numeric columns as .npy, text columns dictionary-encoded
+    (int32 codes .npy + a JSON list of distinct values).
+    """
+    snapshot_dir = snapshot_dir or snapshot_dir_for(csv_path)
+    source = _source_info(csv_path)
+
+    df = pd.read_csv(csv_path, encoding='utf-16')
+    if 'Coordinates' in df.columns:
+        df['latitude'], df['longitude'] = parse_coordinates(df['Coordinates'])
+    for col in CLEAN_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].fillna('')
+
+    # Write into a sibling dir and swap, so readers never see half a snapshot
+    tmp_dir = snapshot_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        if col in COORD_COLUMNS:
+            np.save(os.path.join(tmp_dir, f"{i}.npy"), series.to_numpy(dtype=np.float32))
+            columns.append({"name": col, "kind": "numeric"})
+        elif pd.api.types.is_float_dtype(series) or pd.api.types.is_integer_dtype(series):
+            np.save(os.path.join(tmp_dir, f"{i}.npy"), series.to_numpy())
+            columns.append({"name": col, "kind": "numeric"})
+        else:
+            codes, uniques = pd.factorize(series.astype(object))
+            np.save(os.path.join(tmp_dir, f"{i}.codes.npy"), codes.astype(np.int32))
+            with open(os.path.join(tmp_dir, f"{i}.values.json"), 'w', encoding='utf-8') as f:
+                json.dump([str(v) for v in uniques], f, ensure_ascii=False)
+            columns.append({"name": col, "kind": "text"})
+
+    _write_meta(tmp_dir, {
+        "version": SNAPSHOT_VERSION,
+        "source": source,
+        "rows": len(df),
+        "columns": columns,
+    })
+
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    os.replace(tmp_dir, snapshot_dir)
+    return snapshot_dir
+
+
+def ensure_snapshot(csv_path, snapshot_dir=None):
+    """
+    Returns the snapshot dir, rebuilding it if the CSV changed.
+    Size/mtime are checked first; the hash is only computed when they differ
+    (e.g. after a checkout touched the file without changing it).
+    """
+    snapshot_dir = snapshot_dir or snapshot_dir_for(csv_path)
+    meta = _read_meta(snapshot_dir)
+    if not meta or meta.get("version") != SNAPSHOT_VERSION:
+        return build_snapshot(csv_path, snapshot_dir)
+
+    st = os.stat(csv_path)
+    source = meta["source"]
+    if source["size"] == st.st_size and source["mtime_ns"] == st.st_mtime_ns:
+        return snapshot_dir
+
+    sha = file_sha256(csv_path)
+    if sha != source["sha256"]:
+        return build_snapshot(csv_path, snapshot_dir)
+
+    # Same content, new mtime: remember it so the next check is cheap again
+    meta["source"] = _source_info(csv_path, sha)
+    _write_meta(snapshot_dir, meta)
+    return snapshot_dir
+
+
+def fresh_source(csv_path, snapshot_dir=None):
+    """
+    The snapshot's source info (size, mtime_ns, sha256) if it still matches
+    the CSV by size and mtime, else None. Never hashes or rebuilds, so it
+    is cheap enough for a readiness probe.
+    """
+    meta = _read_meta(snapshot_dir or snapshot_dir_for(csv_path))
+    if not meta or meta.get("version") != SNAPSHOT_VERSION:
+        return None
+    st = os.stat(csv_path)
+    source = meta["source"]
+    return source if (source["size"], source["mtime_ns"]) == (st.st_size, st.st_mtime_ns) else None
+
+
+def source_sha256(csv_path, snapshot_dir=None):
+    """sha256 of the CSV content, from the (fresh) snapshot's metadata instead of rehashing the file."""
+    return _read_meta(ensure_snapshot(csv_path, snapshot_dir))["source"]["sha256"]
+
+
+def load_snapshot(csv_path, snapshot_dir=None, compact=True):
+    """
+    Loads the settlements table from its (fresh) snapshot, memory-mapping
+    the numeric arrays. With `compact`, repeated text columns (Province,
+    District, Type, Tribes, Ethnicity, ...) become categoricals over the
+    snapshot's dictionary instead of one string per row. The frame is
+    meant to be shared read-only.
+    """
+    snapshot_dir = ensure_snapshot(csv_path, snapshot_dir)
+    meta = _read_meta(snapshot_dir)
+
+    data = {}
+    for i, col in enumerate(meta["columns"]):
+        if col["kind"] == "numeric":
+            data[col["name"]] = np.load(os.path.join(snapshot_dir, f"{i}.npy"), mmap_mode='r')
+        else:
+            codes = np.load(os.path.join(snapshot_dir, f"{i}.codes.npy"), mmap_mode='r')
+            with open(os.path.join(snapshot_dir, f"{i}.values.json"), encoding='utf-8') as f:
+                values = json.load(f)
+            if compact and len(values) <= CATEGORY_MAX_RATIO * meta["rows"]:
+                # -1 codes are missing values, as in the snapshot
+                data[col["name"]] = pd.Categorical.from_codes(codes, categories=values)
+            else:
+                # Trailing NaN so the -1 "missing" code maps to NaN like read_csv would
+                lookup = np.array(values + [np.nan], dtype=object)
+                data[col["name"]] = lookup[codes]
+
+    return pd.DataFrame(data, copy=False)
+
+
+def _index_dir(snapshot_dir, name):
+    return os.path.join(snapshot_dir, "indexes", name)
+
+
+def has_index(snapshot_dir, name):
+    meta = _read_meta(_index_dir(snapshot_dir, name))
+    return bool(meta) and meta.get("version") == INDEX_VERSION
+
+
+def save_index(snapshot_dir, name, state):
+    """
+    Persists one index's state dict inside the snapshot: numpy arrays as
+    .npy, everything else (vocabularies, sizes) in its meta.json. A rebuilt
+    snapshot starts without indexes, so they never outlive their data.
+    """
+    index_dir = _index_dir(snapshot_dir, name)
+    tmp_dir = index_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    arrays, values = [], {}
+    for key, value in state.items():
+        if isinstance(value, np.ndarray):
+            np.save(os.path.join(tmp_dir, f"{key}.npy"), value)
+            arrays.append(key)
+        else:
+            values[key] = value
+    _write_meta(tmp_dir, {"version": INDEX_VERSION, "arrays": arrays, "values": values})
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.replace(tmp_dir, index_dir)
+
+
+def load_index(snapshot_dir, name):
+    """A persisted index state with its arrays memory-mapped, or None if there is none."""
+    index_dir = _index_dir(snapshot_dir, name)
+    meta = _read_meta(index_dir)
+    if not meta or meta.get("version") != INDEX_VERSION:
+        return None
+    state = dict(meta["values"])
+    for key in meta["arrays"]:
+        state[key] = np.load(os.path.join(index_dir, f"{key}.npy"), mmap_mode='r')
+    return state
+
+
+def memory_report(csv_path):
+    """
+    Bytes per row of the table as read straight from the CSV (what every
+    session used to hold) and in its compact shared form, per column.
+    """
+    before = pd.read_csv(csv_path, encoding='utf-16')
+    before['latitude'], before['longitude'] = parse_coordinates(before['Coordinates'])
+    after = load_snapshot(csv_path)
+
+    n = max(len(after), 1)
+    b = before.memory_usage(index=False, deep=True)
+    a = after.memory_usage(index=False, deep=True)
+    print(f"{'column':<14} {'dtype before':>14} {'B/row':>8}   {'dtype after':>14} {'B/row':>8}")
+    for col in after.columns:
+        print(f"{col:<14} {str(before[col].dtype):>14} {b.get(col, 0) / n:8.1f}   "
+              f"{str(after[col].dtype):>14} {a[col] / n:8.1f}")
+    print(f"{'total':<14} {'':>14} {b.sum() / n:8.1f}   {'':>14} {a.sum() / n:8.1f}")
+    return {"rows": len(after), "before": float(b.sum() / n), "after": float(a.sum() / n)}
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "--memory"]
+    path = args[0] if args else "Turkey_Settlements_Nisanyanmap.csv"
+    if "--memory" in sys.argv[1:]:
+        memory_report(path)
+    else:
+        out = build_snapshot(path)
+        print(f"💾 Snapshot written to {out}")
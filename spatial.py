@@ -0,0 +1,153 @@
+import json
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+# Cell size of the grid index in degrees (~11 km north-south)
+CELL_DEGREES = 0.1
+
+# Cell key = ix * _STRIDE + iy; cells of one longitude column are contiguous
+_STRIDE = 1 << 20
+
+
+def haversine_km(lat, lon, lat0, lon0):
+    lat, lon = np.radians(lat), np.radians(lon)
+    lat0, lon0 = np.radians(lat0), np.radians(lon0)
+    a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat) * np.cos(lat0) * np.sin((lon - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def polygons_from_geojson(obj):
+    """
+    List of polygons, each a list of [lon, lat] rings (outer ring first,
+    then holes), from a GeoJSON FeatureCollection, Feature or geometry.
+    Non-polygon geometries are ignored.
+    """
+    if isinstance(obj, (str, bytes)):
+        obj = json.loads(obj)
+    kind = obj.get("type")
+    if kind == "FeatureCollection":
+        return [p for f in obj.get("features", []) for p in polygons_from_geojson(f)]
+    if kind == "Feature":
+        return polygons_from_geojson(obj.get("geometry") or {})
+    if kind == "GeometryCollection":
+        return [p for g in obj.get("geometries", []) for p in polygons_from_geojson(g)]
+    if kind == "Polygon":
+        return [obj["coordinates"]]
+    if kind == "MultiPolygon":
+        return list(obj["coordinates"])
+    return []
+
+
+def _in_ring(lon, lat, ring):
+    """Even-odd ray casting of points against one ring, vectorized over the points."""
+    ring = np.asarray(ring, dtype=np.float64)[:, :2]
+    inside = np.zeros(len(lon), dtype=bool)
+    x1, y1 = ring[:-1, 0], ring[:-1, 1]
+    x2, y2 = ring[1:, 0], ring[1:, 1]
+    for ax, ay, bx, by in zip(x1, y1, x2, y2):
+        crosses = (ay > lat) != (by > lat)
+        # Horizontal edges never cross, so by != ay below
+        if not crosses.any():
+            continue
+        x_at = ax + (lat - ay) * (bx - ax) / (by - ay)
+        inside ^= crosses & (lon < x_at)
+    return inside
+
+
+class SpatialGrid:
+    """
+    Uniform grid index over settlement coordinates.
+
+    Rows with coordinates are sorted by cell key, CSR-style: the rows of
+    cell keys[i] are rows[offsets[i]:offsets[i + 1]]. A query only visits
+    the cells overlapping its bounding box (one searchsorted per longitude
+    column), then checks the exact shape on those candidates, so its cost
+    follows the size of the area rather than of the dataset.
+    Queries return boolean masks over df row positions, like FacetEngine.
+    """
+
+    def __init__(self, latitude, longitude, cell=CELL_DEGREES):
+        # float32 like the snapshot's coordinates, so those are used without a copy
+        self.lat = np.asarray(latitude, dtype=np.float32)
+        self.lon = np.asarray(longitude, dtype=np.float32)
+        self.n_rows = len(self.lat)
+        self.cell = cell
+
+        valid = np.flatnonzero(~(np.isnan(self.lat) | np.isnan(self.lon)))
+        cell_keys = self._key(self._ix(self.lon[valid]), self._iy(self.lat[valid]))
+        order = np.argsort(cell_keys, kind="stable")
+        cell_keys, self.rows = cell_keys[order], valid[order]
+        self.keys, starts = np.unique(cell_keys, return_index=True)
+        self.offsets = np.append(starts, len(cell_keys))
+
+    def state(self):
+        """What to persist of the grid (see snapshot.save_index); the coordinates are the snapshot's own."""
+        return {"cell": self.cell, "rows": self.rows, "keys": self.keys, "offsets": self.offsets}
+
+    @classmethod
+    def from_state(cls, state, latitude, longitude):
+        """The grid back from state() over the same coordinates, without re-sorting them."""
+        grid = cls.__new__(cls)
+        grid.lat = np.asarray(latitude, dtype=np.float32)
+        grid.lon = np.asarray(longitude, dtype=np.float32)
+        grid.n_rows = len(grid.lat)
+        grid.cell = state["cell"]
+        grid.rows, grid.keys, grid.offsets = state["rows"], state["keys"], state["offsets"]
+        return grid
+
+    def _ix(self, lon):
+        return np.floor(np.asarray(lon) / self.cell).astype(np.int64)
+
+    def _iy(self, lat):
+        # Offset so iy is never negative and keys of one column stay contiguous
+        return np.floor((np.asarray(lat) + 90.0) / self.cell).astype(np.int64)
+
+    @staticmethod
+    def _key(ix, iy):
+        return ix * _STRIDE + iy
+
+    def candidates(self, south, west, north, east):
+        """Row positions in every grid cell overlapping the box (a superset of the box)."""
+        iy0, iy1 = int(self._iy(south)), int(self._iy(north))
+        parts = []
+        for ix in range(int(self._ix(west)), int(self._ix(east)) + 1):
+            lo, hi = np.searchsorted(self.keys, [self._key(ix, iy0), self._key(ix, iy1) + 1])
+            if hi > lo:
+                parts.append(self.rows[self.offsets[lo]:self.offsets[hi]])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def _mask(self, rows):
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def bbox(self, south, west, north, east):
+        rows = self.candidates(south, west, north, east)
+        lat, lon = self.lat[rows], self.lon[rows]
+        return self._mask(rows[(lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)])
+
+    def radius(self, lat0, lon0, km):
+        """Settlements within `km` great-circle kilometres of (lat0, lon0)."""
+        dlat = km / KM_PER_DEGREE
+        dlon = km / (KM_PER_DEGREE * max(np.cos(np.radians(lat0)), 1e-6))
+        rows = self.candidates(lat0 - dlat, lon0 - dlon, lat0 + dlat, lon0 + dlon)
+        lat, lon = self.lat[rows].astype(np.float64), self.lon[rows].astype(np.float64)
+        return self._mask(rows[haversine_km(lat, lon, lat0, lon0) <= km])
+
+    def polygons(self, polygons):
+        """Settlements inside any of the polygons (see polygons_from_geojson); holes are excluded."""
+        mask = np.zeros(self.n_rows, dtype=bool)
+        for rings in polygons:
+            outer = np.asarray(rings[0], dtype=np.float64)
+            west, south = outer[:, 0].min(), outer[:, 1].min()
+            east, north = outer[:, 0].max(), outer[:, 1].max()
+            rows = self.candidates(south, west, north, east)
+            lon, lat = self.lon[rows].astype(np.float64), self.lat[rows].astype(np.float64)
+            inside = _in_ring(lon, lat, rings[0])
+            for hole in rings[1:]:
+                inside &= ~_in_ring(lon, lat, hole)
+            mask[rows[inside]] = True
+        return mask
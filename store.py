@@ -0,0 +1,324 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from extract import build_record, list_items, old_name_entries
+from snapshot import parse_coordinates, file_sha256
+
+STORE_FILE = "settlements.sqlite"
+
+# Environment variable selecting the app's filter backend: "sql" = this store
+BACKEND_ENV = "SETTLEMENT_BACKEND"
+
+# Bump when the import changes what is stored, so ensure_store re-imports
+STORE_VERSION = 1
+
+# Flat CSV layout, as written by the scraper
+CSV_COLUMNS = ['Province', 'District', 'Name', 'Type', 'Old_Name', 'Description',
+               'Tribes', 'Ethnicity', 'Coordinates', 'Original_Text']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key    TEXT PRIMARY KEY,
+    value  TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settlements (
+    id             INTEGER PRIMARY KEY,  -- row position of the CSV it was imported from
+    key            TEXT UNIQUE,          -- writer.settlement_key, for crawled rows
+    province       TEXT NOT NULL,
+    district       TEXT NOT NULL,
+    name           TEXT,
+    type           TEXT,
+    description    TEXT,
+    coordinates    TEXT,                 -- "[lon, lat]" as in the CSV
+    latitude       REAL,
+    longitude      REAL,
+    original_text  TEXT,
+    old_name_none  TEXT                  -- Old_Name as written without old names: "N/A" (scraper) or ""
+);
+CREATE INDEX IF NOT EXISTS settlements_province ON settlements (province, district);
+CREATE INDEX IF NOT EXISTS settlements_district ON settlements (district);
+CREATE TABLE IF NOT EXISTS tribes (
+    settlement_id  INTEGER NOT NULL REFERENCES settlements (id),
+    position       INTEGER NOT NULL,
+    tribe          TEXT NOT NULL,
+    PRIMARY KEY (settlement_id, position)
+);
+CREATE INDEX IF NOT EXISTS tribes_token ON tribes (tribe, settlement_id);
+CREATE TABLE IF NOT EXISTS ethnicities (
+    settlement_id  INTEGER NOT NULL REFERENCES settlements (id),
+    position       INTEGER NOT NULL,
+    ethnicity      TEXT NOT NULL,
+    PRIMARY KEY (settlement_id, position)
+);
+CREATE INDEX IF NOT EXISTS ethnicities_token ON ethnicities (ethnicity, settlement_id);
+CREATE TABLE IF NOT EXISTS old_names (
+    settlement_id  INTEGER NOT NULL REFERENCES settlements (id),
+    position       INTEGER NOT NULL,
+    name           TEXT NOT NULL,
+    languages      TEXT,                 -- comma-separated, e.g. "Ermenice"
+    romanized      TEXT,
+    definition     TEXT,
+    PRIMARY KEY (settlement_id, position)
+);
+CREATE INDEX IF NOT EXISTS old_names_name ON old_names (name);
+"""
+
+# One extract_old_names entry: "name (languages) / romanized [definition]"
+OLD_NAME_PATTERN = re.compile(r'^(?P<name>.*?)(?: \((?P<languages>[^()]*)\))?(?: / (?P<romanized>.*?))?(?: \[(?P<definition>.*)\])?$')
+
+
+def store_path_for(csv_path):
+    """Default database location: next to the CSV, same base name."""
+    return os.path.splitext(csv_path)[0] + ".sqlite"
+
+
+def _tokens(value):
+    if not isinstance(value, str):
+        return []
+    return [t.strip() for t in value.split(',') if t.strip()]
+
+
+def _parse_old_names(value):
+    """extract_old_names output back into entries ("N/A" or empty = none)."""
+    if not isinstance(value, str) or value in ("", "N/A"):
+        return []
+    entries = []
+    for part in value.split(" | "):
+        m = OLD_NAME_PATTERN.match(part)
+        entries.append({
+            "name": m["name"],
+            "languages": [l.strip() for l in (m["languages"] or "").split(",") if l.strip()],
+            "romanized": m["romanized"],
+            "definition": m["definition"],
+        })
+    return entries
+
+
+def _format_old_names(entries, none=None):
+    """Inverse of _parse_old_names, i.e. the scraper's extract_old_names format (`none`, else "", without old names)."""
+    if not entries:
+        # NULL (settlements with old names) can read back as NaN
+        return none if isinstance(none, str) else ""
+    parts = []
+    for e in entries:
+        # Missing fields are None, or NaN when read back through pandas
+        langs = f" ({e['languages']})" if isinstance(e["languages"], str) and e["languages"] else ""
+        rom = f" / {e['romanized']}" if isinstance(e["romanized"], str) and e["romanized"] else ""
+        defn = f" [{e['definition']}]" if isinstance(e["definition"], str) and e["definition"] else ""
+        parts.append(f"{e['name']}{langs}{rom}{defn}")
+    return " | ".join(parts)
+
+
+class SettlementStore:
+    """
+    Normalized SQLite store of settlements: one settlements row each, with
+    link tables for tribes, ethnicities and old names (with languages and
+    definition) instead of the CSV's joined strings. Token and
+    province/district columns are indexed, so facet filters are index
+    lookups. The connection is shared between threads behind a lock.
+    """
+
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.conn.close()
+
+    def _insert(self, row, tribes, ethnicities, old_names):
+        """Inserts one settlement and its links; returns its id, or None for a known key."""
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO settlements (id, key, province, district, name, type, description, "
+            "coordinates, latitude, longitude, original_text, old_name_none) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+        if not cur.rowcount:
+            return None
+        sid = cur.lastrowid
+        self.conn.executemany("INSERT INTO tribes VALUES (?, ?, ?)", [(sid, i, t) for i, t in enumerate(tribes)])
+        self.conn.executemany("INSERT INTO ethnicities VALUES (?, ?, ?)",
+                              [(sid, i, e) for i, e in enumerate(ethnicities)])
+        self.conn.executemany("INSERT INTO old_names VALUES (?, ?, ?, ?, ?, ?)", [
+            (sid, i, e["name"], ", ".join(e["languages"]) or None, e["romanized"], e["definition"])
+            for i, e in enumerate(old_names)
+        ])
+        return sid
+
+    def write(self, province, district, keyed_settlements):
+        """
+        Stores crawled settlements of one district. keyed_settlements:
+        [(settlement_key, payload item)]; keys already stored are skipped.
+        Returns the number of new settlements.
+        """
+        added = 0
+        with self._lock, self.conn:
+            for key, v in keyed_settlements:
+                record = build_record(province, district, v)
+                coords = v.get('coordinates') or []
+                lon, lat = (coords[0], coords[1]) if len(coords) >= 2 else (None, None)
+                old_names = old_name_entries(v.get('oldNames'))
+                row = (None, key, province, district, record["Name"], record["Type"], record["Description"],
+                       record["Coordinates"], lat, lon, record["Original_Text"],
+                       None if old_names else record["Old_Name"])
+                if self._insert(row, list_items(v.get('tribes')), list_items(v.get('communities')),
+                                old_names) is not None:
+                    added += 1
+        return added
+
+    def remove(self, keys):
+        """Deletes the settlements with these keys, with their links."""
+        if not keys:
+            return
+        with self._lock, self.conn:
+            ids = [(sid,) for (sid,) in self.conn.execute(
+                f"SELECT id FROM settlements WHERE key IN ({', '.join('?' * len(keys))})", list(keys))]
+            for table in ("tribes", "ethnicities", "old_names"):
+                self.conn.executemany(f"DELETE FROM {table} WHERE settlement_id = ?", ids)
+            self.conn.executemany("DELETE FROM settlements WHERE id = ?", ids)
+
+    def import_csv(self, csv_path):
+        """Loads a settlements CSV (UTF-16, scraper layout); ids are the CSV row positions."""
+        df = pd.read_csv(csv_path, encoding='utf-16', dtype=str, keep_default_na=False, na_values=[''])
+        lat, lon = parse_coordinates(df['Coordinates'])
+        with self._lock, self.conn:
+            for i, r in enumerate(df.itertuples(index=False)):
+                r = r._asdict()
+                old_names = _parse_old_names(r['Old_Name'])
+                none = r['Old_Name'] if isinstance(r['Old_Name'], str) else ""
+                row = (i, None, r['Province'], r['District'], r['Name'], r['Type'], r['Description'],
+                       r['Coordinates'], None if pd.isna(lat[i]) else float(lat[i]),
+                       None if pd.isna(lon[i]) else float(lon[i]), r['Original_Text'], None if old_names else none)
+                self._insert(row, _tokens(r['Tribes']), _tokens(r['Ethnicity']), old_names)
+            self.set_meta("version", STORE_VERSION)
+            self.set_meta("source", {"path": os.path.abspath(csv_path), "size": os.path.getsize(csv_path),
+                                     "mtime_ns": os.stat(csv_path).st_mtime_ns, "sha256": file_sha256(csv_path)})
+        return len(df)
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value)))
+
+    def count(self):
+        return self.conn.execute("SELECT count(*) FROM settlements").fetchone()[0]
+
+    def ids(self, selections):
+        """
+        Sorted ids of the settlements matching facet selections
+        ({'Province': [...], 'District': [...], 'Ethnicity': [...], 'Tribes': [...]}),
+        ANDed across stages and ORed within one, as one indexed query.
+        """
+        where, params = [], []
+        for column, values in (("province", selections.get('Province')), ("district", selections.get('District'))):
+            if values:
+                where.append(f"s.{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        for table, column, values in (("ethnicities", "ethnicity", selections.get('Ethnicity')),
+                                      ("tribes", "tribe", selections.get('Tribes'))):
+            if values:
+                where.append(f"s.id IN (SELECT settlement_id FROM {table} WHERE {column} IN "
+                             f"({', '.join('?' * len(values))}))")
+                params.extend(values)
+        sql = "SELECT s.id FROM settlements s" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY s.id"
+        with self._lock:
+            return np.array([r[0] for r in self.conn.execute(sql, params)], dtype=np.int64)
+
+    def mask(self, selections, n_rows):
+        """Boolean mask over row positions for ids(), or None when nothing is selected."""
+        if not any(selections.values()):
+            return None
+        mask = np.zeros(n_rows, dtype=bool)
+        mask[self.ids(selections)] = True
+        return mask
+
+    def to_frame(self):
+        """The flat table in the scraper's CSV layout, in id order."""
+        with self._lock:
+            s = pd.read_sql_query("SELECT id, province, district, name, type, description, coordinates, "
+                                  "original_text, old_name_none FROM settlements ORDER BY id", self.conn)
+            tribes = pd.read_sql_query("SELECT settlement_id, tribe FROM tribes ORDER BY settlement_id, position",
+                                       self.conn)
+            eth = pd.read_sql_query("SELECT settlement_id, ethnicity FROM ethnicities "
+                                    "ORDER BY settlement_id, position", self.conn)
+            old = pd.read_sql_query("SELECT * FROM old_names ORDER BY settlement_id, position", self.conn)
+
+        old_entries = {}
+        for r in old.itertuples(index=False):
+            old_entries.setdefault(r.settlement_id, []).append(
+                {"name": r.name, "languages": r.languages, "romanized": r.romanized, "definition": r.definition})
+        return pd.DataFrame({
+            'Province': s['province'],
+            'District': s['district'],
+            'Name': s['name'],
+            'Type': s['type'],
+            'Old_Name': [_format_old_names(old_entries.get(i), none) for i, none in zip(s['id'], s['old_name_none'])],
+            'Description': s['description'],
+            'Tribes': s['id'].map(tribes.groupby('settlement_id')['tribe'].agg(', '.join)).fillna(''),
+            'Ethnicity': s['id'].map(eth.groupby('settlement_id')['ethnicity'].agg(', '.join)).fillna(''),
+            'Coordinates': s['coordinates'],
+            'Original_Text': s['original_text'],
+        }, columns=CSV_COLUMNS)
+
+    def export_csv(self, path):
+        """Writes the flat CSV export (UTF-16, like the scraper's output)."""
+        df = self.to_frame()
+        df.to_csv(path, index=False, encoding='utf-16')
+        return len(df)
+
+
+def ensure_store(csv_path, db_path=None):
+    """Returns the path of a store imported from csv_path, (re)importing it if the CSV or STORE_VERSION changed."""
+    db_path = db_path or store_path_for(csv_path)
+    if os.path.exists(db_path):
+        store = SettlementStore(db_path)
+        try:
+            source = store.get_meta("source")
+            version = store.get_meta("version")
+        finally:
+            store.close()
+        st = os.stat(csv_path)
+        fresh = source and source["size"] == st.st_size and (source["mtime_ns"] == st.st_mtime_ns
+                                                             or source["sha256"] == file_sha256(csv_path))
+        if fresh and version == STORE_VERSION:
+            return db_path
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    tmp = db_path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    store = SettlementStore(tmp)
+    try:
+        store.import_csv(csv_path)
+        store.conn.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        store.close()
+    os.replace(tmp, db_path)
+    return db_path
+
+
+if __name__ == "__main__":
+    # python store.py import <csv> [db]  |  python store.py export <db> <csv>
+    command, *rest = sys.argv[1:] or ["import"]
+    if command == "import":
+        csv_path = rest[0] if rest else "Turkey_Settlements_Nisanyanmap.csv"
+        out = ensure_store(csv_path, rest[1] if len(rest) > 1 else None)
+        print(f"💾 Settlements database ready: {out}")
+    elif command == "export":
+        db_path, csv_path = rest
+        n = SettlementStore(db_path).export_csv(csv_path)
+        print(f"💾 Exported {n} settlements from {db_path} to {csv_path}")
+    else:
+        sys.exit(f"Unknown command {command!r}; use import or export")
@@ -0,0 +1,117 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from provinces import PROVINCES
+from snapshot import parse_coordinates
+
+SOURCE_FILE = "Turkey_Settlements.csv"
+# Turkey_Settlements.csv has no tribe/ethnicity columns; their distributions come from here
+LABELS_FILE = "Turkey_Settlements_Nisanyanmap.csv"
+
+OUTPUT_COLUMNS = ['Province', 'District', 'Name', 'Type', 'Old_Name', 'Description',
+                  'Tribes', 'Ethnicity', 'Coordinates', 'Original_Text']
+
+# Rough extent of Turkey, for placing the synthetic provinces
+LAT_RANGE = (36.5, 41.5)
+LON_RANGE = (27.0, 44.0)
+
+
+def _token_lists(series):
+    """Per-row token lists of a comma-separated column ([] for empty)."""
+    return [[t.strip() for t in v.split(',') if t.strip()] if isinstance(v, str) else [] for v in series]
+
+
+def _sample_lists(lists, n, rng):
+    """
+    n comma-joined token lists with the same distribution of list lengths
+    and token frequencies as `lists`; empty lists become NaN.
+    """
+    lengths = np.array([len(x) for x in lists])
+    tokens, freq = np.unique([t for x in lists for t in x], return_counts=True)
+    if not len(tokens):
+        return np.full(n, np.nan, dtype=object)
+
+    counts = rng.choice(lengths, size=n)
+    drawn = rng.choice(tokens, size=int(counts.sum()), p=freq / freq.sum())
+    out = np.full(n, np.nan, dtype=object)
+    ends = np.cumsum(counts)
+    for i in np.flatnonzero(counts):
+        out[i] = ", ".join(dict.fromkeys(drawn[ends[i] - counts[i]:ends[i]]))
+    return out
+
+
+def generate(n_rows, seed=0, source=SOURCE_FILE, labels=LABELS_FILE):
+    """
+    Synthetic settlements table in the scraper's CSV layout.
+
+    Rows are templated on real settlements sampled with replacement: each
+    gets a real row's district, type, old name and description, and the
+    template's position relative to its province centre, moved to one of
+    the 81 provinces (placed at random inside Turkey) and jittered. Names
+    splice two real names; tribe and ethnicity lists follow the real list
+    lengths and token frequencies.
+    """
+    rng = np.random.default_rng(seed)
+    src = pd.read_csv(source, encoding='utf-16')
+    lab = pd.read_csv(labels, encoding='utf-16')
+
+    lat, lon = parse_coordinates(src['Coordinates'])
+    src = src.assign(latitude=lat, longitude=lon).dropna(subset=['latitude', 'longitude']).reset_index(drop=True)
+    centre = src.groupby('Province')[['latitude', 'longitude']].transform('mean')
+
+    template = rng.integers(0, len(src), size=n_rows)
+    province = rng.integers(0, len(PROVINCES), size=n_rows)
+    province_lat = rng.uniform(*LAT_RANGE, size=len(PROVINCES))
+    province_lon = rng.uniform(*LON_RANGE, size=len(PROVINCES))
+
+    out_lat = (src['latitude'].to_numpy() - centre['latitude'].to_numpy())[template] \
+        + province_lat[province] + rng.normal(0, 0.01, n_rows)
+    out_lon = (src['longitude'].to_numpy() - centre['longitude'].to_numpy())[template] \
+        + province_lon[province] + rng.normal(0, 0.01, n_rows)
+
+    names = src['Name'].fillna('').astype(str).to_numpy()
+    heads = np.array([s[:max(1, len(s) // 2)] for s in names], dtype=object)
+    tails = np.array([s[max(1, len(s) // 2):] for s in names], dtype=object)
+    name = heads[template] + tails[rng.integers(0, len(src), size=n_rows)]
+
+    lon_str = np.char.mod('%.4f', out_lon).astype(object)
+    lat_str = np.char.mod('%.4f', out_lat).astype(object)
+
+    return pd.DataFrame({
+        'Province': np.array(PROVINCES, dtype=object)[province],
+        'District': src['District'].to_numpy()[template],
+        'Name': name,
+        'Type': src['Type'].to_numpy()[template],
+        'Old_Name': src['Old_Name'].to_numpy()[template],
+        'Description': src['Description'].to_numpy()[template],
+        'Tribes': _sample_lists(_token_lists(lab['Tribes']), n_rows, rng),
+        'Ethnicity': _sample_lists(_token_lists(lab['Ethnicity']), n_rows, rng),
+        'Coordinates': '[' + lon_str + ', ' + lat_str + ']',
+        'Original_Text': np.nan,
+    }, columns=OUTPUT_COLUMNS)
+
+
+def write_synthetic(path, n_rows, seed=0):
+    """Generates n_rows settlements into a UTF-16 CSV at `path` (like the scraper output)."""
+    df = generate(n_rows, seed)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    df.to_csv(path, index=False, encoding='utf-16')
+    print(f"🧪 Wrote {len(df):,} synthetic settlements to {path}")
+    return path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate synthetic settlement tables for benchmarks.")
+    parser.add_argument("rows", type=int, nargs="+", help="Row counts, e.g. 10000 100000 1000000.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dir", default="bench_data", help="Output directory (default: bench_data).")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    for n in args.rows:
+        write_synthetic(os.path.join(args.dir, f"settlements_{n}.csv"), n, args.seed)
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from engine import Engine, Query, export_key
+
+NAMES = ['Kızılca', 'Kızılcaören', 'Yenikızılca', 'Kuzılca', 'Çamlıbel']
+
+
+def small_engine():
+    n = len(NAMES)
+    df = pd.DataFrame({
+        'Province': ['Adana'] * n, 'District': ['Ceyhan'] * n, 'Name': NAMES, 'Old_Name': [''] * n,
+        'Description': [''] * n, 'Ethnicity': ['Türk'] * n, 'Tribes': [''] * n,
+        'latitude': np.full(n, 37.0, dtype=np.float32), 'longitude': np.full(n, 35.5, dtype=np.float32),
+    })
+    return Engine(df)
+
+
+def test_near_misses_only_with_fuzzy():
+    engine = small_engine()
+    exact = Query(text="kizilca")
+    # "Kuzılca" is a near miss: not part of the filtered (counted, exported) rows by default
+    assert engine.rows(exact).tolist() == [0, 1, 2]
+    mask, _ = engine.search_mask(exact)
+    assert mask.tolist() == [True, True, True, False, False]
+
+    fuzzy = Query(text="kizilca", fuzzy=True)
+    assert engine.rows(fuzzy).tolist() == [0, 1, 2, 3]
+    # Different filter states, so different cached exports
+    assert export_key(exact) != export_key(fuzzy)
@@ -0,0 +1,67 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from engine import Engine, Query, export_key
+from exports import PALETTE, write_umap
+
+
+def small_engine():
+    df = pd.DataFrame({
+        'Province': ['Adana', 'Adana', 'Adana'],
+        'District': ['Ceyhan', 'Ceyhan', 'Kozan'],
+        'Name': ['Kızılca', 'Yeniköy', 'Avşarlı'],
+        'Old_Name': ['', '', ''],
+        'Description': ['', '', ''],
+        'Tribes': ['Ali', 'Avşar', 'Ali, Avşar'],
+        'Ethnicity': ['Türk', 'Türk', 'Türk'],
+        'latitude': np.array([37.0, 37.1, 37.4], dtype=np.float32),
+        'longitude': np.array([35.8, 35.9, 35.8], dtype=np.float32),
+    })
+    return Engine(df)
+
+
+def umap_layer_colors(path):
+    with open(path, encoding='utf-8') as f:
+        umap = json.load(f)
+    return {layer["_umap_options"]["name"]: layer["_umap_options"]["color"] for layer in umap["layers"]}
+
+
+def test_reordered_groups_change_colors_and_key(tmp_path):
+    engine = small_engine()
+    first = Query(tribes=("Ali", "Avşar"), format="umap")
+    second = Query(tribes=("Avşar", "Ali"), format="umap")
+
+    a = umap_layer_colors(engine.export(first, tmp_path / "a.umap"))
+    b = umap_layer_colors(engine.export(second, tmp_path / "b.umap"))
+    assert a == {"Ali": PALETTE[0], "Avşar": PALETTE[1]}
+    assert b == {"Ali": PALETTE[1], "Avşar": PALETTE[0]}
+
+    for fmt in ("geojson", "umap"):
+        assert export_key(first, fmt) != export_key(second, fmt)
+    # Uncolored formats are the same file either way
+    for fmt in ("csv", "zip"):
+        assert export_key(first, fmt) == export_key(second, fmt)
+
+
+def umap_center(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)["geometry"]["coordinates"]
+
+
+def test_umap_opens_on_the_exported_rows(tmp_path):
+    df = small_engine().df.copy()
+    # One settlement far away in Istanbul and one without coordinates, neither exported with the layers
+    df.loc[1, ['latitude', 'longitude']] = [41.0, 29.0]
+    df.loc[2, ['latitude', 'longitude']] = [np.nan, np.nan]
+
+    write_umap(df, {"Ali": np.array([0, 2]), "Avşar": np.array([0])}, tmp_path / "a.umap")
+    # Row 0 once, row 2 has no coordinates
+    assert umap_center(tmp_path / "a.umap") == [35.8, 37.0]
+
+    write_umap(df, {"Ali": np.array([0]), "Avşar": np.array([1])}, tmp_path / "b.umap")
+    assert umap_center(tmp_path / "b.umap") == [32.4, 39.0]
+
+    write_umap(df, {}, tmp_path / "c.umap")
+    assert umap_center(tmp_path / "c.umap") == [35.0, 39.0]
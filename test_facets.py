@@ -0,0 +1,118 @@
+import random
+
+import numpy as np
+
+from facets import STAGES, FacetEngine, LRUCache
+from token_index import TokenIndex
+
+VALUES = {
+    'Province': ['Adana', 'Hatay', 'Mersin'],
+    'District': ['Ceyhan', 'Kozan', 'Antakya', 'Tarsus'],
+    'Ethnicity': ['Türk', 'Kürt', 'Arap', 'Rum'],
+    'Tribes': ['Ali', 'Alikan', 'Avşar', 'Karakeçili', 'Cerit'],
+}
+# Province and District are single values, the others comma-separated lists
+SEPS = {'Province': None, 'District': None, 'Ethnicity': ',', 'Tribes': ','}
+
+
+def random_rows(rng, n_rows):
+    rows = []
+    for _ in range(n_rows):
+        row = {}
+        for stage in STAGES:
+            if SEPS[stage] is None:
+                row[stage] = {rng.choice(VALUES[stage])}
+            else:
+                row[stage] = set(rng.sample(VALUES[stage], rng.randrange(3)))
+        rows.append(row)
+    return rows
+
+
+def build_engine(rows):
+    indexes = {}
+    for stage in STAGES:
+        column = [', '.join(sorted(row[stage])) for row in rows]
+        indexes[stage] = TokenIndex(column, sep=SEPS[stage])
+    return FacetEngine(indexes)
+
+
+def brute_mask(rows, selections, stages=STAGES):
+    return [all(not selections.get(s) or row[s] & set(selections[s]) for s in stages) for row in rows]
+
+
+def random_selections(rng):
+    return {stage: rng.sample(VALUES[stage], rng.randrange(3)) for stage in STAGES}
+
+
+def test_matches_brute_force():
+    rng = random.Random(5)
+    rows = random_rows(rng, 300)
+    engine = build_engine(rows)
+
+    # Many selections in a row, so later calls also go through the memoized masks and counts
+    for _ in range(200):
+        selections = random_selections(rng)
+        mask = engine.mask(selections)
+        expected = brute_mask(rows, selections)
+        assert (mask is None and all(expected)) or mask.tolist() == expected
+
+        for i, stage in enumerate(STAGES):
+            upstream = brute_mask(rows, selections, STAGES[:i])
+            present = set().union(*(row[stage] for row, m in zip(rows, upstream) if m))
+            assert engine.options(stage, selections) == sorted(present)
+
+            others = brute_mask(rows, selections, [s for s in STAGES if s != stage])
+            expected_counts = {v: sum(1 for row, m in zip(rows, others) if m and v in row[stage])
+                               for v in engine.indexes[stage].vocab}
+            assert engine.counts(stage, selections) == expected_counts
+
+
+def test_counts_under_a_search_or_area_mask():
+    rng = random.Random(7)
+    rows = random_rows(rng, 300)
+    engine = build_engine(rows)
+    np_rng = np.random.default_rng(7)
+    bases = {f"search-{i}": np_rng.random(len(rows)) < 0.3 for i in range(3)}
+
+    for _ in range(50):
+        selections = random_selections(rng)
+        for stage in STAGES:
+            others = brute_mask(rows, selections, [s for s in STAGES if s != stage])
+            for base_key, base in bases.items():
+                expected = {v: sum(1 for row, m, b in zip(rows, others, base) if m and b and v in row[stage])
+                            for v in engine.indexes[stage].vocab}
+                assert engine.counts(stage, selections, base, base_key) == expected
+                # Without a key the counts are right too, just not cached
+                assert engine.counts(stage, selections, base) == expected
+            # The same selections without a base are a different cache entry
+            assert engine.counts(stage, selections) == {
+                v: sum(1 for row, m in zip(rows, others) if m and v in row[stage])
+                for v in engine.indexes[stage].vocab}
+
+
+def test_selection_order_does_not_matter():
+    rng = random.Random(9)
+    engine = build_engine(random_rows(rng, 100))
+    first = engine.mask({'Tribes': ['Ali', 'Avşar'], 'Province': ['Adana']})
+    second = engine.mask({'Province': ['Adana'], 'Tribes': ['Avşar', 'Ali']})
+    assert np.array_equal(first, second)
+    assert engine.mask({}) is None
+
+
+def test_lru_cache_bounds():
+    cache = LRUCache(maxsize=3)
+    for k in 'abcd':
+        cache[k] = k
+    assert 'a' not in cache and len(cache) == 3
+    cache.get('b')
+    cache['e'] = 'e'
+    # 'b' was used more recently than 'c'
+    assert 'b' in cache and 'c' not in cache
+
+    cache = LRUCache(maxsize=100, maxbytes=250)
+    for k in range(4):
+        cache[k] = np.zeros(100, dtype=bool)
+    assert len(cache) == 2 and cache.nbytes == 200
+    # A single entry above the bound is still kept
+    cache['big'] = np.zeros(1000, dtype=bool)
+    assert len(cache) == 1 and cache.nbytes == 1000
@@ -0,0 +1,117 @@
+import itertools
+import sqlite3
+
+import journal
+from journal import CrawlJournal, DONE, FAILED, RUNNING, PROVINCE_JOB
+
+
+def open_journal(tmp_path, monkeypatch):
+    # A strictly increasing clock, so finished_at orders the jobs as they ran
+    clock = itertools.count(1000)
+    monkeypatch.setattr(journal.time, "time", lambda: float(next(clock)))
+    return CrawlJournal(str(tmp_path / "journal.sqlite"))
+
+
+def test_done_jobs_are_skipped_after_restart(tmp_path, monkeypatch):
+    j = open_journal(tmp_path, monkeypatch)
+    j.start("Adana")
+    j.record_districts("Adana", ["Ceyhan", "Kozan"])
+    j.finish("Adana", records=2)
+    j.start("Adana", "Ceyhan")
+    j.finish("Adana", "Ceyhan", records=2, keys=["id:1", "id:2"])
+    j.start("Adana", "Kozan")
+    # Interrupted here: Kozan stays running
+    j.close()
+
+    j = CrawlJournal(str(tmp_path / "journal.sqlite"))
+    assert j.state("Adana") == DONE
+    assert j.state("Adana", "Ceyhan") == DONE
+    assert j.state("Adana", "Kozan") == RUNNING
+    assert j.state("Hatay") is None
+    assert j.districts("Adana") == ["Ceyhan", "Kozan"]
+    assert sorted(j.settlement_keys()) == ["id:1", "id:2"]
+    # The province job counts districts, district jobs count settlements
+    assert j.summary() == {DONE: (2, 2), RUNNING: (1, 0)}
+
+
+def test_failed_job_is_retried_with_attempt_count(tmp_path, monkeypatch):
+    j = open_journal(tmp_path, monkeypatch)
+    j.start("Adana", "Ceyhan")
+    j.fail("Adana", "Ceyhan", error=TimeoutError("slow"))
+    j.start("Hatay", "Antakya")
+    j.fail("Hatay", "Antakya")
+    assert j.jobs(FAILED) == [("Adana", "Ceyhan", 1), ("Hatay", "Antakya", 1)]
+    assert j.conn.execute("SELECT error FROM jobs WHERE district = 'Ceyhan'").fetchone() == ("slow",)
+
+    j.start("Adana", "Ceyhan")
+    assert j.state("Adana", "Ceyhan") == RUNNING
+    # A new attempt clears the previous error
+    assert j.conn.execute("SELECT error FROM jobs WHERE district = 'Ceyhan'").fetchone() == (None,)
+    j.fail("Adana", "Ceyhan", error="again")
+    j.start("Adana", "Ceyhan")
+    j.finish("Adana", "Ceyhan", records=3, keys=["id:1", "id:2", "id:3"])
+
+    assert j.jobs(FAILED) == [("Hatay", "Antakya", 1)]
+    assert j.jobs(DONE) == [("Adana", "Ceyhan", 3)]
+    # Failed attempts add no records
+    assert j.summary()[DONE] == (1, 3)
+
+
+def test_incomplete_and_refresh_candidates(tmp_path, monkeypatch):
+    j = open_journal(tmp_path, monkeypatch)
+    for district, expected, captured in (("Ceyhan", 120, 100), ("Kozan", 40, 40), ("Tarsus", None, 10)):
+        j.start("Adana", district)
+        j.finish("Adana", district, records=captured, expected=expected, captured=captured)
+    j.start("Adana")
+    j.finish("Adana", records=3, expected=3, captured=2)
+    j.start("Hatay", "Antakya")
+    j.fail("Hatay", "Antakya")
+
+    assert j.incomplete() == [("Adana", PROVINCE_JOB, 3, 2), ("Adana", "Ceyhan", 120, 100)]
+
+    # A refetch that finds the rest adds its records and updates the counts
+    j.start("Adana", "Ceyhan")
+    j.finish("Adana", "Ceyhan", records=20, expected=120, captured=120)
+    assert j.incomplete() == [("Adana", PROVINCE_JOB, 3, 2)]
+    assert j.conn.execute("SELECT records FROM jobs WHERE district = 'Ceyhan'").fetchone() == (120,)
+
+    # Finished district jobs only, least recently finished first
+    assert j.refresh_candidates() == [("Adana", "Kozan"), ("Adana", "Tarsus"), ("Adana", "Ceyhan")]
+    assert j.refresh_candidates(limit=2) == [("Adana", "Kozan"), ("Adana", "Tarsus")]
+    sample = j.refresh_candidates(sample=0.5, seed=1)
+    assert len(sample) == 2 and set(sample) <= set(j.refresh_candidates())
+    assert sample == j.refresh_candidates(sample=0.5, seed=1)
+
+
+def test_journal_from_before_migrations(tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE provinces (province TEXT PRIMARY KEY, districts TEXT NOT NULL, listed_at REAL NOT NULL);
+        CREATE TABLE jobs (province TEXT NOT NULL, district TEXT NOT NULL, state TEXT NOT NULL,
+                           attempts INTEGER NOT NULL DEFAULT 0, records INTEGER NOT NULL DEFAULT 0,
+                           started_at REAL, finished_at REAL, duration REAL, error TEXT,
+                           PRIMARY KEY (province, district));
+        CREATE TABLE settlements (key TEXT PRIMARY KEY, province TEXT NOT NULL, district TEXT NOT NULL);
+        INSERT INTO jobs VALUES ('Adana', 'Ceyhan', 'done', 1, 2, 1.0, 2.0, 1.0, NULL);
+        INSERT INTO settlements VALUES ('id:1', 'Adana', 'Ceyhan');
+    """)
+    conn.close()
+
+    j = CrawlJournal(path)
+    columns = {row[1] for row in j.conn.execute("PRAGMA table_info(jobs)")}
+    assert {"expected", "captured", "content_hash"} <= columns
+    assert j.state("Adana", "Ceyhan") == DONE
+    assert j.settlement_keys() == ["id:1"]
+    # Rows written before the migration have no hash or record to diff against
+    assert j.owned_settlements("Adana", "Ceyhan") == {"id:1": (None, None)}
+    assert j.content_hash("Adana", "Ceyhan") is None
+
+    j.start("Adana", "Kozan")
+    j.finish("Adana", "Kozan", records=1, keys=["id:2"], expected=1, captured=1,
+             settlements={"id:2": {"Name": "Kozan"}}, content_hash="abc")
+    assert j.content_hash("Adana", "Kozan") == "abc"
+    assert j.owned_settlements("Adana", "Kozan")["id:2"][1] == {"Name": "Kozan"}
+    j.close()
+    # Reopening a migrated journal leaves it as is
+    assert CrawlJournal(path).state("Adana", "Kozan") == DONE
@@ -0,0 +1,33 @@
+import functools
+
+import pytest
+
+pytest.importorskip("httpx")
+loadtest = pytest.importorskip("loadtest")
+from http_fetch import Paging  # noqa: E402
+from ratelimit import AdaptiveController  # noqa: E402
+from replay_server import save_recording  # noqa: E402
+
+SETTLEMENTS = [{"id": i, "name": f"Köy {i}", "locationType": {"name": {"tr": "köy"}}} for i in range(12)]
+
+
+@pytest.fixture
+def recordings(tmp_path, monkeypatch):
+    save_recording(str(tmp_path), "Adana", {"locations": [{"name": "Ceyhan", "locationType": {"name": {"tr": "ilçe"}}}]})
+    save_recording(str(tmp_path), "Ceyhan", {"locations": SETTLEMENTS})
+    # Skip the cautious 2 s start of the real pacing
+    monkeypatch.setattr(loadtest.scraper, "AdaptiveController", functools.partial(AdaptiveController, start_rate=1000))
+    # run_scraper points the module's tracer at the (deleted) scratch trace file; put it back afterwards
+    monkeypatch.setattr(loadtest.scraper, "tracer", loadtest.scraper.tracer)
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize("paging", [None, Paging("skip", "offset")])
+def test_pages_are_not_counted_as_retries(recordings, paging):
+    report = loadtest.run_load_test(recordings, concurrency=2, provinces=["Adana"], page_size=5, paging=paging)
+    assert report["records"] == len(SETTLEMENTS)
+    # The province search, then Ceyhan's three pages; no errors were injected
+    assert report["requests"] == 4
+    assert report["retries"] == 0
+    assert report["client_errors"] == {}
+    assert report["incomplete_jobs"] == 0
@@ -0,0 +1,65 @@
+import io
+import shutil
+import zipfile
+
+import pytest
+
+from engine import Engine, Query, export_key
+from packs import PackStore, build_packs
+
+DATA = "Turkey_Settlements_Nisanyanmap.csv"
+
+
+@pytest.fixture(scope="module")
+def built(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("packs")
+    csv_path = str(tmp / DATA)
+    shutil.copy(DATA, csv_path)
+    pack_dir = str(tmp / "packs")
+    build_packs(csv_path, pack_dir, workers=1)
+    return Engine.load(csv_path), PackStore.load(csv_path, pack_dir), tmp
+
+
+def zip_entries(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        return [(name, z.read(name)) for name in z.namelist()]
+
+
+def built_export(engine, query, fmt, tmp):
+    path = str(tmp / f"built.{fmt}")
+    engine.export(query, path, fmt)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("column, field", [("Tribes", "tribes"), ("Ethnicity", "ethnicities")])
+def test_zip_for_any_groups_of_a_province_is_assembled_from_packs(built, column, field):
+    engine, store, tmp = built
+    province = engine.token_indexes['Province'].vocab[0]
+    groups = engine.facets.options(column, {'Province': [province]})
+    assert len(groups) >= 2
+
+    # A few of the province's groups, in selection order, plus one with no rows in it
+    selection = (groups[1], "Olmayan", groups[0])
+    query = Query(provinces=(province,), **{field: selection})
+    assert store.serves(query, "zip")
+    entries = zip_entries(store.export(query, "zip"))
+    assert [name for name, _ in entries] == [f"{column}_{groups[1]}.csv", f"{column}_{groups[0]}.csv"]
+    assert entries == zip_entries(built_export(engine, query, "zip", tmp))
+
+    # A single group's CSV export is one of the packs as is
+    single = Query(provinces=(province,), **{field: (groups[0],)})
+    assert export_key(single, "csv") in store
+    assert store.export(single, "csv") == built_export(engine, single, "csv", tmp)
+
+
+def test_other_filter_states_are_left_to_the_app(built):
+    engine, store, _ = built
+    provinces = engine.token_indexes['Province'].vocab
+    tribe = engine.facets.options('Tribes', {'Province': [provinces[0]]})[0]
+    for query in (Query(provinces=(provinces[0],), tribes=(tribe,), text="köy"),
+                  Query(provinces=tuple(provinces[:2]), tribes=(tribe,)),
+                  Query(tribes=(tribe,))):
+        assert not store.serves(query, "zip")
+        assert store.export(query, "zip") is None
+    assert store.serves(Query(provinces=(provinces[0],)), "csv")
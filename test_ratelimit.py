@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from ratelimit import AdaptiveController
+
+
+def controller(**kwargs):
+    # Fast pacing so acquire() doesn't sleep; quiet logging
+    kwargs = {"max_rate": 0, "start_rate": 1000.0, "log_interval": 1e9, **kwargs}
+    return AdaptiveController(**kwargs)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_additive_increase_up_to_the_bounds():
+    async def main():
+        c = controller(max_rate=200.0, start_rate=100.0, step=20.0, max_limit=3)
+        for _ in range(20):
+            await c.acquire()
+            await c.release(0.1)
+        return c
+
+    c = run(main())
+    assert c.rate == 200.0
+    assert c.limit == 3
+    assert c.in_flight == 0
+    assert c.error_ratio == 0.0
+
+
+def test_limit_grows_about_one_per_round():
+    async def main():
+        c = controller(max_limit=10)
+        limits = []
+        for _ in range(6):
+            await c.acquire()
+            await c.release(0.1)
+            limits.append(c.limit)
+        return limits
+
+    assert run(main()) == pytest.approx([2.0, 2.5, 2.9, 3.2448, 3.5530, 3.8345], abs=1e-3)
+
+
+@pytest.mark.parametrize("failure", [{"status": 429}, {"status": 503}, {"timed_out": True}, {"status": None}])
+def test_multiplicative_decrease_on_load_signals(failure):
+    async def main():
+        c = controller(max_limit=8)
+        c.rate, c.limit = 4.0, 8.0
+        await c.acquire()
+        await c.release(1.0, failed=True, **failure)
+        return c
+
+    c = run(main())
+    assert (c.rate, c.limit) == (2.0, 4.0)
+    assert c.error_ratio == 1.0
+
+
+def test_client_errors_and_slow_successes():
+    async def main():
+        c = controller(max_limit=8, step=0.5, target_latency=1.0)
+        c.rate, c.limit = 4.0, 8.0
+        await c.acquire()
+        await c.release(0.1, failed=True, status=404)
+        after_404 = (c.rate, c.limit)
+        await c.acquire()
+        await c.release(2.0)
+        return after_404, (c.rate, c.limit)
+
+    after_404, after_slow = run(main())
+    # A 404 says nothing about load; a slow success only backs the rate off
+    assert after_404 == (4.0, 8.0)
+    assert after_slow == (3.5, 8.0)
+
+
+def test_in_flight_cap_and_cancelled_slots():
+    async def main():
+        c = controller(max_limit=4)
+        c.limit = 2.0
+        await c.acquire()
+        await c.acquire()
+        third = asyncio.create_task(c.acquire())
+        await asyncio.sleep(0.01)
+        # The third request waits for a slot
+        blocked = not third.done() and c.in_flight == 2
+
+        # A cancelled request gives its slot back without changing the pacing
+        await c.release(0.0, cancelled=True)
+        await asyncio.wait_for(third, 1)
+        unblocked = c.in_flight == 2 and c.requests == 0 and c.limit == 2.0
+
+        # Cancelled while waiting for the pacing delay: no slot is leaked
+        c.rate = 0.01
+        await c.release(0.0, cancelled=True)
+        await c.acquire()  # the next start is now 100 s away
+        await c.release(0.0, cancelled=True)
+        sleeper = asyncio.create_task(c.acquire())
+        await asyncio.sleep(0.01)
+        sleeper.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await sleeper
+        return blocked, unblocked, c.in_flight
+
+    blocked, unblocked, in_flight = run(main())
+    assert blocked and unblocked
+    assert in_flight == 1
+
+
+def test_cancelled_fetch_releases_its_slot():
+    scraper = pytest.importorskip("scraper")
+    from ratelimit import HostLimiter
+
+    async def main():
+        c = controller()
+        started = asyncio.Event()
+
+        async def fetch(query, timeout, params):
+            started.set()
+            await asyncio.sleep(60)
+
+        task = asyncio.create_task(scraper.paced_fetch(fetch, "Ceyhan", c, HostLimiter(1), "http://x/"))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return c
+
+    c = run(main())
+    assert c.in_flight == 0
+    assert c.requests == 0
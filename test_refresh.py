@@ -0,0 +1,159 @@
+import asyncio
+import json
+
+import pandas as pd
+import pytest
+
+from extract import build_record
+from journal import CrawlJournal
+from refresh import ChangeLog, _row, content_hash, diff_district
+from writer import DedupWriter, settlement_key
+
+
+def item(id, name, note="", coords=(35.8, 37.0)):
+    return {"id": id, "name": name, "note": {"tr": note}, "coordinates": list(coords),
+            "locationType": {"name": {"tr": "köy"}}}
+
+
+BEFORE = [item(1, "Kızılca", 'Eski adı "Kızılcaviran", yayla'), item(2, "Yeniköy"), item(3, "Çamlıbel"),
+          item(4, "İncirli", coords=(35.9, 37.1))]
+# Yeniköy renamed, Çamlıbel gone, Alhasuşağı new; the response also comes back in another order
+AFTER = [item(4, "İncirli", coords=(35.9, 37.1)), item(5, "Alhasuşağı"), item(2, "Yeni Köy"),
+         item(1, "Kızılca", 'Eski adı "Kızılcaviran", yayla')]
+OTHER = [item(10, "Kozan Köyü")]
+
+
+def keyed(items, district="Ceyhan"):
+    return [(settlement_key(v), build_record("Adana", district, v)) for v in items]
+
+
+def crawl(tmp_path):
+    """A journal and CSV as a first crawl of Ceyhan and Kozan leaves them."""
+    journal = CrawlJournal(str(tmp_path / "journal.sqlite"))
+    writer = DedupWriter(str(tmp_path / "out.csv"))
+    for district, items in (("Ceyhan", BEFORE), ("Kozan", OTHER)):
+        pairs = keyed(items, district)
+        journal.start("Adana", district)
+        written = writer.write(pairs, district)
+        journal.finish("Adana", district, records=len(written), keys=written, settlements=dict(pairs),
+                       content_hash=content_hash(pairs))
+    return journal, writer
+
+
+def csv_lines(path):
+    with open(path, encoding='utf-16', newline='') as f:
+        return f.read().splitlines(keepends=True)
+
+
+def test_diff_district(tmp_path):
+    journal, writer = crawl(tmp_path)
+    owned = journal.owned_settlements("Adana", "Ceyhan")
+    added, removed, modified = diff_district(owned, keyed(AFTER), writer.seen)
+    assert added == keyed(AFTER[1:2])
+    assert removed == ["id:3"]
+    assert modified == keyed(AFTER[2:3])
+    assert modified[0][1]["Name"] == "Yeni Köy"
+
+    # Reordered but otherwise the same response has the same content hash
+    assert content_hash(keyed(BEFORE[::-1])) == journal.content_hash("Adana", "Ceyhan")
+    assert content_hash(keyed(AFTER)) != journal.content_hash("Adana", "Ceyhan")
+
+    # Rows crawled before hashes were kept are never counted as modified
+    assert diff_district({k: (None, None) for k in owned}, keyed(AFTER), writer.seen)[2] == []
+    # Nor are settlements another district wrote
+    assert diff_district({}, keyed(OTHER), writer.seen) == ([], [], [])
+
+
+def test_refresh_district_and_apply(tmp_path):
+    scraper = pytest.importorskip("scraper")
+    journal, writer = crawl(tmp_path)
+    csv_path = writer.path
+    before = csv_lines(csv_path)
+    changes = ChangeLog(str(tmp_path / "changes.jsonl"), run="test")
+
+    raw = {settlement_key(v): v for v in AFTER}
+    written = scraper.refresh_district("Adana", "Ceyhan", keyed(AFTER), raw, journal, writer, None, changes)
+    assert written == ["id:5"]
+    assert changes.apply(csv_path) == 2
+
+    after = csv_lines(csv_path)
+    # Header, Kızılca, İncirli and Kozan untouched, byte for byte; Yeniköy renamed in place; Çamlıbel dropped;
+    # Alhasuşağı appended
+    assert after[0] == before[0]
+    assert after[1] == before[1]
+    assert after[2] == before[2].replace("Yeniköy", "Yeni Köy")
+    assert after[3:5] == before[4:6]
+    assert "Alhasuşağı" in after[5]
+    assert len(after) == 6
+    assert not any("Çamlıbel" in line for line in after)
+
+    log = [json.loads(line) for line in open(changes.path, encoding='utf-8')]
+    assert sorted((e["change"], e["key"]) for e in log) == [("added", "id:5"), ("modified", "id:2"),
+                                                             ("removed", "id:3")]
+    assert changes.counts == {"added": 1, "removed": 1, "modified": 1}
+
+    # The journal now holds the new versions, so the same response again changes nothing
+    owned = journal.owned_settlements("Adana", "Ceyhan")
+    assert sorted(owned) == ["id:1", "id:2", "id:4"]
+    assert owned["id:2"][1]["Name"] == "Yeni Köy"
+    # As the crawl worker finishes the refresh job
+    journal.finish("Adana", "Ceyhan", records=len(written), keys=written, settlements=dict(keyed(AFTER)),
+                   content_hash=content_hash(keyed(AFTER)))
+    assert sorted(journal.owned_settlements("Adana", "Ceyhan")) == ["id:1", "id:2", "id:4", "id:5"]
+    assert scraper.refresh_district("Adana", "Ceyhan", keyed(AFTER), raw, journal, writer, None, changes) == []
+    assert changes.unchanged == 1
+
+
+def assert_csv_matches_journal(csv_path, journal):
+    rows = pd.read_csv(csv_path, encoding='utf-16', dtype=str, keep_default_na=False)
+    records = [json.loads(r) for r, in journal.conn.execute("SELECT record FROM settlements")]
+    assert sorted(rows.itertuples(index=False, name=None)) == sorted(_row(r) for r in records)
+
+
+def test_stopped_refresh_leaves_csv_and_journal_in_step(tmp_path, monkeypatch):
+    scraper = pytest.importorskip("scraper")
+    journal, writer = crawl(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scraper, "OUTPUT_FILE", writer.path)
+
+    async def fetch(query, timeout, params=None):
+        if query == "Kozan":
+            await asyncio.sleep(60)
+        return {"locations": AFTER}
+
+    async def main():
+        run = asyncio.create_task(scraper.run_jobs([fetch], "http://x/", 0, None, journal, None, refresh=(None, None)))
+        # Stopped (like Ctrl-C) once Ceyhan is refreshed, while Kozan is still being fetched
+        while journal.content_hash("Adana", "Ceyhan") != content_hash(keyed(AFTER)):
+            await asyncio.sleep(0.01)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+
+    asyncio.run(main())
+    assert_csv_matches_journal(writer.path, journal)
+    assert journal.pending_rewrites() == {}
+
+
+def test_rewrites_left_by_a_crash_are_applied_on_next_start(tmp_path, monkeypatch):
+    scraper = pytest.importorskip("scraper")
+    journal, writer = crawl(tmp_path)
+    changes = ChangeLog(str(tmp_path / "changes.jsonl"))
+    raw = {settlement_key(v): v for v in AFTER}
+    written = scraper.refresh_district("Adana", "Ceyhan", keyed(AFTER), raw, journal, writer, None, changes)
+    journal.finish("Adana", "Ceyhan", records=len(written), keys=written, settlements=dict(keyed(AFTER)),
+                   content_hash=content_hash(keyed(AFTER)))
+    # The process dies before changes.apply: the CSV still has Yeniköy and Çamlıbel
+    journal.close()
+    assert "Çamlıbel" in "".join(csv_lines(writer.path))
+
+    journal = CrawlJournal(str(tmp_path / "journal.sqlite"))
+    assert len(journal.pending_rewrites()) == 2
+    monkeypatch.setattr(scraper, "OUTPUT_FILE", writer.path)
+
+    async def fetch(query, timeout, params=None):
+        raise AssertionError("nothing to crawl")
+
+    asyncio.run(scraper.run_jobs([fetch], "http://x/", 0, None, journal, None, provinces=[]))
+    assert_csv_matches_journal(writer.path, journal)
+    assert journal.pending_rewrites() == {}
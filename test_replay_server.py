@@ -0,0 +1,57 @@
+import json
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+from http_fetch import Paging
+from replay_server import make_server, save_recording
+
+LOCATIONS = [{"name": f"Köy {i}"} for i in range(23)]
+
+
+@pytest.fixture
+def serve(tmp_path):
+    save_recording(str(tmp_path), "Ceyhan", {"locations": LOCATIONS})
+    servers = []
+
+    def start(paging=None, page_size=5):
+        server = make_server(str(tmp_path), port=0, page_size=page_size, paging=paging)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/subdivision_search"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def get(url, params):
+    with urllib.request.urlopen(url + "?" + urllib.parse.urlencode({"search": "Ceyhan", **params})) as response:
+        return json.loads(response.read())
+
+
+@pytest.mark.parametrize("paging", [Paging("page"), Paging("p", start=0), Paging("skip", "offset")])
+def test_pages_follow_the_scrapers_paging(serve, paging):
+    url = serve(paging)
+    # The plain search is the first page; the scraper's later requests cover the rest, once each
+    fetched = []
+    for index in range(5):
+        payload = get(url, paging.params(index, 5) if index else {})
+        assert payload["totalCount"] == len(LOCATIONS)
+        assert len(payload["locations"]) == (5 if index < 4 else 3)
+        fetched += payload["locations"]
+    assert fetched == LOCATIONS
+
+
+def test_other_parameters_are_ignored_and_bad_values_rejected(serve):
+    url = serve(Paging("offset", "offset"))
+    # A ?page=N the server was not set up for doesn't select anything
+    assert get(url, {"page": 3})["locations"] == LOCATIONS[:5]
+    assert get(url, {"offset": 20})["locations"] == LOCATIONS[20:]
+    with pytest.raises(urllib.error.HTTPError) as error:
+        get(url, {"offset": "x"})
+    assert error.value.code == 400
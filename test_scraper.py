@@ -0,0 +1,54 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+scraper = pytest.importorskip("scraper")
+from journal import CrawlJournal, DONE, RUNNING  # noqa: E402
+from ratelimit import AdaptiveController  # noqa: E402
+from writer import DedupWriter  # noqa: E402
+
+PAYLOADS = {
+    "Adana": {"locations": [{"name": d, "locationType": {"name": {"tr": "ilçe"}}} for d in ("Ceyhan", "Kozan")]},
+    "Ceyhan": {"locations": [{"id": 1, "name": "Kızılca"}]},
+    "Kozan": {"locations": [{"id": 2, "name": "Yeniköy"}]},
+}
+
+
+async def fetch(query, timeout, params=None):
+    return PAYLOADS[query]
+
+
+def run_crawl(tmp_path, journal, workers=1):
+    queue = scraper.JobQueue()
+    queue.put_nowait(("province", "Adana"))
+    controller = AdaptiveController(max_rate=0, start_rate=1000.0, log_interval=1e9)
+    writer = DedupWriter(str(tmp_path / "out.csv"))
+    crawl = scraper.crawl(queue, [fetch] * workers, "http://x/", controller, None, journal, None, writer)
+    asyncio.run(asyncio.wait_for(crawl, 10))
+
+
+def test_a_job_whose_journal_write_fails_does_not_stop_the_crawl(tmp_path, monkeypatch):
+    journal = CrawlJournal(str(tmp_path / "journal.sqlite"))
+    finish = journal.finish
+
+    def locked(province, district="", **kwargs):
+        if district == "Ceyhan":
+            raise sqlite3.OperationalError("database is locked")
+        return finish(province, district, **kwargs)
+
+    monkeypatch.setattr(journal, "finish", locked)
+    # The only worker, so it has to survive for Kozan to be crawled
+    run_crawl(tmp_path, journal)
+    assert journal.state("Adana", "Kozan") == DONE
+    # Left unfinished, so the next run redoes it
+    assert journal.state("Adana", "Ceyhan") == RUNNING
+
+
+def test_a_dead_worker_stops_the_pass_instead_of_hanging(tmp_path, monkeypatch):
+    async def dies(*args):
+        raise RuntimeError("worker bug")
+
+    monkeypatch.setattr(scraper, "crawl_worker", dies)
+    with pytest.raises(RuntimeError, match="worker bug"):
+        run_crawl(tmp_path, CrawlJournal(str(tmp_path / "journal.sqlite")), workers=2)
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+from search import EXACT, PREFIX, SUBSTRING, SearchIndex, fold
+from snapshot import load_index, save_index
+
+NAMES = pd.Series(['Kızılca', 'Kızılcaören', 'Yenikızılca', 'İğdır', 'Çamlıbel', 'Alhasuşağı', 'Kuzılca', None],
+                  name='Name')
+OLD_NAMES = pd.Series(['', 'Kızılcaviran | Ören', '', '', '', '', 'Şeyhli', ''], name='Old_Name')
+
+
+def name_index():
+    return SearchIndex([NAMES, OLD_NAMES], split={'Old_Name': '|'})
+
+
+def test_fold():
+    assert fold("Kızılca") == "kizilca"
+    assert fold("İĞDIR") == "igdir"
+    assert fold("Alhasuşağı") == "alhasusagi"
+    assert fold("Âşık Şükrü") == "asik sukru"
+
+
+def test_turkish_folding_finds_diacritics():
+    index = name_index()
+    rows, _ = index.search("kizilca", fuzzy=False)
+    assert sorted(rows.tolist()) == [0, 1, 2]
+    assert index.search("IGDIR", fuzzy=False)[0].tolist() == [3]
+    assert index.search("camlibel")[0].tolist() == [4]
+    assert index.search("alhasusagi")[0].tolist() == [5]
+
+
+def test_exact_prefix_substring_order():
+    index = name_index()
+    rows, scores = index.search("Kızılca", fuzzy=False)
+    # Exact name, then name prefix, then substring
+    assert rows.tolist() == [0, 1, 2]
+    assert scores.tolist() == [EXACT, PREFIX, SUBSTRING]
+
+
+def test_old_name_entries_and_fuzzy_hits():
+    index = name_index()
+    # Each "|"-separated old name is its own entry, so "Ören" is an exact match of row 1
+    rows, scores = index.search("oren", fuzzy=False)
+    assert rows[0] == 1 and scores[0] == EXACT
+    assert index.search("seyhli", fuzzy=False)[0].tolist() == [6]
+
+    # A near miss only with fuzzy matching, and below every real match
+    assert index.search("kuzilcaoren", fuzzy=False)[0].tolist() == []
+    rows, scores = index.search("kizilca")
+    assert rows[:3].tolist() == [0, 1, 2]
+    assert 6 in rows.tolist() and 0 < scores[rows.tolist().index(6)] < SUBSTRING
+
+
+def test_short_queries_and_scores():
+    index = name_index()
+    # One or two characters scan the entries instead of using trigrams
+    assert sorted(index.search("ig")[0].tolist()) == [3]
+    assert index.search("  ")[0].tolist() == []
+    scores = index.scores("kizilca", fuzzy=False)
+    assert len(scores) == len(NAMES)
+    assert np.flatnonzero(scores).tolist() == [0, 1, 2]
+
+
+def test_categorical_columns_and_state_round_trip(tmp_path):
+    index = SearchIndex([NAMES.astype('category'), OLD_NAMES.astype('category')], split={'Old_Name': '|'})
+    save_index(str(tmp_path), "search.name", index.state())
+    loaded = SearchIndex.from_state(load_index(str(tmp_path), "search.name"))
+    for query in ("kizilca", "oren", "ig", "kuzilca"):
+        expected = name_index().search(query)
+        for got in (index.search(query), loaded.search(query)):
+            assert got[0].tolist() == expected[0].tolist()
+            assert got[1].tolist() == expected[1].tolist()
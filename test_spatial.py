@@ -0,0 +1,86 @@
+import numpy as np
+
+from spatial import SpatialGrid, haversine_km, polygons_from_geojson
+
+
+def random_points(n=2000, seed=1):
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(36.0, 38.0, n).astype(np.float32)
+    lon = rng.uniform(34.0, 37.0, n).astype(np.float32)
+    # Some settlements have no coordinates
+    lat[::97] = np.nan
+    lon[::89] = np.nan
+    return lat, lon
+
+
+def brute_radius(lat, lon, lat0, lon0, km):
+    with np.errstate(invalid='ignore'):
+        return haversine_km(lat.astype(np.float64), lon.astype(np.float64), lat0, lon0) <= km
+
+
+def test_radius_matches_brute_force():
+    lat, lon = random_points()
+    grid = SpatialGrid(lat, lon)
+    rng = np.random.default_rng(2)
+    for _ in range(50):
+        lat0, lon0, km = rng.uniform(36.0, 38.0), rng.uniform(34.0, 37.0), rng.uniform(1, 60)
+        assert np.array_equal(grid.radius(lat0, lon0, km), brute_radius(lat, lon, lat0, lon0, km))
+
+
+def test_radius_across_a_cell_edge():
+    # The center sits just east of the 35.0° cell edge; both points are within 5 km of it
+    lat = np.array([37.05, 37.05, 37.05, 37.0501], dtype=np.float32)
+    lon = np.array([35.01, 34.98, 35.2, 34.995], dtype=np.float32)
+    grid = SpatialGrid(lat, lon)
+    assert grid.radius(37.05, 35.005, 5).tolist() == [True, True, False, True]
+    # Also across a latitude edge (37.0°)
+    lat = np.array([37.01, 36.99, 36.9], dtype=np.float32)
+    lon = np.array([35.05, 35.05, 35.05], dtype=np.float32)
+    assert SpatialGrid(lat, lon).radius(37.005, 35.05, 3).tolist() == [True, True, False]
+
+
+def test_bbox_matches_brute_force():
+    lat, lon = random_points()
+    grid = SpatialGrid(lat, lon)
+    south, west, north, east = 36.42, 34.95, 37.31, 35.77
+    with np.errstate(invalid='ignore'):
+        expected = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+    assert np.array_equal(grid.bbox(south, west, north, east), expected)
+
+
+def test_polygon_with_hole():
+    lat, lon = random_points()
+    grid = SpatialGrid(lat, lon)
+    outer = [[35.0, 36.5], [36.0, 36.5], [36.0, 37.5], [35.0, 37.5], [35.0, 36.5]]
+    hole = [[35.4, 36.9], [35.6, 36.9], [35.6, 37.1], [35.4, 37.1], [35.4, 36.9]]
+    geojson = {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [outer, hole]}}
+
+    mask = grid.polygons(polygons_from_geojson(geojson))
+    with np.errstate(invalid='ignore'):
+        in_outer = (lon > 35.0) & (lon < 36.0) & (lat > 36.5) & (lat < 37.5)
+        in_hole = (lon > 35.4) & (lon < 35.6) & (lat > 36.9) & (lat < 37.1)
+    assert np.array_equal(mask, in_outer & ~in_hole)
+    assert mask.sum() and (in_outer & in_hole).sum()
+
+    # The hole's own area as a second polygon of a MultiPolygon fills it back in
+    multi = {"type": "MultiPolygon", "coordinates": [[outer, hole], [hole]]}
+    assert np.array_equal(grid.polygons(polygons_from_geojson(multi)), in_outer)
+
+
+def test_nan_coordinates_never_match():
+    lat = np.array([np.nan, 37.0, 37.0, np.nan], dtype=np.float32)
+    lon = np.array([35.0, np.nan, 35.0, np.nan], dtype=np.float32)
+    grid = SpatialGrid(lat, lon)
+    assert grid.rows.tolist() == [2]
+    assert grid.radius(37.0, 35.0, 500).tolist() == [False, False, True, False]
+    assert grid.bbox(-90, -180, 90, 180).tolist() == [False, False, True, False]
+    box = [[[30.0, 30.0], [40.0, 30.0], [40.0, 40.0], [30.0, 40.0], [30.0, 30.0]]]
+    assert grid.polygons([box]).tolist() == [False, False, True, False]
+
+
+def test_state_round_trip():
+    lat, lon = random_points()
+    grid = SpatialGrid(lat, lon)
+    loaded = SpatialGrid.from_state(grid.state(), lat, lon)
+    assert np.array_equal(loaded.radius(37.0, 35.5, 30), grid.radius(37.0, 35.5, 30))
+    assert np.array_equal(loaded.bbox(36.5, 35.0, 37.5, 36.0), grid.bbox(36.5, 35.0, 37.5, 36.0))
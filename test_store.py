@@ -0,0 +1,62 @@
+import pandas as pd
+
+from extract import build_record
+from store import SettlementStore
+from writer import DedupWriter, settlement_key
+
+# subdivision_search items as the scraper receives them
+ITEMS = [
+    {
+        "id": 1,
+        "name": "Kızılca",
+        "locationType": {"name": {"tr": "köy"}},
+        "oldNames": [
+            {"name": "Kızılcaköy", "languages": [{"tr": "Türkçe"}], "definition": {"tr": "1928 kaydı"}},
+            {"name": "Կարմիր", "romanizedText": "Karmir", "languages": [{"tr": "Ermenice"}, {"tr": "Rumca"}]},
+        ],
+        "note": {"tr": "Yörük köyü."},
+        "tribes": {"before": {"items": [{"tr": "Avşar"}, {"tr": "Karakeçili"}]}},
+        "communities": {"after": {"items": [{"tr": "Türk"}]}},
+        "coordinates": [35.81, 37.02],
+        "originalText": "Kızılca (Kızılcaköy)",
+    },
+    {
+        # No old names: the scraper writes "N/A"
+        "id": 2,
+        "name": "Yeniköy",
+        "locationType": {"name": {"tr": "köy"}},
+        "oldNames": [],
+        "communities": {"before": {"items": [{"tr": "Kürt"}]}},
+        "coordinates": [35.9, 37.1],
+    },
+    {
+        "id": 3,
+        "name": "Çamlıbel",
+        "coordinates": [],
+    },
+]
+
+
+def read_csv(path):
+    return pd.read_csv(path, encoding='utf-16', dtype=str, keep_default_na=False)
+
+
+def test_scraper_csv_round_trip(tmp_path):
+    keyed = [(settlement_key(v), build_record("Adana", "Ceyhan", v)) for v in ITEMS]
+    assert keyed[1][1]["Old_Name"] == "N/A"
+    source = tmp_path / "settlements.csv"
+    DedupWriter(str(source)).write(keyed, "Ceyhan")
+
+    store = SettlementStore(str(tmp_path / "imported.sqlite"))
+    store.import_csv(str(source))
+    store.export_csv(str(tmp_path / "exported.csv"))
+    pd.testing.assert_frame_equal(read_csv(tmp_path / "exported.csv"), read_csv(source))
+
+
+def test_crawled_settlements_export_as_written(tmp_path):
+    store = SettlementStore(str(tmp_path / "crawled.sqlite"))
+    store.write("Adana", "Ceyhan", [(settlement_key(v), v) for v in ITEMS])
+    store.export_csv(str(tmp_path / "exported.csv"))
+
+    expected = pd.DataFrame([build_record("Adana", "Ceyhan", v) for v in ITEMS]).astype(str)
+    pd.testing.assert_frame_equal(read_csv(tmp_path / "exported.csv"), expected)
@@ -0,0 +1,82 @@
+import random
+
+import numpy as np
+import pandas as pd
+
+from snapshot import load_index, save_index
+from token_index import TokenIndex
+
+TOKENS = ['Ali', 'Alikan', 'Avşar', 'Karakeçili', 'Türk', 'Kürt']
+
+
+def random_column(rng, n_rows):
+    """Comma-separated token lists with stray spaces, repeats and blanks, like the CSV."""
+    values = []
+    for _ in range(n_rows):
+        k = rng.randrange(4)
+        if k == 0:
+            values.append(rng.choice(['', ' ', None]))
+        else:
+            values.append(','.join(rng.choice(['', ' ']) + rng.choice(TOKENS) + rng.choice(['', ' '])
+                                   for _ in range(k)))
+    return values
+
+
+def brute_tokens(values, sep=','):
+    """Row -> set of stripped, non-empty tokens, without pandas string methods."""
+    result = []
+    for value in values:
+        parts = value.split(sep) if sep and isinstance(value, str) else [value if isinstance(value, str) else '']
+        result.append({p.strip() for p in parts if p.strip()})
+    return result
+
+
+def assert_matches(index, tokens, rng):
+    assert index.n_rows == len(tokens)
+    assert index.vocab == sorted(set().union(*tokens))
+    for tok in index.vocab + ['Nope']:
+        expected = [i for i, row in enumerate(tokens) if tok in row]
+        assert index.rows(tok).tolist() == expected
+
+    picks = rng.sample(TOKENS, 2)
+    assert index.rows_any(picks).tolist() == [i for i, row in enumerate(tokens) if row & set(picks)]
+    assert index.rows_all(picks).tolist() == [i for i, row in enumerate(tokens) if set(picks) <= row]
+    assert index.mask_any(picks).tolist() == [bool(row & set(picks)) for row in tokens]
+
+    mask = np.array([rng.random() < 0.5 for _ in tokens], dtype=bool)
+    present = set().union(*(row for row, m in zip(tokens, mask) if m))
+    assert index.tokens_in(mask) == sorted(present)
+    assert index.tokens_in(None) == index.vocab
+    assert index.counts(mask).tolist() == [sum(1 for row, m in zip(tokens, mask) if m and tok in row)
+                                           for tok in index.vocab]
+    assert index.counts(None).tolist() == [sum(1 for row in tokens if tok in row) for tok in index.vocab]
+
+
+def test_matches_brute_force():
+    rng = random.Random(7)
+    for n_rows in (0, 1, 50, 400):
+        values = random_column(rng, n_rows)
+        tokens = brute_tokens(values)
+        assert_matches(TokenIndex(values), tokens, rng)
+        # The compact frame's categorical columns take the per-category path
+        assert_matches(TokenIndex(pd.Series(values, dtype='category')), tokens, rng)
+
+
+def test_whole_value_tokens():
+    rng = random.Random(11)
+    values = [rng.choice(['Adana', 'Ceyhan, Kozan', ' Kozan ', '']) for _ in range(200)]
+    tokens = brute_tokens(values, sep=None)
+    assert_matches(TokenIndex(values, sep=None), tokens, rng)
+    assert_matches(TokenIndex(pd.Series(values, dtype='category'), sep=None), tokens, rng)
+
+
+def test_state_round_trip(tmp_path):
+    rng = random.Random(3)
+    values = random_column(rng, 300)
+    index = TokenIndex(values)
+
+    save_index(str(tmp_path), "Tribes", index.state())
+    loaded = TokenIndex.from_state(load_index(str(tmp_path), "Tribes"))
+    # Arrays come back memory-mapped; the answers must not change
+    assert loaded.vocab == index.vocab
+    assert_matches(loaded, brute_tokens(values), rng)
@@ -0,0 +1,69 @@
+import random
+
+import pandas as pd
+
+from writer import DedupWriter, compact, settlement_key
+
+COLUMNS = ['Province', 'District', 'Name', 'Description', 'Coordinates']
+
+
+def read_csv(path):
+    return pd.read_csv(path, encoding='utf-16', dtype=str, keep_default_na=False)
+
+
+def record(name, coords, description="", province="Adana", district="Ceyhan"):
+    return {'Province': province, 'District': district, 'Name': name, 'Description': description,
+            'Coordinates': coords}
+
+
+def test_settlement_key_falls_back_to_name_and_coordinates():
+    assert settlement_key({"id": 7, "name": "Kızılca"}) == "id:7"
+    assert settlement_key({"id": 0, "name": "Kızılca"}) == "id:0"
+    assert settlement_key({"name": "Kızılca", "coordinates": [35.8, 37.0]}) == "Kızılca|[35.8, 37.0]"
+    # Same name elsewhere is another settlement; no coordinates still gives a key
+    assert settlement_key({"name": "Kızılca", "coordinates": [36.1, 37.0]}) != "Kızılca|[35.8, 37.0]"
+    assert settlement_key({"name": "Kızılca"}) == "Kızılca|[]"
+
+
+def test_dedup_writer_skips_keys_across_calls_and_restarts(tmp_path):
+    path = str(tmp_path / "out.csv")
+    items = [{"id": 1, "name": "Kızılca"}, {"name": "Yeniköy", "coordinates": [35.9, 37.1]}]
+    writer = DedupWriter(path)
+    written = writer.write([(settlement_key(v), record(v["name"], "")) for v in items], "Ceyhan")
+    assert written == ["id:1", "Yeniköy|[35.9, 37.1]"]
+
+    # The same settlements found again under another district
+    again = [{"id": 1, "name": "Kızılca"}, {"name": "Yeniköy", "coordinates": [35.9, 37.1]},
+             {"name": "Yeniköy", "coordinates": [36.0, 37.2]}]
+    keyed = [(settlement_key(v), record(v["name"], "", district="Kozan")) for v in again]
+    assert writer.write(keyed, "Kozan") == ["Yeniköy|[36.0, 37.2]"]
+
+    # A restart resumes with the keys the journal recorded
+    resumed = DedupWriter(path, seen=writer.seen)
+    assert resumed.write(keyed, "Kozan") == []
+    df = read_csv(path)
+    assert df['District'].tolist() == ["Ceyhan", "Ceyhan", "Kozan"]
+    assert list(df.columns) == COLUMNS
+
+
+def test_compact_keeps_first_occurrence_across_runs(tmp_path):
+    rng = random.Random(4)
+    names = ["Kızılca", "Yeniköy", "Avşarlı", "Çamlıbel", "Ören"]
+    rows = []
+    for i in range(60):
+        rows.append(record(rng.choice(names), rng.choice(["[35.8, 37.0]", "[35.9, 37.1]", ""]),
+                           description=f"row {i}", province=rng.choice(["Adana", "Hatay"]),
+                           district=rng.choice(["Ceyhan", "Kozan"])))
+    src, dst = str(tmp_path / "src.csv"), str(tmp_path / "dst.csv")
+    pd.DataFrame(rows).to_csv(src, index=False, encoding='utf-16')
+
+    # Small chunks, so duplicates sit in different sorted runs
+    rows_in, rows_out = compact(src, dst, chunksize=7)
+
+    first = {}
+    for r in rows:
+        first.setdefault((r['Name'], r['Coordinates']), r)
+    expected = sorted(first.values(), key=lambda r: (r['Province'], r['District'], r['Name'],
+                                                     int(r['Description'].split()[1])))
+    assert (rows_in, rows_out) == (60, len(first))
+    assert read_csv(dst).to_dict('records') == expected
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+
+class TokenIndex:
+    """
+    Inverted index over a comma-separated column (Tribes, Ethnicity).
+    Each stripped token maps to the sorted int32 row positions containing it,
+    stored CSR-style: rows for token i are row_ids[offsets[i]:offsets[i + 1]].
+    With sep=None the whole value is the token (Province, District).
+    """
+
+    def __init__(self, series, sep=','):
+        series = pd.Series(series).reset_index(drop=True)
+        self.n_rows = len(series)
+
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Tokenize each distinct value once, then expand through the row codes
+            rows, codes, vocab = self._from_categorical(series, sep)
+        else:
+            values = series.fillna('').astype(str)
+            tokens = self._tokenize(values, sep)
+            rows = tokens.index.to_numpy(dtype=np.int64)
+            codes, vocab = pd.factorize(tokens.to_numpy(dtype=object), sort=True)
+
+        # Sort by (token, row) and drop rows that list the same token twice
+        order = np.lexsort((rows, codes))
+        codes, rows = codes[order], rows[order]
+        if len(codes):
+            keep = np.ones(len(codes), dtype=bool)
+            keep[1:] = (codes[1:] != codes[:-1]) | (rows[1:] != rows[:-1])
+            codes, rows = codes[keep], rows[keep]
+
+        self.vocab = [str(v) for v in vocab]
+        self._ids = {tok: i for i, tok in enumerate(self.vocab)}
+        self.row_ids = rows.astype(np.int32)
+        self.token_ids = codes.astype(np.int32)
+        self.offsets = np.searchsorted(self.token_ids, np.arange(len(self.vocab) + 1))
+
+    def state(self):
+        """What to persist of the index (see snapshot.save_index)."""
+        return {"n_rows": self.n_rows, "vocab": self.vocab, "row_ids": self.row_ids,
+                "token_ids": self.token_ids, "offsets": self.offsets}
+
+    @classmethod
+    def from_state(cls, state):
+        """The index back from state(), without re-tokenizing."""
+        index = cls.__new__(cls)
+        index.n_rows = state["n_rows"]
+        index.vocab = list(state["vocab"])
+        index._ids = {tok: i for i, tok in enumerate(index.vocab)}
+        index.row_ids, index.token_ids, index.offsets = state["row_ids"], state["token_ids"], state["offsets"]
+        return index
+
+    @staticmethod
+    def _tokenize(values, sep):
+        """Stripped, non-empty tokens of a string Series, indexed by their row."""
+        tokens = values.str.split(sep).explode() if sep else values
+        tokens = tokens.str.strip()
+        return tokens[tokens != '']
+
+    @classmethod
+    def _from_categorical(cls, series, sep):
+        """(rows, token codes, vocab) of a categorical column via its categories."""
+        categories = pd.Series(series.cat.categories.astype(str))
+        cat_tokens = cls._tokenize(categories, sep)
+        pair_tokens, vocab = pd.factorize(cat_tokens.to_numpy(dtype=object), sort=True)
+        pair_cats = cat_tokens.index.to_numpy(dtype=np.int64)
+
+        # Rows grouped by category: rows of category c are by_cat[starts[c]:starts[c + 1]]
+        value_codes = series.cat.codes.to_numpy()
+        by_cat = np.argsort(value_codes, kind='stable')
+        sizes = np.bincount(value_codes[value_codes >= 0], minlength=len(categories))
+        starts = np.searchsorted(value_codes[by_cat], np.arange(len(categories)))
+
+        # One (row, token) pair per row of each (category, token) pair
+        n = sizes[pair_cats]
+        first = np.repeat(starts[pair_cats] - (np.cumsum(n) - n), n)
+        rows = by_cat[first + np.arange(n.sum())]
+        return rows, np.repeat(pair_tokens, n), vocab
+
+    def __contains__(self, token):
+        return token in self._ids
+
+    def token_id(self, token):
+        """Position of the token in vocab, or None."""
+        return self._ids.get(token)
+
+    def rows(self, token):
+        """Sorted row positions whose list contains exactly this token."""
+        i = self._ids.get(token)
+        if i is None:
+            return np.empty(0, dtype=np.int32)
+        return self.row_ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def rows_any(self, tokens):
+        """Union: rows containing at least one of the tokens."""
+        parts = [self.rows(t) for t in tokens]
+        if not parts:
+            return np.empty(0, dtype=np.int32)
+        if len(parts) == 1:
+            return parts[0]
+        return np.unique(np.concatenate(parts))
+
+    def rows_all(self, tokens):
+        """Intersection: rows containing every one of the tokens."""
+        result = None
+        for t in tokens:
+            r = self.rows(t)
+            result = r if result is None else np.intersect1d(result, r, assume_unique=True)
+            if not len(result):
+                break
+        return result if result is not None else np.empty(0, dtype=np.int32)
+
+    def tokens_in(self, mask):
+        """Vocabulary (sorted) of tokens that occur in at least one masked row."""
+        if mask is None:
+            return list(self.vocab)
+        present = np.unique(self.token_ids[mask[self.row_ids]])
+        return [self.vocab[i] for i in present]
+
+    def counts(self, mask):
+        """
+        Per-token row counts (aligned with vocab) restricted to the masked rows:
+        one bincount over the token ids of the masked (row, token) pairs.
+        """
+        if mask is None:
+            return np.diff(self.offsets)
+        return np.bincount(self.token_ids[mask[self.row_ids]], minlength=len(self.vocab))
+
+    def mask_any(self, tokens):
+        """Boolean row mask for rows_any."""
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.rows_any(tokens)] = True
+        return mask
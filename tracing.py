@@ -0,0 +1,81 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Environment variable naming the JSONL trace file of the app (unset = no file)
+TRACE_ENV = "SETTLEMENT_TRACE"
+
+
+class Tracer:
+    """
+    Minimal span timer. `with tracer.span("stage", rows=n) as s:` times the
+    block; attributes can be added to `s` inside it (e.g. s["rows"] = ...).
+    A span left by an exception gets its type as "error".
+    Finished spans are kept in `spans` (if `keep`) and, with a `path`,
+    appended to that JSONL file as one line each, together with the
+    tracer's `context` fields (session, run, ...). Safe to share between
+    threads and asyncio tasks.
+    """
+
+    def __init__(self, path=None, keep=True, **context):
+        self.path = path
+        self.keep = keep
+        self.context = context
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        record = {"span": name, **attrs}
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["ms"] = round((time.perf_counter() - start) * 1000, 3)
+            self.emit(record)
+
+    def since(self, name, start, **attrs):
+        """Emits a span that started at time.perf_counter() value `start`, for blocks `with` can't wrap."""
+        self.emit({"span": name, **attrs, "ms": round((time.perf_counter() - start) * 1000, 3)})
+
+    def emit(self, record):
+        record = {"ts": round(time.time(), 3), **self.context, **record}
+        with self._lock:
+            if self.keep:
+                self.spans.append(record)
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+def summarize(path):
+    """Per-span count, total, p50, p95 and max (ms) from a JSONL trace file, slowest total first."""
+    durations = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                durations.setdefault(record["span"], []).append(record["ms"])
+
+    rows = []
+    for name, ms in durations.items():
+        ms = np.array(ms)
+        rows.append((name, len(ms), ms.sum(), np.percentile(ms, 50), np.percentile(ms, 95), ms.max()))
+    rows.sort(key=lambda r: -r[2])
+
+    print(f"{'span':<24} {'count':>7} {'total ms':>11} {'p50':>9} {'p95':>9} {'max':>9}")
+    for name, n, total, p50, p95, peak in rows:
+        print(f"{name:<24} {n:>7} {total:>11.1f} {p50:>9.2f} {p95:>9.2f} {peak:>9.2f}")
+    return rows
+
+
+if __name__ == "__main__":
+    summarize(sys.argv[1] if len(sys.argv) > 1 else os.environ.get(TRACE_ENV, "traces.jsonl"))
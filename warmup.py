@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+from engine import Engine, Query, DATA_FILE, save_indexes
+from packs import PackStore, build_packs
+from snapshot import ensure_snapshot, fresh_source
+from store import SettlementStore, ensure_store, BACKEND_ENV
+
+# Written once the snapshot and indexes are built and validated; removed while rebuilding
+READY_FILE = "app_ready.json"
+
+# Streamlit's own liveness endpoint
+HEALTH_PATH = "/_stcore/health"
+
+# Columns the app filters, maps and exports on
+REQUIRED_COLUMNS = ['Province', 'District', 'Name', 'Old_Name', 'Ethnicity', 'Tribes', 'Description',
+                    'latitude', 'longitude']
+
+
+def validate(engine):
+    """Problems with a loaded engine (empty list = usable): missing columns, indexes of the wrong size, failed probes."""
+    df = engine.df
+    problems = [f"missing column {col}" for col in REQUIRED_COLUMNS if col not in df.columns]
+    if not len(df):
+        problems.append("no settlements")
+    if problems:
+        return problems
+
+    indexes = {**{f"token.{c}": i for c, i in engine.token_indexes.items()},
+               **{f"search.{n}": i for n, i in engine.search_indexes.items()}, "spatial": engine.spatial}
+    problems += [f"index {name} covers {index.n_rows:,} rows, the table has {len(df):,}"
+                 for name, index in indexes.items() if index.n_rows != len(df)]
+    if problems:
+        return problems
+
+    # The largest province filters to exactly its rows
+    provinces = engine.token_indexes['Province']
+    if len(provinces.vocab):
+        largest = provinces.vocab[int(np.argmax(np.diff(provinces.offsets)))]
+        if len(engine.rows(Query(provinces=(largest,)))) != len(provinces.rows(largest)):
+            problems.append(f"province filter for {largest} disagrees with its index")
+
+    # A settlement with coordinates is found by its name and inside a small radius around itself
+    if not len(engine.spatial.rows):
+        problems.append("no settlement has coordinates")
+        return problems
+    row = int(engine.spatial.rows[0])
+    name = str(df['Name'].iat[row])
+    if row not in engine.search_indexes['name'].search(name, fuzzy=False)[0]:
+        problems.append(f"name search does not find {name!r}")
+    area = {"type": "radius", "lat": float(engine.spatial.lat[row]), "lon": float(engine.spatial.lon[row]), "km": 1}
+    if not engine.area_mask(area)[row]:
+        problems.append(f"radius search does not find {name!r}")
+    return problems
+
+
+def warm_up(csv_path=DATA_FILE, ready_file=READY_FILE, packs=False):
+    """
+    Everything the app would otherwise do on its first page load: builds
+    the snapshot and persists its token, search and spatial indexes (kept
+    if already there), then loads them back the way the app does and
+    validates the result. With SETTLEMENT_BACKEND=sql the SQLite store is
+    imported too, and with `packs` stale export packs are rebuilt. Writes
+    the ready file only if everything checks out. Returns it as a dict.
+    """
+    start = time.perf_counter()
+    if os.path.exists(ready_file):
+        os.remove(ready_file)
+    steps = {}
+
+    def step(name, fn):
+        t = time.perf_counter()
+        result = fn()
+        steps[name] = round(time.perf_counter() - t, 3)
+        print(f"   {name}: {steps[name]:.2f}s")
+        return result
+
+    print(f"🔥 Warming up {csv_path}...")
+    snapshot_dir = step("snapshot", lambda: ensure_snapshot(csv_path))
+    engine = step("indexes", lambda: Engine.load(csv_path))
+    step("search_indexes", lambda: engine.search_indexes)
+    step("save_indexes", lambda: save_indexes(engine, snapshot_dir))
+
+    # Validate what the app will actually load: the persisted indexes
+    engine = step("reload", lambda: Engine.load(csv_path))
+    problems = step("validate", lambda: validate(engine))
+
+    if os.environ.get(BACKEND_ENV) == "sql":
+        store = SettlementStore(step("store", lambda: ensure_store(csv_path)))
+        if store.count() != len(engine.df):
+            problems.append(f"store has {store.count():,} settlements, the table has {len(engine.df):,}")
+    if packs and PackStore.load(csv_path) is None:
+        step("packs", lambda: build_packs(csv_path))
+
+    if problems:
+        raise RuntimeError("; ".join(problems))
+
+    ready = {
+        "source_sha256": fresh_source(csv_path, snapshot_dir)["sha256"],
+        "snapshot": snapshot_dir,
+        "rows": len(engine.df),
+        "ready_at": time.time(),
+        "seconds": round(time.perf_counter() - start, 3),
+        "steps": steps,
+    }
+    with open(ready_file + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(ready, f, indent=1)
+    os.replace(ready_file + ".tmp", ready_file)
+    print(f"✅ Ready: {ready['rows']:,} settlements validated in {ready['seconds']:.1f}s")
+    return ready
+
+
+def check_ready(csv_path=DATA_FILE, ready_file=READY_FILE, url=None, timeout=2.0):
+    """
+    Why the app is not ready, or None if it is: the warm-up must have
+    finished for the CSV as it is now and, with `url`, the server must
+    answer its health check. Only reads small files and never rebuilds
+    anything, so a supervisor can poll it.
+    """
+    try:
+        with open(ready_file, encoding='utf-8') as f:
+            ready = json.load(f)
+    except (OSError, ValueError):
+        return f"not warmed up ({ready_file} missing)"
+    source = fresh_source(csv_path)
+    if source is None or source["sha256"] != ready.get("source_sha256"):
+        return f"{csv_path} changed since the warm-up"
+    if url:
+        try:
+            with urllib.request.urlopen(url.rstrip('/') + HEALTH_PATH, timeout=timeout) as resp:
+                if resp.status != 200:
+                    return f"health check answered {resp.status}"
+        except (urllib.error.URLError, OSError) as e:
+            return f"health check failed: {e}"
+    return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Build and validate the snapshot and indexes before starting the app, or check readiness.")
+    parser.add_argument("--data", default=DATA_FILE, help=f"Settlements CSV (default: {DATA_FILE}).")
+    parser.add_argument("--ready-file", default=READY_FILE, help=f"Readiness marker (default: {READY_FILE}).")
+    parser.add_argument("--packs", action="store_true", help="Also rebuild stale export packs (see packs.py).")
+    parser.add_argument("--check", action="store_true",
+                        help="Only check readiness: exit 0 if ready, 1 if not (for a supervisor's probe).")
+    parser.add_argument("--url", default=None, help="With --check, also require the app at this URL to be healthy.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.check:
+        reason = check_ready(args.data, args.ready_file, args.url)
+        print("✅ Ready" if reason is None else f"⏳ Not ready: {reason}")
+        sys.exit(0 if reason is None else 1)
+    try:
+        warm_up(args.data, args.ready_file, args.packs)
+    except (RuntimeError, OSError) as e:
+        sys.exit(f"❌ Warm-up failed: {e}")
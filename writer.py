@@ -0,0 +1,108 @@
+import csv
+import hashlib
+import heapq
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+# Output order of compacted files
+SORT_COLUMNS = ["Province", "District", "Name"]
+
+
+def settlement_key(v):
+    """Stable identity of a settlement in an API payload: its id, else name + coordinates."""
+    if v.get('id') is not None:
+        return f"id:{v['id']}"
+    return f"{v.get('name')}|{v.get('coordinates', [])}"
+
+
+class DedupWriter:
+    """
+    Appends records to the UTF-16 output CSV, skipping settlements whose key
+    was already written (free-text district searches return the same
+    settlement under several districts).
+    """
+
+    def __init__(self, path, seen=()):
+        self.path = path
+        self.seen = set(seen)
+
+    def write(self, keyed_records, label):
+        """
+        keyed_records: [(key, record)]. Returns the keys actually written,
+        in order, so the caller can persist them.
+        """
+        fresh = []
+        for key, record in keyed_records:
+            if key not in self.seen:
+                self.seen.add(key)
+                fresh.append((key, record))
+
+        skipped = len(keyed_records) - len(fresh)
+        if fresh:
+            new_df = pd.DataFrame([record for _, record in fresh])
+            # If file doesn't exist, write header. If it does, skip header.
+            header = not os.path.exists(self.path)
+            new_df.to_csv(self.path, mode='a', header=header, index=False, encoding='utf-16')
+        if fresh or skipped:
+            print(f"   💾 Saved {len(fresh)} records for {label}" + (f" ({skipped} duplicates skipped)." if skipped else "."))
+        return [key for key, _ in fresh]
+
+
+def _sort_key(row, positions):
+    return tuple(row[i] for i in positions)
+
+
+def compact(src, dst, chunksize=50_000):
+    """
+    Streams the UTF-16 CSV `src` in chunks and writes a copy without
+    duplicate settlements (same Name + Coordinates, first one wins), sorted
+    by Province/District/Name. Memory stays at one chunk plus a set of
+    16-byte key digests: each sorted chunk is spilled to a temporary run
+    file and the runs are merged. Returns (rows read, rows written).
+    """
+    seen = set()
+    rows_in = rows_out = 0
+    header = None
+    tmp_dir = tempfile.mkdtemp(prefix="compact_")
+    runs = []
+    try:
+        for chunk in pd.read_csv(src, encoding='utf-16', chunksize=chunksize, dtype=str, keep_default_na=False):
+            header = list(chunk.columns)
+            rows_in += len(chunk)
+            keys = (chunk['Name'] + "|" + chunk['Coordinates']).tolist()
+            keep = []
+            for key in keys:
+                digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+                keep.append(digest not in seen)
+                seen.add(digest)
+            chunk = chunk[keep].sort_values(SORT_COLUMNS, kind="stable")
+            if chunk.empty:
+                continue
+            run = os.path.join(tmp_dir, f"run{len(runs)}.csv")
+            chunk.to_csv(run, index=False, header=False, encoding='utf-8')
+            runs.append(run)
+
+        if header is None:
+            raise ValueError(f"{src} is empty")
+        positions = [header.index(c) for c in SORT_COLUMNS]
+
+        files = [open(run, newline='', encoding='utf-8') for run in runs]
+        try:
+            readers = [csv.reader(f) for f in files]
+            with open(dst, 'w', newline='', encoding='utf-16') as out:
+                w = csv.writer(out, lineterminator='\n')
+                w.writerow(header)
+                for row in heapq.merge(*readers, key=lambda r: _sort_key(r, positions)):
+                    w.writerow(row)
+                    rows_out += 1
+        finally:
+            for f in files:
+                f.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"🧹 Compacted {src}: {rows_in} rows -> {rows_out} unique rows in {dst}.")
+    return rows_in, rows_out